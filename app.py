@@ -2,7 +2,7 @@ import os
 import time
 import logging
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, abort
+from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, abort, jsonify
 from werkzeug.utils import secure_filename
 import subprocess
 import sys
@@ -36,69 +36,9 @@ try:
                 # 导入DocxParser类
                 from utils.docx2markdown.docx_parser import DocxParser
                 
-                # 检查是否需要添加extract_image方法
+                # DocxParser自带extract_image和批量媒体提取，无需修补
                 if not hasattr(DocxParser, 'extract_image'):
-                    logger.info("DocxParser缺少extract_image方法，正在添加...")
-                    import zipfile
-                    
-                    def extract_image(self, image_path, output_path):
-                        """从.docx文件中提取指定的图片并保存到指定路径"""
-                        try:
-                            logger.info(f"尝试提取图片: {image_path} 到 {output_path}")
-                            with zipfile.ZipFile(self.file_path, 'r') as docx_zip:
-                                # 获取媒体文件列表
-                                media_files = [name for name in docx_zip.namelist() if name.startswith('word/media/')]
-                                logger.info(f"文档中的媒体文件数量: {len(media_files)}")
-                                
-                                # 检查文件是否存在
-                                if image_path in docx_zip.namelist():
-                                    # 获取图片数据
-                                    image_data = docx_zip.read(image_path)
-                                    
-                                    # 确保输出目录存在
-                                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                                    
-                                    # 保存图片
-                                    with open(output_path, 'wb') as img_file:
-                                        img_file.write(image_data)
-                                    logger.info(f"成功提取图片: {image_path} 到 {output_path}")
-                                    return True
-                                else:
-                                    # 尝试通过文件名匹配
-                                    base_name = os.path.basename(image_path)
-                                    for name in docx_zip.namelist():
-                                        if name.endswith(base_name) or base_name in name:
-                                            # 获取图片数据
-                                            image_data = docx_zip.read(name)
-                                            
-                                            # 确保输出目录存在
-                                            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                                            
-                                            # 保存图片
-                                            with open(output_path, 'wb') as img_file:
-                                                img_file.write(image_data)
-                                            logger.info(f"通过文件名匹配提取图片: {name} 到 {output_path}")
-                                            return True
-                                    
-                                    # 如果仍找不到，尝试提取任意媒体文件
-                                    if media_files:
-                                        image_data = docx_zip.read(media_files[0])
-                                        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                                        with open(output_path, 'wb') as img_file:
-                                            img_file.write(image_data)
-                                        logger.info(f"提取替代图片: {media_files[0]} 到 {output_path}")
-                                        return True
-                                    
-                                    logger.warning(f"无法找到匹配的图片: {image_path}")
-                                    return False
-                        except Exception as e:
-                            logger.error(f"提取图片时出错: {str(e)}")
-                            traceback.print_exc()
-                            return False
-                    
-                    # 将方法添加到DocxParser类
-                    DocxParser.extract_image = extract_image
-                    logger.info("成功添加extract_image方法到DocxParser类")
+                    logger.warning("DocxParser缺少extract_image方法，请检查utils/docx2markdown/docx_parser.py")
                 
                 # 检查DocxToMarkdownConverter类
                 from utils.docx2markdown.docx_to_markdown_converter import DocxToMarkdownConverter
@@ -146,8 +86,12 @@ app = Flask(__name__)
 app.secret_key = 'youdonote2markdown'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'outputs'
+app.config['DATA_FOLDER'] = os.getenv('DATA_FOLDER', 'data')  # 内部数据（缓存索引等），不通过/download/提供
 app.config['ALLOWED_EXTENSIONS'] = {'docx', 'pdf'}
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 限制上传文件大小为50MB
+app.config['CONVERSION_WORKERS'] = int(os.getenv('CONVERSION_WORKERS', '2'))  # 后台转换线程数
+app.config['CONVERSION_MAX_PENDING'] = int(os.getenv('CONVERSION_MAX_PENDING', '20'))  # 最大排队任务数
+app.config['CONVERSION_CACHE_MAX_BYTES'] = int(os.getenv('CONVERSION_CACHE_MAX_BYTES', str(1024 * 1024 * 1024)))  # 转换缓存上限，0表示不缓存
 
 # 修复docx转换模块
 try:
@@ -176,15 +120,35 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 os.makedirs(os.path.join(app.config['OUTPUT_FOLDER'], 'images'), exist_ok=True)
 
+# 后台转换任务队列
+from utils.conversion_jobs import ConversionJobManager, JobQueueFullError, JOB_SUCCESS
+job_manager = ConversionJobManager(
+    max_workers=app.config['CONVERSION_WORKERS'],
+    max_pending=app.config['CONVERSION_MAX_PENDING']
+)
+
+# 转换结果缓存：相同内容的文件用相同方法再次转换时直接返回已有结果；
+# 索引在DATA_FOLDER中，第一次转换时才创建
+conversion_cache = None
+if app.config['CONVERSION_CACHE_MAX_BYTES'] > 0:
+    from utils.conversion_cache import ConversionCache
+    from utils.image_storage import image_storage_variant
+    conversion_cache = ConversionCache(
+        app.config['OUTPUT_FOLDER'],
+        db_path=os.path.join(app.config['DATA_FOLDER'], 'conversion_cache.sqlite3'),
+        max_bytes=app.config['CONVERSION_CACHE_MAX_BYTES'],
+        variant=image_storage_variant()
+    )
+
 # 延迟导入转换工具，以避免循环导入
 def get_conversion_modules():
     try:
         from utils.docx_to_md import convert_docx_to_md
         from utils.pdf_to_md import convert_pdf_to_md
-        from utils.gitee_uploader import upload_images_to_gitee
+        from utils.image_storage import publish_markdown_images
         # 新增: 导入转换选择器
         from utils.docx_converter_selector import convert_docx_to_markdown, ConversionMethod, get_available_methods
-        return convert_docx_to_md, convert_pdf_to_md, upload_images_to_gitee, convert_docx_to_markdown, ConversionMethod, get_available_methods
+        return convert_docx_to_md, convert_pdf_to_md, publish_markdown_images, convert_docx_to_markdown, ConversionMethod, get_available_methods
     except ImportError as e:
         logger.error(f"导入模块失败: {str(e)}")
         raise
@@ -219,10 +183,14 @@ def index():
     except:
         method_names = ["default"]
     
+    # 未完成的转换任务，由前端轮询状态
+    active_jobs = [job.to_dict() for job in job_manager.list_jobs() if not job.finished]
+    
     return render_template('index.html', 
                            uploaded_files=uploaded_files, 
                            converted_files=converted_files,
-                           conversion_methods=method_names)
+                           conversion_methods=method_names,
+                           active_jobs=active_jobs)
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -259,98 +227,197 @@ def upload_file():
         flash('不支持的文件类型，请上传docx或pdf文件', 'error')
         return redirect(request.url)
 
-@app.route('/convert/<filename>')
-def convert_file(filename):
-    logger.info(f"转换文件: {filename}")
-    try:
-        convert_docx_to_md, convert_pdf_to_md, upload_images_to_gitee, convert_docx_to_markdown, ConversionMethod, _ = get_conversion_modules()
-        
-        input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        # 验证文件是否存在
-        if not os.path.exists(input_path):
-            logger.error(f"文件不存在: {input_path}")
-            flash(f'文件 {filename} 不存在', 'error')
-            return redirect(url_for('index'))
-        
-        filename_without_ext = os.path.splitext(filename)[0]
-        
-        # 创建专用的输出目录，同时存放markdown和图片
-        output_folder_name = f"{filename_without_ext}_outputs"
-        output_dir = os.path.join(app.config['OUTPUT_FOLDER'], output_folder_name)
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # 设置markdown文件路径
-        output_filename = f"{filename_without_ext}.md"
-        output_path = os.path.join(output_dir, output_filename)
-        
-        # 获取选择的转换方法
-        conversion_method = request.args.get('method', 'default')
-        logger.info(f"使用转换方法: {conversion_method}")
+def run_conversion(job, filename, conversion_method, pages=None):
+    """
+    在后台线程中执行文件转换和图片上传
+
+    Args:
+        job (ConversionJob): 当前任务，提示消息写入 job.messages
+        filename (str): 上传目录中的文件名
+        conversion_method (str): 转换方法
+        pages (str): PDF页码范围，如 "1-10"，None表示全部页面
+
+    Returns:
+        str: 转换后的Markdown文件相对路径（folder_name/file.md）
+    """
+    convert_docx_to_md, convert_pdf_to_md, publish_markdown_images, convert_docx_to_markdown, ConversionMethod, _ = get_conversion_modules()
+    
+    input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    filename_without_ext = os.path.splitext(filename)[0]
+    
+    # 相同内容的文件已经用相同方法转换过，直接返回缓存的Markdown和图片
+    cache_key = None
+    if conversion_cache is not None:
+        cache_key = conversion_cache.key_for(input_path, f"{conversion_method}:{pages}" if pages else conversion_method)
+        cached_result = conversion_cache.get(cache_key)
+        if cached_result:
+            logger.info(f"文件 {filename} 命中转换缓存: {cached_result}")
+            job.messages.append(('success', f'文件 {filename} 与已转换的文件内容相同，已直接使用转换结果 {cached_result}'))
+            return cached_result
+    
+    # 创建专用的输出目录，同时存放markdown和图片；
+    # 其他转换方法和部分页面的结果各用一个目录，不覆盖完整转换结果，缓存淘汰时也只删除自己的目录
+    folder_suffix = ""
+    if conversion_method != 'default':
+        folder_suffix += f"_{conversion_method}"
+    if pages:
+        folder_suffix += f"_p{pages}"
+    output_folder_name = f"{filename_without_ext}{folder_suffix}_outputs"
+    output_dir = os.path.join(app.config['OUTPUT_FOLDER'], output_folder_name)
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # 设置markdown文件路径
+    output_filename = f"{filename_without_ext}_p{pages}.md" if pages else f"{filename_without_ext}.md"
+    output_path = os.path.join(output_dir, output_filename)
+    
+    logger.info(f"使用转换方法: {conversion_method}")
+    
+    # 根据文件类型选择转换方法
+    if filename.lower().endswith('.docx'):
+        logger.info(f"处理DOCX文件: {filename}")
         
-        # 根据文件类型选择转换方法
-        if filename.lower().endswith('.docx'):
-            logger.info(f"处理DOCX文件: {filename}")
-            
-            # 根据选择的方法进行转换
-            if conversion_method == 'cyrus':
-                # 使用CYRUS方法
-                try:
-                    logger.info(f"尝试使用CYRUS方法转换文件: {filename}")
-                    image_paths = convert_docx_to_markdown(
-                        input_path, 
-                        output_path, 
-                        method=ConversionMethod.CYRUS,
-                        image_dir=output_dir
-                    )
-                    logger.info(f"CYRUS方法转换成功，提取到 {len(image_paths)} 张图片")
-                    # 成功时给用户消息
-                    flash(f'使用CYRUS方法成功转换文件 {filename}', 'success')
-                except Exception as e:
-                    logger.error(f"使用CYRUS方法转换失败: {str(e)}", exc_info=True)
-                    # 告知用户转换失败，但系统会自动使用默认方法
-                    flash(f'CYRUS方法转换失败，已自动降级到默认方法: {str(e)}', 'warning')
-                    logger.info("尝试使用默认方法")
-                    image_paths = convert_docx_to_md(input_path, output_path, output_dir)
-                    logger.info(f"默认方法转换成功，提取到 {len(image_paths)} 张图片")
-            else:
-                # 使用默认方法
-                logger.info(f"使用默认方法转换文件: {filename}")
+        # 根据选择的方法进行转换
+        if conversion_method == 'cyrus':
+            # 使用CYRUS方法
+            try:
+                logger.info(f"尝试使用CYRUS方法转换文件: {filename}")
+                image_paths = convert_docx_to_markdown(
+                    input_path, 
+                    output_path, 
+                    method=ConversionMethod.CYRUS,
+                    image_dir=output_dir
+                )
+                logger.info(f"CYRUS方法转换成功，提取到 {len(image_paths)} 张图片")
+                # 成功时给用户消息
+                job.messages.append(('success', f'使用CYRUS方法成功转换文件 {filename}'))
+            except Exception as e:
+                logger.error(f"使用CYRUS方法转换失败: {str(e)}", exc_info=True)
+                # 告知用户转换失败，但系统会自动使用默认方法
+                job.messages.append(('warning', f'CYRUS方法转换失败，已自动降级到默认方法: {str(e)}'))
+                logger.info("尝试使用默认方法")
                 image_paths = convert_docx_to_md(input_path, output_path, output_dir)
-                logger.info(f"默认方法转换成功，提取到 {len(image_paths) if image_paths else 0} 张图片")
-                
-        elif filename.lower().endswith('.pdf'):
-            logger.info(f"处理PDF文件: {filename}")
-            # 使用统一的图片和输出目录
-            convert_pdf_to_md(input_path, output_path, output_dir)
+                logger.info(f"默认方法转换成功，提取到 {len(image_paths)} 张图片")
         else:
-            logger.error(f"不支持的文件类型: {filename}")
-            flash(f'不支持的文件类型: {filename}', 'error')
-            return redirect(url_for('index'))
-        
-        # 验证转换后的文件是否存在
-        if not os.path.exists(output_path):
-            logger.error(f"转换失败，输出文件不存在: {output_path}")
-            flash(f'转换失败，无法生成输出文件', 'error')
-            return redirect(url_for('index'))
-        
-        # 上传图片到Gitee并更新Markdown文件中的图片链接
-        try:
-            logger.info("上传图片到Gitee")
-            # 使用统一的目录
-            upload_images_to_gitee(output_path, output_dir)
-        except Exception as e:
-            logger.warning(f"上传图片到Gitee失败: {str(e)}")
-            flash(f'文件已转换，但上传图片到Gitee失败: {str(e)}', 'warning')
+            # 使用默认方法
+            logger.info(f"使用默认方法转换文件: {filename}")
+            image_paths = convert_docx_to_md(input_path, output_path, output_dir)
+            logger.info(f"默认方法转换成功，提取到 {len(image_paths) if image_paths else 0} 张图片")
+            
+    elif filename.lower().endswith('.pdf'):
+        logger.info(f"处理PDF文件: {filename}")
+        # 使用统一的图片和输出目录
+        # 每处理完一页更新进度，第一遍提取时就写出临时版本，转换过程中即可下载已完成的页面预览
+        def report_progress(done, total, stage):
+            job.progress = {'done': done, 'total': total, 'stage': stage, 'output': f"{output_folder_name}/{output_filename}"}
         
-        logger.info(f"文件 {filename} 转换成功")
-        flash(f'文件 {filename} 转换成功!', 'success')
+        convert_pdf_to_md(input_path, output_path, output_dir, page_range=pages, progress=report_progress)
+    else:
+        raise ValueError(f'不支持的文件类型: {filename}')
+    
+    # 验证转换后的文件是否存在
+    if not os.path.exists(output_path):
+        raise RuntimeError('转换失败，无法生成输出文件')
+    
+    # 上传图片到配置的图片存储并更新Markdown文件中的图片链接，有图片上传失败时抛出ImageUploadError
+    upload_failed = False
+    try:
+        logger.info("上传图片到图片存储")
+        # 使用统一的目录
+        publish_markdown_images(output_path, output_dir)
     except Exception as e:
-        logger.error(f"转换失败: {str(e)}", exc_info=True)
-        flash(f'转换失败: {str(e)}', 'error')
+        upload_failed = True
+        logger.warning(f"上传图片失败: {str(e)}")
+        job.messages.append(('warning', f'文件已转换，但上传图片失败: {str(e)}'))
+    
+    result = f"{output_folder_name}/{output_filename}"
+    # 图片上传失败的结果记为不完整：计入缓存大小，但不会命中，下次转换时重新上传
+    if cache_key is not None:
+        conversion_cache.put(cache_key, result, complete=not upload_failed)
+    
+    logger.info(f"文件 {filename} 转换成功")
+    job.messages.append(('success', f'文件 {filename} 转换成功!'))
+    return result
+
+def wants_json():
+    """判断请求方是否期望JSON响应（前端轮询脚本）"""
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest' or \
+        request.accept_mimetypes.best == 'application/json'
+
+@app.route('/convert/<filename>')
+def convert_file(filename):
+    logger.info(f"转换文件: {filename}")
+    input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    
+    # 验证文件是否存在
+    if not os.path.exists(input_path):
+        logger.error(f"文件不存在: {input_path}")
+        if wants_json():
+            return jsonify({'error': f'文件 {filename} 不存在'}), 404
+        flash(f'文件 {filename} 不存在', 'error')
+        return redirect(url_for('index'))
+    
+    # 获取选择的转换方法
+    conversion_method = request.args.get('method', 'default')
+    
+    # PDF可以只转换部分页面，例如 pages=1-10
+    pages = request.args.get('pages') or None
+    if pages:
+        from utils.pdf_to_md import resolve_page_range, pdf_page_count
+        try:
+            if not filename.lower().endswith('.pdf'):
+                raise ValueError('只有PDF文件支持按页码范围转换')
+            # 提交前按文档页数检查范围，超出文档的结束页截断为最后一页
+            start, stop = resolve_page_range(pages, pdf_page_count(input_path))
+        except ValueError as e:
+            logger.warning(str(e))
+            if wants_json():
+                return jsonify({'error': str(e)}), 400
+            flash(str(e), 'error')
+            return redirect(url_for('index'))
+        pages = f"{start + 1}-{stop}"
+    
+    # 提交到后台任务队列，请求立即返回
+    try:
+        job = job_manager.submit(run_conversion, filename, conversion_method, filename, conversion_method, pages)
+    except JobQueueFullError as e:
+        logger.warning(str(e))
+        if wants_json():
+            return jsonify({'error': str(e)}), 503
+        flash(f'{str(e)}，请稍后再试', 'warning')
+        return redirect(url_for('index'))
     
+    if wants_json():
+        return jsonify(job.to_dict()), 202
+    
+    flash(f'文件 {filename} 已提交转换，完成后页面将自动刷新', 'success')
     return redirect(url_for('index'))
 
+@app.route('/jobs')
+def list_jobs():
+    return jsonify([job.to_dict() for job in job_manager.list_jobs()])
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': f'任务 {job_id} 不存在'}), 404
+    # 任务结束后把提示消息放入flash，前端刷新页面后由模板显示
+    if job.finished:
+        for category, message in job.take_messages():
+            flash(message, category)
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': f'任务 {job_id} 不存在'}), 404
+    if not job.finished:
+        return jsonify(job.to_dict()), 202
+    if job.status != JOB_SUCCESS:
+        return jsonify(job.to_dict()), 500
+    return redirect(url_for('download_file', filepath=job.result))
+
 @app.route('/download/<path:filepath>')
 def download_file(filepath):
     logger.info(f"下载文件: {filepath}")
@@ -360,6 +427,12 @@ def download_file(filepath):
         folder_path = os.path.join(app.config['OUTPUT_FOLDER'], folder)
         file_path = os.path.join(folder_path, filename)
         
+        # 不提供隐藏文件和目录（如旧版本留在outputs下的图片仓库克隆的.git）
+        if any(part.startswith('.') for part in filepath.replace('\\', '/').split('/')):
+            logger.warning(f"拒绝下载隐藏文件: {filepath}")
+            flash(f'文件 {filename} 不存在', 'error')
+            return redirect(url_for('index'))
+        
         # 验证文件是否存在
         if not os.path.exists(file_path):
             logger.error(f"下载文件不存在: {file_path}")
@@ -372,6 +445,12 @@ def download_file(filepath):
         flash(f'下载文件失败: {str(e)}', 'error')
         return redirect(url_for('index'))
 
+@app.route('/images/<path:key>')
+def stored_image(key):
+    """本地图片存储（IMAGE_STORAGE_BACKEND=local）的静态访问，生产环境可由CDN或静态服务器代替"""
+    from utils.image_storage import IMAGE_STORAGE_LOCAL_DIR
+    return send_from_directory(os.path.abspath(IMAGE_STORAGE_LOCAL_DIR), key)
+
 @app.route('/delete/upload/<filename>')
 def delete_upload(filename):
     logger.info(f"删除上传文件: {filename}")
@@ -65,7 +65,7 @@ def test_cyrus_converter():
             
             # 直接使用已有的docx_to_markdown函数
             logger.info("使用docx_to_markdown函数")
-            markdown_content = docx_to_markdown(docx_file, output_path)
+            output_path = docx_to_markdown(docx_file, output_path)
             logger.info(f"已生成Markdown文件: {output_path}")
             
         except Exception as direct_error:
@@ -87,7 +87,7 @@ def test_cyrus_converter():
                 
                 # 直接使用docx_to_markdown函数
                 logger.info("使用docx_to_markdown函数")
-                markdown_content = docx_to_markdown(docx_file, output_path)
+                output_path = docx_to_markdown(docx_file, output_path)
                 logger.info(f"已生成Markdown文件: {output_path}")
                 
             except Exception as absolute_error:
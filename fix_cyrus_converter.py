@@ -15,13 +15,11 @@ logger = logging.getLogger(__name__)
 
 # 导入修复模块
 import fix_docx_converter
+from utils.image_storage import converter_image_link
 
 # 确保修补已应用
 fix_docx_converter.fix_all()
 
-# Gitee基础URL
-GITEE_BASE_URL = "https://gitee.com/comma-dong/image-projects/raw/master/"
-
 def fix_cyrus_converter():
     """
     执行Cyrus转换器的修复操作
@@ -134,7 +132,7 @@ def convert_docx_to_md(docx_path, output_path, image_dir=None):
                 if element.image:
                     image_name = os.path.basename(element.image['file'])
                     folder_name = doc_name + "_outputs"
-                    remote_url = f"{GITEE_BASE_URL}{folder_name}/{image_name}"
+                    remote_url = converter_image_link(folder_name, image_name)
                     markdown_content.append(f"\n![{image_name}]({remote_url})\n")
             
             elif hasattr(element, 'rows'):  # 如果是表格
@@ -164,7 +162,7 @@ def convert_docx_to_md(docx_path, output_path, image_dir=None):
 
 def _update_image_links(md_file_path, image_folder_name):
     """
-    更新Markdown文件中的图片链接为Gitee远程链接
+    更新Markdown文件中的图片链接为图片存储的链接
     
     Args:
         md_file_path (str): Markdown文件路径
@@ -190,8 +188,8 @@ def _update_image_links(md_file_path, image_folder_name):
             # 获取图片文件名
             img_filename = os.path.basename(img_path)
             
-            # 创建新的远程链接
-            remote_url = f"{GITEE_BASE_URL}{image_folder_name}/{img_filename}"
+            # 创建新的图片链接
+            remote_url = converter_image_link(image_folder_name, img_filename)
             
             # 增加计数
             replaced_count += 1
@@ -13,101 +13,21 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
 
 def patch_docx_parser():
-    """动态给DocxParser类添加extract_image方法"""
+    """检查DocxParser类是否提供extract_image方法（现已内置，无需动态添加）"""
     try:
-        logger.info("准备给DocxParser类添加extract_image方法")
-        
-        # 导入需要修补的类
+        # 导入需要检查的类
         from utils.docx2markdown.docx_parser import DocxParser
-        import zipfile
-        import os
-        
-        # 定义要添加的方法
-        def extract_image(self, image_path, output_path):
-            """
-            从.docx文件中提取指定的图片并保存到指定路径
-            
-            Args:
-                image_path (str): docx中的图片路径，例如: 'word/media/image1.png'
-                output_path (str): 图片保存的目标路径
-            
-            Returns:
-                bool: 是否成功提取图片
-            """
-            try:
-                logger.info(f"尝试提取图片: {image_path} 到 {output_path}")
-                with zipfile.ZipFile(self.file_path, 'r') as docx_zip:
-                    # 获取所有媒体文件列表
-                    media_files = [name for name in docx_zip.namelist() if name.startswith('word/media/')]
-                    logger.info(f"文档中的媒体文件数量: {len(media_files)}")
-                    
-                    # 检查文件是否存在
-                    if image_path in docx_zip.namelist():
-                        # 获取图片数据
-                        image_data = docx_zip.read(image_path)
-                        
-                        # 确保输出目录存在
-                        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                        
-                        # 保存图片
-                        with open(output_path, 'wb') as img_file:
-                            img_file.write(image_data)
-                        logger.info(f"成功提取图片: {image_path} 到 {output_path}")
-                        return True
-                    else:
-                        logger.info(f"图片 {image_path} 不存在于 .docx 文件中，尝试匹配文件名...")
-                        
-                        # 尝试通过基本名称匹配
-                        base_name = os.path.basename(image_path)
-                        for name in docx_zip.namelist():
-                            if name.endswith(base_name) or base_name in name:
-                                logger.info(f"找到匹配文件: {name}")
-                                # 获取图片数据
-                                image_data = docx_zip.read(name)
-                                
-                                # 确保输出目录存在
-                                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                                
-                                # 保存图片
-                                with open(output_path, 'wb') as img_file:
-                                    img_file.write(image_data)
-                                logger.info(f"通过匹配文件名成功提取图片: {name} 到 {output_path}")
-                                return True
-                        
-                        # 如果找不到匹配的图片，尝试从media文件夹中提取第一个图片
-                        if media_files:
-                            logger.info(f"未找到匹配的图片，尝试提取第一个媒体文件: {media_files[0]}")
-                            image_data = docx_zip.read(media_files[0])
-                            
-                            # 确保输出目录存在
-                            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                            
-                            # 保存图片
-                            with open(output_path, 'wb') as img_file:
-                                img_file.write(image_data)
-                            logger.info(f"已提取替代图片: {media_files[0]} 到 {output_path}")
-                            return True
-                        
-                        logger.info(f"无法在文档中找到任何可用图片")
-                        return False
-            except Exception as e:
-                logger.error(f"提取图片时出错: {str(e)}")
-                traceback.print_exc()
-                return False
-        
-        # 将方法添加到类中
-        DocxParser.extract_image = extract_image
         
-        # 验证添加成功
-        if hasattr(DocxParser, 'extract_image'):
-            logger.info("成功添加extract_image方法到DocxParser类")
+        # DocxParser自带常驻zip句柄和媒体索引，不能再用逐次打开zip的实现覆盖
+        if hasattr(DocxParser, 'extract_image') and hasattr(DocxParser, 'extract_media'):
+            logger.info("DocxParser已提供extract_image和extract_media方法，无需修补")
             return True
         else:
-            logger.error("添加方法失败")
+            logger.error("DocxParser缺少extract_image方法")
             return False
     
     except Exception as e:
-        logger.error(f"修补DocxParser时出错: {str(e)}")
+        logger.error(f"检查DocxParser时出错: {str(e)}")
         traceback.print_exc()
         return False
 
@@ -82,14 +82,100 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // 显示一条消息（与服务端flash消息样式一致）
+    function showMessage(category, text) {
+        let container = document.querySelector('.flash-messages');
+        if (!container) {
+            container = document.createElement('div');
+            container.className = 'flash-messages';
+            document.querySelector('.container').appendChild(container);
+        }
+        const message = document.createElement('div');
+        message.className = `flash-message ${category}`;
+        message.textContent = text;
+        const closeBtn = document.createElement('span');
+        closeBtn.className = 'close-btn';
+        closeBtn.innerHTML = '&times;';
+        closeBtn.addEventListener('click', function() {
+            message.remove();
+        });
+        message.appendChild(closeBtn);
+        container.appendChild(message);
+    }
+    
+    // 轮询后台转换任务状态，完成后刷新页面以显示新的转换文件
+    const jobStatusText = document.getElementById('convert-job-status');
+    const statusLabels = {pending: '排队中', running: '转换中', success: '已完成', failed: '失败'};
+    const progressLabels = {extract: '分析页面', write: '生成Markdown'};
+    const runningJobs = new Set();
+    
+    function pollJob(jobId) {
+        if (runningJobs.has(jobId)) {
+            return;
+        }
+        runningJobs.add(jobId);
+        if (convertLoading) {
+            convertLoading.style.display = 'block';
+        }
+        
+        const poll = function() {
+            fetch(`/jobs/${jobId}`, {headers: {'Accept': 'application/json'}})
+                .then(function(response) { return response.json(); })
+                .then(function(job) {
+                    if (job.error && !job.status) {
+                        throw new Error(job.error);
+                    }
+                    if (jobStatusText) {
+                        let text = `${job.filename}: ${statusLabels[job.status] || job.status}`;
+                        // PDF逐页转换的进度
+                        if (job.progress && !job.finished) {
+                            const stage = progressLabels[job.progress.stage] || job.progress.stage;
+                            text += ` (${stage} ${job.progress.done}/${job.progress.total} 页)`;
+                        }
+                        jobStatusText.textContent = text;
+                    }
+                    if (!job.finished) {
+                        setTimeout(poll, 1000);
+                        return;
+                    }
+                    // 任务消息已由服务端放入flash，刷新页面后与转换文件列表一起显示
+                    runningJobs.delete(jobId);
+                    if (runningJobs.size === 0) {
+                        window.location.reload();
+                    }
+                })
+                .catch(function(err) {
+                    console.error(`查询转换任务失败: ${err}`);
+                    runningJobs.delete(jobId);
+                    showMessage('error', `查询转换任务失败: ${err.message || err}`);
+                    if (runningJobs.size === 0 && convertLoading) {
+                        convertLoading.style.display = 'none';
+                    }
+                });
+        };
+        poll();
+    }
+    
+    // 页面加载时继续轮询尚未完成的任务
+    if (convertLoading && convertLoading.dataset.activeJobs) {
+        try {
+            JSON.parse(convertLoading.dataset.activeJobs).forEach(function(job) {
+                pollJob(job.id);
+            });
+        } catch (err) {
+            console.error(`解析任务列表失败: ${err}`);
+        }
+    }
+    
     // 标签页转换选项的处理
     if (convertBtns.length > 0 && convertLoading) {
         // 对每个转换按钮添加点击高亮效果
         convertBtns.forEach(function(btn) {
-            // 点击转换按钮时
+            // 点击转换按钮时，提交后台任务并轮询状态
             btn.addEventListener('click', function(e) {
                 const filename = this.getAttribute('data-filename');
                 if (filename) {
+                    e.preventDefault();
                     convertLoading.style.display = 'block';
                     console.log(`开始转换文件: ${filename}, 使用方法: ${this.getAttribute('data-method')}`);
                     
@@ -101,6 +187,23 @@ document.addEventListener('DOMContentLoaded', function() {
                         });
                         this.classList.add('active');
                     }
+                    
+                    fetch(this.getAttribute('href'), {
+                        headers: {'Accept': 'application/json', 'X-Requested-With': 'XMLHttpRequest'}
+                    })
+                        .then(function(response) { return response.json(); })
+                        .then(function(job) {
+                            if (!job.id) {
+                                throw new Error(job.error || '提交转换任务失败');
+                            }
+                            pollJob(job.id);
+                        })
+                        .catch(function(err) {
+                            showMessage('error', err.message || String(err));
+                            if (runningJobs.size === 0) {
+                                convertLoading.style.display = 'none';
+                            }
+                        });
                 }
             });
             
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+代码段落分类基准测试
+
+在合成的段落语料上对比原来逐个 re.search 的实现与 utils.code_classifier，
+并校验代码语法、命令行和语言检测结果完全一致
+
+用法:
+    python tests/benchmarks/bench_code_classifier.py [--paragraphs 10000]
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from utils.code_classifier import (
+    CODE_SYNTAX_PATTERNS,
+    BASH_COMMAND_PATTERNS,
+    has_code_syntax,
+    is_bash_command,
+    detect_code_language,
+)
+
+SAMPLES = [
+    # 代码
+    "import os\nfrom pathlib import Path\nprint(Path('.').resolve())",
+    "def handler(event, context):\n    return {'status': 200}",
+    "const app = require('express')();\nconsole.log('listening');",
+    "SELECT id, name FROM users WHERE created_at > NOW() - INTERVAL 1 DAY;",
+    "select count(*) from orders group by status",
+    "docker run -d -p 8080:80 --name web nginx:latest",
+    "sudo apt install -y build-essential && mkdir -p /opt/app",
+    "git clone https://github.com/example/repo.git && cd repo",
+    "<div class=\"note\"><span>提示</span><br/></div>",
+    "#include <stdio.h>\nint main(void) { return 0; }",
+    "public static void main(String[] args) { System.out.println(\"hi\"); }",
+    "using System;\nnamespace Demo { class Program { private void Run() {} } }",
+    "package main\n\nimport \"fmt\"\n\nfunc main() { fmt.Println(\"hi\") }",
+    "<?php echo $user->name; ?>",
+    "fn main() { let mut total = 0; for i in 0..10 { total += i; } }",
+    "library(dplyr)\ndf <- data.frame(x = 1:10)",
+    "# server: production\nport: 8080",
+    "{\"name\": \"demo\", \"version\": \"1.0.0\"}",
+    "export class AppComponent implements OnInit { @Input() title: string; ngOnInit() {} }",
+    "$('.menu').toggleClass('open'); $.ajax({url: '/api'})",
+    "<template><div>{{ msg }}</div></template>\nexport default { methods: {} }",
+    "curl https://example.com/install.sh | bash",
+    "pip install -r requirements.txt",
+    "$ python manage.py runserver 0.0.0.0:8000",
+    "{",
+    "}",
+    "return result;",
+    "if (count > 0) { total += count; }",
+    # 正文
+    "本节介绍如何在服务器上部署应用，并说明常见问题的处理方法。",
+    "安装完成后，打开浏览器访问管理页面，按照提示完成初始化配置。",
+    "The following section describes how the import pipeline handles large files.",
+    "注意：配置文件修改后需要重启服务才能生效。",
+    "第三步：填写项目名称和描述，然后点击创建按钮。",
+    "Performance improved significantly after we switched the storage engine.",
+    "参考文档：https://example.com/docs/getting-started",
+    "使用 ./scripts/deploy.sh 脚本可以一键完成发布。",
+    "Note: the match between the two datasets is not exact.",
+    "数据处理流程包括采集、清洗、建模和评估四个阶段。",
+]
+
+def legacy_has_code_syntax(text):
+    """原来的实现：逐个未编译的模式依次搜索"""
+    return any(re.search(pattern, text) for pattern in CODE_SYNTAX_PATTERNS)
+
+def legacy_is_bash_command(text):
+    """原来的实现：逐个模式依次搜索，找到即停止"""
+    for pattern in BASH_COMMAND_PATTERNS:
+        if re.search(pattern, text, re.IGNORECASE):
+            return True
+    return False
+
+def legacy_detect_code_language(code_text):
+    """原来format_paragraph中的语言检测：按优先级依次搜索"""
+    code_language = ""
+    if re.search(r'\b(def|class|import|from|print)\b', code_text):
+        code_language = "python"
+    elif re.search(r'\b(function|var|let|const|require|console\.log)\b', code_text):
+        code_language = "javascript"
+    elif re.search(r'\b(SELECT|INSERT|UPDATE|DELETE|CREATE|ALTER)\b', code_text, re.IGNORECASE):
+        code_language = "sql"
+    elif re.search(r'\b(docker|apt|yum|rpm|git|cd|mkdir|tar|curl)\b', code_text):
+        code_language = "bash"
+    elif re.search(r'<\w+>.*?</w+>|<\w+.*?/>', code_text):
+        code_language = "html"
+    elif re.search(r'^\s*#include|int\s+main\s*\(', code_text):
+        code_language = "cpp"
+    elif re.search(r'\b(package|import java|public class|public static void main)\b', code_text):
+        code_language = "java"
+    elif re.search(r'\b(using System|namespace|public class|private void)\b', code_text):
+        code_language = "csharp"
+    elif re.search(r'\b(func|package main|import \(|fmt\.)\b', code_text):
+        code_language = "go"
+    elif re.search(r'\b(<?php|echo|namespace|use [\w\\]+;)\b', code_text):
+        code_language = "php"
+    elif re.search(r'\b(fn|let mut|impl|struct|enum|match)\b', code_text):
+        code_language = "rust"
+    elif re.search(r'\b(library|tidyverse|dplyr|ggplot2|data\.frame)\b', code_text):
+        code_language = "r"
+    elif re.search(r'(^|\n)[ \t]*(#|//|;)[ \t]*\[?[A-Za-z0-9-_]+\]?[ \t]*:', code_text):
+        code_language = "yaml"
+    elif re.search(r'\{\s*"[^"]+"\s*:\s*[^{}]+\}', code_text):
+        code_language = "json"
+    elif re.search(r'\b(module|export|component|ngOnInit|@Input|@Output)\b', code_text):
+        code_language = "typescript"
+    elif re.search(r'\$\(.*\)|\$\.\w+\(', code_text):
+        code_language = "jquery"
+    elif re.search(r'<template>|export default {|methods:|computed:', code_text):
+        code_language = "vue"
+    return code_language
+
+def make_corpus(count, seed=0):
+    """随机拼接样本段落，部分段落由多个样本组成"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        parts = rng.sample(SAMPLES, rng.choice([1, 1, 1, 2, 3]))
+        corpus.append("\n".join(parts))
+    return corpus
+
+def run(funcs, corpus):
+    """返回每个段落的平均耗时（微秒）和分类结果"""
+    start = time.perf_counter()
+    results = [tuple(func(text) for func in funcs) for text in corpus]
+    return (time.perf_counter() - start) / len(corpus) * 1e6, results
+
+def main():
+    parser = argparse.ArgumentParser(description='代码段落分类基准测试')
+    parser.add_argument('--paragraphs', type=int, default=10000, help='段落数量')
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.paragraphs)
+    legacy_time, expected = run((legacy_has_code_syntax, legacy_is_bash_command, legacy_detect_code_language), corpus)
+    print(f"{'原实现':<10}{legacy_time:8.1f} us/段落")
+
+    new_time, results = run((has_code_syntax, is_bash_command, detect_code_language), corpus)
+    status = '一致' if results == expected else '不一致!'
+    print(f"{'新实现':<10}{new_time:8.1f} us/段落  加速 {legacy_time / new_time:5.1f}x  结果{status}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+最长公共子串微基准测试
+
+对比原来的动态规划实现与 utils.docx_to_md 中各个实现的耗时，并校验结果一致
+
+用法:
+    python tests/benchmarks/bench_lcs.py [--pairs 200] [--length 200]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from utils.docx_to_md import LCS_BACKENDS, LCS_MAX_LENGTH, longest_common_substring
+
+SAMPLE_TEXT = '数据处理流程模型训练评估部署接口说明安装步骤如下结果 abcdefghijklmnopqrstuvwxyz'
+
+def lcs_dynamic_programming(s1, s2):
+    """原来的实现：每次调用分配(m+1)×(n+1)的DP表"""
+    if not s1 or not s2:
+        return ""
+    s1 = s1[:LCS_MAX_LENGTH]
+    s2 = s2[:LCS_MAX_LENGTH]
+    m, n = len(s1), len(s2)
+    dp = [[0] * (n + 1) for _ in range(m + 1)]
+    max_length = 0
+    end_pos = 0
+    for i in range(1, m + 1):
+        for j in range(1, n + 1):
+            if s1[i-1] == s2[j-1]:
+                dp[i][j] = dp[i-1][j-1] + 1
+                if dp[i][j] > max_length:
+                    max_length = dp[i][j]
+                    end_pos = i
+    return s1[end_pos - max_length:end_pos]
+
+def make_pairs(count, length, seed=0):
+    """生成随机文本对"""
+    rng = random.Random(seed)
+    return [
+        (''.join(rng.choice(SAMPLE_TEXT) for _ in range(length)),
+         ''.join(rng.choice(SAMPLE_TEXT) for _ in range(length)))
+        for _ in range(count)
+    ]
+
+def run(func, pairs):
+    """返回每次调用的平均耗时（微秒）和结果列表"""
+    start = time.perf_counter()
+    results = [func(a, b) for a, b in pairs]
+    return (time.perf_counter() - start) / len(pairs) * 1e6, results
+
+def main():
+    parser = argparse.ArgumentParser(description='最长公共子串微基准测试')
+    parser.add_argument('--pairs', type=int, default=200, help='文本对数量')
+    parser.add_argument('--length', type=int, default=LCS_MAX_LENGTH, help='每段文本的长度')
+    args = parser.parse_args()
+
+    pairs = make_pairs(args.pairs, args.length)
+    baseline_time, expected = run(lcs_dynamic_programming, pairs)
+    print(f"{'dp':<12}{baseline_time:10.1f} us/次")
+
+    for name in LCS_BACKENDS:
+        elapsed, results = run(lambda a, b: longest_common_substring(a, b, backend=name), pairs)
+        status = '一致' if results == expected else '不一致!'
+        print(f"{name:<12}{elapsed:10.1f} us/次  加速 {baseline_time / elapsed:5.1f}x  结果{status}")
+
+if __name__ == '__main__':
+    main()
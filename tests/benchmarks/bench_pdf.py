@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+PDF转Markdown基准测试
+
+生成多页PDF，对比原来的双后端实现（每页额外用PyPDF2提取一遍文本）、
+串行转换与进程池并行转换的耗时，并校验输出一致
+
+用法:
+    python tests/benchmarks/bench_pdf.py [--pages 200] [--workers 8]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import PyPDF2
+from utils import pdf_to_md
+from utils.pdf_to_md import fitz, extract_page_content, collect_font_histogram, derive_heading_tiers, lines_to_markdown
+
+def make_pdf(path, pages):
+    """生成每页包含标题和多段正文的PDF"""
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 60), f"Chapter {i + 1}", fontsize=20, fontname="hebo")
+        for j in range(40):
+            page.insert_text((72, 90 + j * 17), f"Paragraph {j} of page {i + 1}: lorem ipsum dolor sit amet, https://example.com/{i}/{j}", fontsize=10)
+    doc.save(path)
+    doc.close()
+
+def convert_legacy(pdf_path):
+    """原来的串行实现：PyPDF2和PyMuPDF各打开一次，每页的PyPDF2文本提取结果未被使用"""
+    reader = PyPDF2.PdfReader(pdf_path)
+    doc = fitz.open(pdf_path)
+    pages = []
+    for page_num in range(len(reader.pages)):
+        reader.pages[page_num].extract_text()
+        pages.append(extract_page_content(doc.load_page(page_num)))
+    _, heading_tiers = derive_heading_tiers(collect_font_histogram(pages))
+    md_content = []
+    for lines in pages:
+        md_content.extend(lines_to_markdown(lines, heading_tiers, lambda image: image.ref))
+    return "\n".join(md_content)
+
+def run(pdf_path, output_dir, workers):
+    """返回转换耗时（秒）和生成的Markdown"""
+    output_path = os.path.join(output_dir, f"out_{workers}.md")
+    start = time.perf_counter()
+    pdf_to_md.convert_pdf_to_md(pdf_path, output_path, os.path.join(output_dir, 'images'), workers=workers)
+    elapsed = time.perf_counter() - start
+    with open(output_path, encoding='utf-8') as f:
+        return elapsed, f.read()
+
+def main():
+    parser = argparse.ArgumentParser(description='PDF转Markdown基准测试')
+    parser.add_argument('--pages', type=int, default=200, help='PDF页数')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='并行转换的进程数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = os.path.join(tmp, 'bench.pdf')
+        make_pdf(pdf_path, args.pages)
+
+        start = time.perf_counter()
+        legacy = convert_legacy(pdf_path)
+        legacy_time = time.perf_counter() - start
+        print(f"{'原实现':<10}{legacy_time:8.2f} s")
+
+        serial_time, expected = run(pdf_path, tmp, 1)
+        status = '一致' if expected == legacy else '不一致!'
+        print(f"{'串行':<10}{serial_time:8.2f} s  节省 {1 - serial_time / legacy_time:5.1%}  输出{status}")
+
+        parallel_time, result = run(pdf_path, tmp, args.workers)
+        status = '一致' if result == expected else '不一致!'
+        print(f"{f'{args.workers}进程':<10}{parallel_time:8.2f} s  加速 {serial_time / parallel_time:5.1f}x  输出{status}")
+
+if __name__ == '__main__':
+    main()
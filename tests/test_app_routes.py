@@ -0,0 +1,168 @@
+import fitz
+import threading
+import time
+import pytest
+import app as app_module
+from utils.conversion_jobs import ConversionJobManager
+
+
+def make_pdf(path, pages):
+    """生成指定页数的测试PDF"""
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f"Page {i + 1}")
+    doc.save(str(path))
+    doc.close()
+    return path
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """测试客户端：上传和输出目录放在临时目录，使用独立的任务队列，不启用转换缓存"""
+    uploads = tmp_path / "uploads"
+    outputs = tmp_path / "outputs"
+    uploads.mkdir()
+    outputs.mkdir()
+    monkeypatch.setitem(app_module.app.config, 'UPLOAD_FOLDER', str(uploads))
+    monkeypatch.setitem(app_module.app.config, 'OUTPUT_FOLDER', str(outputs))
+    monkeypatch.setitem(app_module.app.config, 'TESTING', True)
+    manager = ConversionJobManager(max_workers=1, max_pending=2)
+    monkeypatch.setattr(app_module, 'job_manager', manager)
+    monkeypatch.setattr(app_module, 'conversion_cache', None)
+    with app_module.app.test_client() as client:
+        yield client
+    manager.shutdown()
+
+
+XHR = {'X-Requested-With': 'XMLHttpRequest'}
+
+
+def test_page_range_is_checked_against_page_count(client, tmp_path, monkeypatch):
+    """起始页超出文档页数时直接返回400，不提交任务也不创建输出目录"""
+    make_pdf(tmp_path / "uploads" / "doc.pdf", pages=5)
+    submitted = []
+    monkeypatch.setattr(app_module, 'run_conversion', lambda job, *args: submitted.append(args))
+
+    response = client.get('/convert/doc.pdf?pages=9-', headers=XHR)
+    assert response.status_code == 400
+    assert '超出文档页数' in response.get_json()['error']
+    assert submitted == []
+    assert list((tmp_path / "outputs").iterdir()) == []
+
+    # 结束页超出文档时截断为最后一页
+    response = client.get('/convert/doc.pdf?pages=2-', headers=XHR)
+    assert response.status_code == 202
+    app_module.job_manager.shutdown()
+    assert submitted == [('doc.pdf', 'default', '2-5')]
+
+
+def wait_finished(client, job_id, timeout=5):
+    """轮询任务状态直到结束"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f'/jobs/{job_id}', headers=XHR).get_json()
+        if job['finished']:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"任务 {job_id} 没有在 {timeout} 秒内结束")
+
+
+def flashed_messages(client):
+    with client.session_transaction() as session:
+        return list(session.get('_flashes', []))
+
+
+def test_convert_returns_job_json_or_redirect(client, tmp_path, monkeypatch):
+    """XHR请求返回202和任务JSON，普通请求重定向到首页"""
+    (tmp_path / "uploads" / "a.docx").write_bytes(b"docx")
+    monkeypatch.setattr(app_module, 'run_conversion', lambda job, filename, method, pages: "a_outputs/a.md")
+
+    response = client.get('/convert/a.docx?method=cyrus', headers=XHR)
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['filename'] == 'a.docx' and job['method'] == 'cyrus' and job['id']
+
+    response = client.get('/convert/a.docx')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/')
+
+
+def test_convert_rejects_bad_input(client, tmp_path):
+    """不存在的文件返回404，非法的页码范围返回400"""
+    (tmp_path / "uploads" / "a.docx").write_bytes(b"docx")
+    make_pdf(tmp_path / "uploads" / "doc.pdf", pages=3)
+
+    assert client.get('/convert/missing.docx', headers=XHR).status_code == 404
+    for url in ('/convert/doc.pdf?pages=abc', '/convert/doc.pdf?pages=3-1', '/convert/a.docx?pages=1-2'):
+        response = client.get(url, headers=XHR)
+        assert response.status_code == 400, url
+        assert response.get_json()['error']
+
+
+def test_convert_returns_503_when_queue_is_full(client, tmp_path, monkeypatch):
+    """执行中和排队的任务达到上限（1个执行 + 2个排队）时返回503"""
+    (tmp_path / "uploads" / "a.docx").write_bytes(b"docx")
+    release = threading.Event()
+    monkeypatch.setattr(app_module, 'run_conversion', lambda job, *args: release.wait(5))
+
+    try:
+        statuses = [client.get('/convert/a.docx', headers=XHR).status_code for _ in range(4)]
+        assert statuses == [202, 202, 202, 503]
+        assert '任务过多' in client.get('/convert/a.docx', headers=XHR).get_json()['error']
+    finally:
+        release.set()
+
+
+def test_job_status_flashes_messages_once(client, tmp_path, monkeypatch):
+    """任务结束后查询状态时消息放入flash，只放入一次；未知任务返回404"""
+    (tmp_path / "uploads" / "a.docx").write_bytes(b"docx")
+
+    def convert(job, filename, method, pages):
+        job.messages.append(('success', f'文件 {filename} 转换成功!'))
+        return "a_outputs/a.md"
+
+    monkeypatch.setattr(app_module, 'run_conversion', convert)
+    job_id = client.get('/convert/a.docx', headers=XHR).get_json()['id']
+
+    job = wait_finished(client, job_id)
+    assert job['status'] == 'success'
+    assert job['result'] == 'a_outputs/a.md'
+    assert flashed_messages(client) == [('success', '文件 a.docx 转换成功!')]
+
+    client.get('/')  # 首页显示后flash被清空
+    client.get(f'/jobs/{job_id}', headers=XHR)
+    assert flashed_messages(client) == []
+
+    response = client.get('/jobs/unknown', headers=XHR)
+    assert response.status_code == 404
+    assert 'unknown' in response.get_json()['error']
+
+
+def test_job_result(client, tmp_path, monkeypatch):
+    """结果接口：未完成返回202，成功时重定向到下载，失败返回500，未知任务返回404"""
+    (tmp_path / "uploads" / "a.docx").write_bytes(b"docx")
+    (tmp_path / "uploads" / "b.docx").write_bytes(b"docx")
+    release = threading.Event()
+
+    def convert(job, filename, method, pages):
+        release.wait(5)
+        if filename == 'b.docx':
+            raise RuntimeError('转换失败')
+        return "a_outputs/a.md"
+
+    monkeypatch.setattr(app_module, 'run_conversion', convert)
+    ok_id = client.get('/convert/a.docx', headers=XHR).get_json()['id']
+    failed_id = client.get('/convert/b.docx', headers=XHR).get_json()['id']
+
+    assert client.get(f'/jobs/{ok_id}/result').status_code == 202
+    release.set()
+    wait_finished(client, ok_id)
+    wait_finished(client, failed_id)
+
+    response = client.get(f'/jobs/{ok_id}/result')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/download/a_outputs/a.md')
+    response = client.get(f'/jobs/{failed_id}/result')
+    assert response.status_code == 500
+    assert response.get_json()['status'] == 'failed'
+    assert client.get('/jobs/unknown/result').status_code == 404
@@ -0,0 +1,22 @@
+from utils.code_classifier import has_code_syntax, is_bash_command, detect_code_language
+
+
+def test_language_priority():
+    """多种语言特征同时出现时取优先级最高的语言，与原来的if/elif顺序一致"""
+    assert detect_code_language("import os\nSELECT * FROM t") == "python"
+    assert detect_code_language("select count(*) FROM users") == "sql"
+    assert detect_code_language("package main\nfunc main() { fmt.Println() }") == "java"
+    assert detect_code_language("docker compose up -d") == "bash"
+    assert detect_code_language('{"name": "demo"}') == "json"
+    assert detect_code_language("$('.menu').hide()") == "jquery"
+    assert detect_code_language("本节介绍部署步骤") == ""
+
+
+def test_code_syntax_and_commands():
+    """以 ^ 开头的模式只在段落开头匹配，其余模式在全文搜索"""
+    assert has_code_syntax("def main(): pass")
+    assert not has_code_syntax("我们 def main")
+    assert has_code_syntax("然后执行 pip install flask")
+    assert not has_code_syntax("普通的一段说明文字")
+    assert is_bash_command("SUDO apt update")
+    assert not is_bash_command("请先 cd 到项目目录")
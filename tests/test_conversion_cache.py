@@ -0,0 +1,112 @@
+import os
+from utils.conversion_cache import ConversionCache
+
+
+def make_result(output_root, name, size):
+    """在输出目录中生成一个转换结果（Markdown + 图片），返回相对路径"""
+    folder = output_root / f"{name}_outputs"
+    folder.mkdir()
+    (folder / f"{name}.md").write_text(f"# {name}\n", encoding="utf-8")
+    (folder / "image_1.png").write_bytes(b"\0" * size)
+    return f"{name}_outputs/{name}.md"
+
+
+def test_key_depends_on_content_and_method(tmp_path):
+    """缓存键只取决于文件内容、转换方法和转换器版本，与文件名无关"""
+    cache = ConversionCache(str(tmp_path / "outputs"))
+    first = tmp_path / "20250101000000_note.docx"
+    second = tmp_path / "20250102000000_note.docx"
+    other = tmp_path / "other.docx"
+    first.write_bytes(b"same content")
+    second.write_bytes(b"same content")
+    other.write_bytes(b"other content")
+
+    assert cache.key_for(str(first), "default") == cache.key_for(str(second), "default")
+    assert cache.key_for(str(first), "default") != cache.key_for(str(first), "cyrus")
+    assert cache.key_for(str(first), "default") != cache.key_for(str(other), "default")
+    assert ConversionCache(str(tmp_path / "outputs"), variant="local").key_for(str(first), "default") != \
+        cache.key_for(str(first), "default")
+    cache.close()
+
+
+def test_hit_and_deleted_result(tmp_path):
+    """命中时返回已有结果；输出文件被删除后视为未命中"""
+    output_root = tmp_path / "outputs"
+    output_root.mkdir()
+    cache = ConversionCache(str(output_root))
+    result = make_result(output_root, "a", 10)
+
+    assert cache.get("key-a") is None
+    cache.put("key-a", result)
+    assert cache.get("key-a") == result
+
+    os.remove(output_root / result)
+    assert cache.get("key-a") is None
+    assert cache.total_size() == 0
+    cache.close()
+
+
+def test_lru_eviction(tmp_path):
+    """总大小超过上限时淘汰最久未使用的输出目录"""
+    output_root = tmp_path / "outputs"
+    output_root.mkdir()
+    cache = ConversionCache(str(output_root), max_bytes=2500)
+
+    cache.put("key-a", make_result(output_root, "a", 1000))
+    cache.put("key-b", make_result(output_root, "b", 1000))
+    # 访问a后，b成为最久未使用的结果
+    assert cache.get("key-a") is not None
+    cache.put("key-c", make_result(output_root, "c", 1000))
+
+    assert cache.get("key-b") is None
+    assert not (output_root / "b_outputs").exists()
+    assert cache.get("key-a") == "a_outputs/a.md"
+    assert cache.get("key-c") == "c_outputs/c.md"
+    assert cache.total_size() <= 2500
+    cache.close()
+
+
+def test_rewritten_result_replaces_old_entry(tmp_path):
+    """同一输出目录被重新转换写入时，旧记录被替换，大小不重复计算，淘汰旧记录也不会删除新结果"""
+    output_root = tmp_path / "outputs"
+    output_root.mkdir()
+    cache = ConversionCache(str(output_root), max_bytes=1500)
+    result = make_result(output_root, "a", 1000)
+
+    cache.put("key-old", result)
+    cache.put("key-new", result)
+
+    assert cache.get("key-old") is None
+    assert cache.get("key-new") == result
+    assert cache.total_size() < 1500
+    assert (output_root / result).exists()
+    cache.close()
+
+
+def test_incomplete_result_counts_but_misses(tmp_path):
+    """不完整的结果不会命中，但计入总大小并参与淘汰；重新转换成功后替换为完整结果"""
+    output_root = tmp_path / "outputs"
+    output_root.mkdir()
+    cache = ConversionCache(str(output_root), max_bytes=1500)
+
+    cache.put("key-a", make_result(output_root, "a", 1000), complete=False)
+    assert cache.get("key-a") is None
+    assert cache.total_size() > 1000
+
+    cache.put("key-b", make_result(output_root, "b", 1000))
+    assert not (output_root / "a_outputs").exists()
+
+    cache.put("key-b", "b_outputs/b.md", complete=True)
+    assert cache.get("key-b") == "b_outputs/b.md"
+    cache.close()
+
+
+def test_index_is_created_lazily(tmp_path):
+    """创建缓存对象时不创建索引文件，第一次使用时才创建"""
+    db_path = tmp_path / "data" / "cache.sqlite3"
+    cache = ConversionCache(str(tmp_path / "outputs"), db_path=str(db_path))
+    assert not (tmp_path / "data").exists()
+
+    assert cache.get("missing") is None
+    assert db_path.exists()
+    cache.close()
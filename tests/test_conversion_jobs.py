@@ -0,0 +1,87 @@
+import threading
+import time
+import pytest
+from utils.conversion_jobs import (
+    ConversionJobManager,
+    JobQueueFullError,
+    JOB_SUCCESS,
+    JOB_FAILED,
+)
+
+
+def wait_for(job, timeout=5):
+    """等待任务结束"""
+    deadline = time.time() + timeout
+    while not job.finished and time.time() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def test_job_success_and_messages():
+    """任务返回值和消息应记录在任务中"""
+    manager = ConversionJobManager(max_workers=1)
+
+    def convert(job, name):
+        job.messages.append(('success', f'{name} 转换成功'))
+        return f"{name}_outputs/{name}.md"
+
+    job = wait_for(manager.submit(convert, 'a.docx', 'default', 'a'))
+    assert job.status == JOB_SUCCESS
+    assert job.result == 'a_outputs/a.md'
+    assert job.to_dict()['messages'] == [{'category': 'success', 'message': 'a 转换成功'}]
+    assert job.take_messages() == [('success', 'a 转换成功')]
+    assert job.take_messages() == []
+    assert manager.get(job.id) is job
+    manager.shutdown()
+
+
+def test_job_failure_is_captured():
+    """转换异常不应传播到提交方，而是记录为失败状态"""
+    manager = ConversionJobManager(max_workers=1)
+
+    def convert(job):
+        raise RuntimeError("坏文件")
+
+    job = wait_for(manager.submit(convert, 'bad.docx', 'default'))
+    assert job.status == JOB_FAILED
+    assert job.error == "坏文件"
+    assert job.messages[-1][0] == 'error'
+    manager.shutdown()
+
+
+def test_worker_pool_is_bounded():
+    """同时运行的任务数不超过max_workers，超过排队上限时拒绝提交"""
+    manager = ConversionJobManager(max_workers=2, max_pending=1)
+    release = threading.Event()
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def convert(job):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        release.wait(5)
+        with lock:
+            running[0] -= 1
+
+    jobs = [manager.submit(convert, f'{i}.docx', 'default') for i in range(3)]
+    with pytest.raises(JobQueueFullError):
+        manager.submit(convert, 'overflow.docx', 'default')
+
+    release.set()
+    for job in jobs:
+        wait_for(job)
+    assert peak[0] == 2
+    assert all(job.status == JOB_SUCCESS for job in jobs)
+    manager.shutdown()
+
+
+def test_finished_jobs_are_pruned():
+    """只保留max_history条已完成任务"""
+    manager = ConversionJobManager(max_workers=1, max_history=2)
+    for i in range(5):
+        wait_for(manager.submit(lambda job: None, f'{i}.docx', 'default'))
+    manager.submit(lambda job: None, 'last.docx', 'default')
+    assert len(manager.list_jobs()) <= 3
+    manager.shutdown()
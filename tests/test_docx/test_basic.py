@@ -77,6 +77,25 @@ def test_complex_docx_conversion(complex_test_document_path, complex_test_output
         # 检查是否包含链接
         assert '[' in content and '](' in content, "应该包含链接"
 
+def test_docx_parsed_once(complex_test_document_path, tmp_path, monkeypatch):
+    """转换过程中docx只应被解析一次，图片提取与正文格式化共享同一个文档对象"""
+    import docx
+    
+    calls = []
+    original_document = docx.Document
+    
+    def counting_document(*args, **kwargs):
+        calls.append(args)
+        return original_document(*args, **kwargs)
+    
+    monkeypatch.setattr(docx, 'Document', counting_document)
+    
+    output_path = str(tmp_path / 'single_pass.md')
+    image_paths = convert_docx_to_md(complex_test_document_path, output_path, str(tmp_path))
+    
+    assert len(calls) == 1, "docx文件应只解析一次"
+    assert len(image_paths) > 0, "应该提取至少一张图片"
+
 if __name__ == "__main__":
     # 允许直接运行此测试文件
     pytest.main(['-v', __file__]) 
\ No newline at end of file
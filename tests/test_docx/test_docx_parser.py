@@ -0,0 +1,118 @@
+import types
+import pytest
+from utils.docx2markdown.docx_parser import DocxParser, Paragraph
+
+HYPERLINK_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink'
+IMAGE_TYPE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/image'
+
+def test_relationships_index(complex_test_document_path):
+    """测试关系索引：打开文档时建立一次，图片和超链接都通过它解析"""
+    parser = DocxParser(complex_test_document_path)
+    document = parser.parse()
+    
+    assert parser.relationships['rId9'] == (HYPERLINK_TYPE, 'https://example.com')
+    assert parser.relationships['rId10'].type == IMAGE_TYPE
+    assert parser._get_hyperlink_url('rId10') == parser.relationships['rId10'].target
+    assert parser._get_hyperlink_url('rId999') is None
+    
+    images = [e.image for e in document['elements'] if isinstance(e, Paragraph) and e.image]
+    assert images, "应该解析出图片"
+    assert all(image['file'] == f"word/{parser.relationships[image['rId']].target}" for image in images)
+
+def test_streaming_parse_matches_full_parse(complex_test_document_path):
+    """测试流式解析：按顺序产出与完整解析相同的元素"""
+    full = DocxParser(complex_test_document_path).parse()['elements']
+    
+    parser = DocxParser(complex_test_document_path)
+    streamed = parser.parse(streaming=True)['elements']
+    assert isinstance(streamed, types.GeneratorType)
+    assert [str(e) for e in streamed] == [str(e) for e in full]
+    # 流式模式不把 document.xml 整体读入内存
+    assert parser.document_xml is None
+
+NUMBERING_XML = b"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:numbering xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">
+  <w:abstractNum w:abstractNumId="0">
+    <w:lvl w:ilvl="0"><w:start w:val="1"/><w:numFmt w:val="decimal"/><w:lvlText w:val="%1."/></w:lvl>
+    <w:lvl w:ilvl="1"><w:start w:val="1"/><w:numFmt w:val="bullet"/><w:lvlText w:val="o"/>
+      <w:rPr><w:rFonts w:ascii="Courier New"/></w:rPr></w:lvl>
+  </w:abstractNum>
+  <w:num w:numId="1"><w:abstractNumId w:val="0"/></w:num>
+  <w:num w:numId="2"><w:abstractNumId w:val="0"/>
+    <w:lvlOverride w:ilvl="0"><w:startOverride w:val="5"/></w:lvlOverride>
+    <w:lvlOverride w:ilvl="1">
+      <w:lvl w:ilvl="1"><w:start w:val="1"/><w:numFmt w:val="lowerLetter"/><w:lvlText w:val="%2)"/></w:lvl>
+    </w:lvlOverride>
+  </w:num>
+  <w:num w:numId="3"><w:abstractNumId w:val="7"/></w:num>
+</w:numbering>"""
+
+def test_numbering_table():
+    """测试编号查找表：只解析一次，并处理 lvlOverride/startOverride"""
+    parser = DocxParser('unused.docx')
+    parser.numbering_xml = NUMBERING_XML
+    
+    assert parser._get_numbering_info('1', '0') == {
+        'num_format': 'decimal', 'lvl_text': '%1.', 'bullet': None, 'start': 1}
+    assert parser._get_numbering_info('1', '1')['bullet'] == 'Courier New'
+    
+    # startOverride 只修改起始编号，w:lvl 覆盖整个层级
+    assert parser._get_numbering_info('2', '0') == {
+        'num_format': 'decimal', 'lvl_text': '%1.', 'bullet': None, 'start': 5}
+    assert parser._get_numbering_info('2', '1') == {
+        'num_format': 'lowerLetter', 'lvl_text': '%2)', 'bullet': None, 'start': 1}
+    
+    table = parser.numbering_table
+    parser._get_numbering_info('1', '0')
+    assert parser.numbering_table is table
+    
+    with pytest.raises(ValueError, match='numId=9'):
+        parser._get_numbering_info('9', '0')
+    with pytest.raises(ValueError, match='abstractNumId=7'):
+        parser._get_numbering_info('3', '0')
+    with pytest.raises(ValueError, match='ilvl=4'):
+        parser._get_numbering_info('1', '4')
+
+BAD_START_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<w:numbering xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">
+  <w:abstractNum w:abstractNumId="0">
+    <w:lvl w:ilvl="0"><w:start w:val="x"/><w:numFmt w:val="decimal"/><w:lvlText w:val="%1."/></w:lvl>
+    <w:lvl w:ilvl="1"><w:start/><w:numFmt w:val="decimal"/><w:lvlText w:val="%2."/></w:lvl>
+    <w:lvl w:ilvl="2"><w:start w:val="3"/><w:numFmt w:val="decimal"/><w:lvlText w:val="%3."/></w:lvl>
+  </w:abstractNum>
+  <w:num w:numId="1">
+    <w:abstractNumId w:val="0"/>
+    <w:lvlOverride w:ilvl="2"><w:startOverride w:val="two"/></w:lvlOverride>
+  </w:num>
+</w:numbering>"""
+
+def test_numbering_table_bad_start_values():
+    """起始编号不是整数或缺失时使用默认起始编号，不影响其他层级"""
+    parser = DocxParser('unused.docx')
+    parser.numbering_xml = BAD_START_XML
+    
+    assert parser._get_numbering_info('1', '0')['start'] is None
+    assert parser._get_numbering_info('1', '1')['start'] is None
+    assert parser._get_numbering_info('1', '2')['start'] == 3
+
+def test_media_index_and_bulk_extraction(complex_test_document_path, tmp_path, monkeypatch):
+    """测试常驻zip句柄和媒体索引：批量提取时每个媒体部件只写出一次"""
+    with DocxParser(complex_test_document_path) as parser:
+        parser.parse()
+        assert list(parser.media_index) == ['word/media/image1.png']
+        
+        extracted = parser.extract_media(str(tmp_path))
+        assert extracted == {'word/media/image1.png': str(tmp_path / 'image1.png')}
+        assert (tmp_path / 'image1.png').exists()
+        
+        # 已写出的部件不再重复写出
+        writes = []
+        monkeypatch.setattr(parser, '_write_part', lambda name, path: writes.append(name))
+        parser.extract_media(str(tmp_path))
+        assert parser.extract_image('word/media/image1.png', str(tmp_path / 'image1.png'))
+        assert writes == []
+        
+        # 按文件名匹配
+        assert parser._find_media('media/image1.png') == 'word/media/image1.png'
+    
+    assert parser._package is None
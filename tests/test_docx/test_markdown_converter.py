@@ -0,0 +1,69 @@
+import io
+import os
+import sys
+import types
+import pytest
+import docx
+from PIL import Image
+
+# docx_to_markdown_converter 以 docx2markdown 包名导入解析器
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'utils')))
+
+from docx2markdown.docx_to_markdown_converter import DocxToMarkdownConverter
+
+def test_streaming_conversion(complex_test_document_path, tmp_path):
+    """测试流式转换：逐元素产出的片段与一次性转换结果一致，并可直接写入文件或文本流"""
+    expected = DocxToMarkdownConverter(complex_test_document_path).convert()
+    
+    chunks = DocxToMarkdownConverter(complex_test_document_path).iter_markdown()
+    assert isinstance(chunks, types.GeneratorType)
+    assert "".join(chunks) == expected
+    
+    stream = io.StringIO()
+    written = DocxToMarkdownConverter(complex_test_document_path).convert_to(stream)
+    assert stream.getvalue() == expected
+    assert written == len(expected)
+    
+    output_path = tmp_path / "complex.md"
+    DocxToMarkdownConverter(complex_test_document_path, str(output_path)).convert_to(str(output_path))
+    assert output_path.read_text(encoding="utf-8").count("![image_") == 1
+
+def test_repeated_image_written_once(tmp_path):
+    """测试同一张图片多次引用时只提取一次，引用指向同一个文件"""
+    image_path = tmp_path / "dot.png"
+    Image.new("RGB", (8, 8), "red").save(image_path)
+    
+    document = docx.Document()
+    for i in range(3):
+        document.add_paragraph(f"段落{i}")
+        document.add_paragraph().add_run().add_picture(str(image_path))
+    docx_path = tmp_path / "repeated.docx"
+    document.save(str(docx_path))
+    
+    output_path = tmp_path / "out" / "repeated.md"
+    image_dir = tmp_path / "images"
+    converter = DocxToMarkdownConverter(str(docx_path), str(output_path), str(image_dir))
+    converter.convert_to(str(output_path))
+    
+    content = output_path.read_text(encoding="utf-8")
+    assert content.count("image_1.png)") == 3
+    assert converter.extracted_images == ["image_1.png"]
+    assert os.listdir(image_dir) == ["image_1.png"]
+
+def test_ordered_list_numbering_uses_start():
+    """有序列表按 numId/ilvl 计数，从 numbering.xml 的起始编号开始，上级列表项出现时下级重新编号"""
+    from docx2markdown.docx_parser import Paragraph, Style
+    
+    converter = DocxToMarkdownConverter('unused.docx')
+    
+    def item(text, ilvl, start=None, num_format='decimal', lvl_text=None):
+        numbering = {'numId': '5', 'ilvl': str(ilvl), 'num_format': num_format,
+                     'lvl_text': lvl_text or f"%{ilvl + 1}.", 'bullet': None, 'start': start}
+        return converter._generate_markdown_from_paragraph(None, Paragraph(text, Style(), numbering=numbering))
+    
+    assert item("三", 0, start=3) == "3. 三\n"
+    assert item("四", 0, start=3) == "4. 四\n"
+    assert item("四.1", 1, lvl_text="%1.%2.") == "4.1. 四.1\n"
+    assert item("四.2", 1, lvl_text="%1.%2.") == "4.2. 四.2\n"
+    assert item("五", 0, start=3) == "5. 五\n"
+    assert item("五.a", 1, num_format='lowerLetter') == "a) 五.a\n"
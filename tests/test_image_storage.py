@@ -0,0 +1,142 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from utils import image_storage
+from utils.image_storage import ImageUploadError, LocalImageStorage, S3ImageStorage, publish_markdown_images
+
+class StubS3Server:
+    """本地模拟的S3兼容对象存储：接受PUT请求并按 /bucket/key 保存对象"""
+
+    def __init__(self):
+        self.objects = {}
+        self.headers = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_PUT(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.headers.get('x-amz-content-sha256') != hashlib.sha256(body).hexdigest():
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+                with stub.lock:
+                    stub.objects[self.path] = body
+                    stub.headers[self.path] = {name.lower(): value for name, value in self.headers.items()}
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def make_markdown(tmp_path, count):
+    """生成引用count张本地图片的Markdown文件，最后一张与第一张内容相同"""
+    lines = []
+    for i in range(count):
+        (tmp_path / f"image_{i}.png").write_bytes(b"\x89PNG" + bytes([i % (count - 1)]))
+        lines.append(f"![图片{i}](image_{i}.png)")
+    md_path = tmp_path / "doc.md"
+    md_path.write_text("\n\n".join(lines), encoding="utf-8")
+    return md_path
+
+def test_local_storage_publishes_content_addressed_files(tmp_path):
+    """本地存储按内容哈希写入目录，链接替换为基础URL下的路径"""
+    md_path = make_markdown(tmp_path, 4)
+    store = tmp_path / "store"
+    storage = LocalImageStorage(root=str(store), base_url="https://cdn.example.com/md/")
+
+    urls = publish_markdown_images(str(md_path), str(tmp_path), storage)
+
+    assert len(urls) == 4
+    assert urls["image_0.png"] == urls["image_3.png"]
+    stored = sorted(p for p in store.rglob("*") if p.is_file())
+    assert len(stored) == 3
+    sha256 = hashlib.sha256((tmp_path / "image_1.png").read_bytes()).hexdigest()
+    assert urls["image_1.png"] == f"https://cdn.example.com/md/images/{sha256[:2]}/{sha256}.png"
+    assert (store / "images" / sha256[:2] / f"{sha256}.png").read_bytes() == (tmp_path / "image_1.png").read_bytes()
+    assert "](image_" not in md_path.read_text(encoding="utf-8")
+
+def test_publish_reports_failed_images(tmp_path):
+    """有图片上传失败时抛出ImageUploadError，成功的图片仍替换为存储URL"""
+    md_path = make_markdown(tmp_path, 3)
+
+    class FlakyStorage(LocalImageStorage):
+        def upload_image(self, image_path):
+            if image_path.endswith("image_1.png"):
+                raise OSError("disk full")
+            return super().upload_image(image_path)
+
+    storage = FlakyStorage(root=str(tmp_path / "store"), base_url="https://cdn.example.com/")
+    with pytest.raises(ImageUploadError) as excinfo:
+        publish_markdown_images(str(md_path), str(tmp_path), storage)
+
+    assert excinfo.value.failed == ["image_1.png"]
+    assert sorted(excinfo.value.uploaded) == ["image_0.png", "image_2.png"]
+    content = md_path.read_text(encoding="utf-8")
+    assert "](image_1.png)" in content
+    assert "](image_0.png)" not in content and "](image_2.png)" not in content
+
+def test_unconfigured_storage_keeps_local_links(tmp_path):
+    """存储未配置时不算上传失败：保留本地链接，并在缓存键的存储状态中区分"""
+    md_path = make_markdown(tmp_path, 2)
+    storage = S3ImageStorage(endpoint_url="", bucket="", access_key="", secret_key="")
+
+    assert publish_markdown_images(str(md_path), str(tmp_path), storage) == {}
+    assert "](image_0.png)" in md_path.read_text(encoding="utf-8")
+    assert image_storage.image_storage_variant(storage) == "s3:unconfigured"
+    assert image_storage.image_storage_variant(LocalImageStorage(root=str(tmp_path))) == "local"
+
+def test_s3_storage_signs_put_requests(tmp_path):
+    """S3存储用签名的PUT请求上传对象，链接指向公开URL"""
+    md_path = make_markdown(tmp_path, 3)
+    with StubS3Server() as server:
+        storage = S3ImageStorage(
+            endpoint_url=server.url, bucket="docs", access_key="AKID", secret_key="SECRET",
+            public_url="https://img.example.com/",
+        )
+        urls = publish_markdown_images(str(md_path), str(tmp_path), storage)
+
+    assert len(server.objects) == 2
+    for path, headers in server.headers.items():
+        assert path.startswith("/docs/images/")
+        assert headers["authorization"].startswith("AWS4-HMAC-SHA256 Credential=AKID/")
+        assert headers["content-type"] == "image/png"
+    assert sorted(urls.values())[0].startswith("https://img.example.com/images/")
+    assert md_path.read_text(encoding="utf-8").count("https://img.example.com/images/") == 3
+
+def test_backend_must_implement_upload_image():
+    """没有实现upload_image的存储后端在创建时就报错"""
+    class IncompleteStorage(image_storage.ImageStorage):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        IncompleteStorage()
+
+def test_storage_selection(monkeypatch):
+    """按名称选择存储后端，Gitee存储的转换器链接与原仓库地址一致"""
+    assert isinstance(image_storage.get_image_storage("local"), LocalImageStorage)
+    with pytest.raises(ValueError):
+        image_storage.get_image_storage("ftp")
+
+    monkeypatch.setattr(image_storage, "IMAGE_STORAGE_BACKEND", "gitee")
+    assert image_storage.converter_image_link("doc_outputs", "image_1.png") == \
+        "https://gitee.com/comma-dong/image-projects/raw/master/doc_outputs/image_1.png"
+    monkeypatch.setattr(image_storage, "IMAGE_STORAGE_BACKEND", "local")
+    assert image_storage.converter_image_link("doc_outputs", "image_1.png") == "image_1.png"
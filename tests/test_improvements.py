@@ -6,7 +6,10 @@ from utils.docx_to_md import (
     get_list_level,
     format_list_item,
     is_code_block,
-    format_paragraph
+    format_paragraph,
+    ParagraphFeatures,
+    insert_images_inline,
+    longest_common_substring
 )
 
 class TestImprovements(unittest.TestCase):
@@ -139,5 +142,63 @@ class TestImprovements(unittest.TestCase):
         
         print("标题检测测试部分通过")
     
+    def test_paragraph_features_cached(self):
+        """测试段落特征记录：检测结果与函数一致，且只计算一次"""
+        p = self.doc.add_paragraph("1. 有序列表项")
+        p.style = "List Number"
+        features = ParagraphFeatures(p)
+        
+        self.assertEqual(get_heading_level(p), features.heading_level)
+        self.assertEqual(is_list_item(p), features.is_list_item)
+        self.assertEqual(format_paragraph(p), format_paragraph(features))
+        
+        # 检测结果缓存在记录上，重复访问不再重新计算
+        self.assertIn('heading_level', features.__dict__)
+        self.assertIs(features.is_list_item, features.__dict__['is_list_item'])
+        self.assertEqual(format_paragraph(features), "1. 有序列表项")
+    
+    def test_insert_images_inline(self):
+        """测试图片按上下文插入到匹配的段落之后"""
+        blocks = [
+            "# 安装说明",
+            "首先下载安装包并解压到任意目录",
+            "运行安装程序后出现如下界面：",
+            "安装完成后重启电脑",
+        ]
+        images = [
+            ("rId1", "/tmp/images/image1.png", 1, {
+                'current_paragraph': "运行安装程序后出现如下界面：",
+                'text_before_image': "出现如下界面：",
+                'context_paragraphs_before': ["首先下载安装包并解压到任意目录"],
+                'context_paragraphs_after': [],
+            }),
+            ("rId2", "/tmp/images/image2.png", 2, {}),
+        ]
+        result = insert_images_inline(blocks, images, "/tmp/images")
+        
+        self.assertEqual(result[3], "\n![图片1](image1.png)\n")
+        # 兜底位置已被上下文匹配的图片占用，另一张图片放入附录
+        self.assertEqual(result[-2:], ["\n## 附录：其他图片\n", "\n![图片2](image2.png)\n"])
+        self.assertEqual(sum("image1.png" in str(b) for b in result), 1)
+    
+    def test_longest_common_substring(self):
+        """测试最长公共子串：各实现结果一致，且只比较前200个字符"""
+        cases = [
+            ("运行安装程序后出现如下界面", "安装程序后出现"),
+            ("abcxyzabcd", "zabcdq"),
+            ("图1 系统架构", "系统架构图"),
+            ("", "abc"),
+            ("abc", "def"),
+            ("ab" * 150 + "唯一的尾部文本", "唯一的尾部文本"),
+        ]
+        expected = ["安装程序后出现", "zabcd", "系统架构", "", "", ""]
+        
+        for (s1, s2), result in zip(cases, expected):
+            self.assertEqual(result, longest_common_substring(s1, s2))
+            self.assertEqual(result, longest_common_substring(s1, s2, backend='difflib'))
+        
+        # 多个等长公共子串时返回在第一个字符串中最早出现的一个
+        self.assertEqual("ab", longest_common_substring("abxcd", "cdyab"))
+    
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,216 @@
+import os
+import fitz
+import pytest
+from utils import pdf_to_md
+
+
+def make_pdf(path, pages=12):
+    """生成多页测试PDF：每页包含标题、正文、链接和代码行"""
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Chapter {i + 1}", fontsize=20, fontname="hebo")
+        page.insert_text((72, 110), f"Section {i + 1}.1", fontsize=15, fontname="hebo")
+        page.insert_text((72, 140), f"Body text of page {i + 1}, see https://example.com/{i}", fontsize=11)
+        page.insert_text((72, 160), "def main(): return {'page': %d};" % i, fontsize=10, fontname="cour")
+    doc.save(str(path))
+    doc.close()
+    return path
+
+
+def test_parallel_pages_match_serial(tmp_path, monkeypatch):
+    """进程池转换的输出与串行转换完全相同"""
+    pdf_path = make_pdf(tmp_path / "manual.pdf")
+    monkeypatch.setattr(pdf_to_md, 'PDF_PARALLEL_MIN_PAGES', 2)
+
+    serial_path = tmp_path / "serial.md"
+    parallel_path = tmp_path / "parallel.md"
+    pdf_to_md.convert_pdf_to_md(str(pdf_path), str(serial_path), str(tmp_path / "images"), workers=1)
+    pdf_to_md.convert_pdf_to_md(str(pdf_path), str(parallel_path), str(tmp_path / "images"), workers=3)
+
+    serial = serial_path.read_text(encoding="utf-8")
+    assert "Chapter 12" in serial
+    assert parallel_path.read_text(encoding="utf-8") == serial
+
+
+def test_split_page_ranges():
+    """页码区间连续、不重叠并覆盖全部页面"""
+    ranges = pdf_to_md.split_page_ranges(500, 8)
+    assert ranges[0][0] == 0 and ranges[-1][1] == 500
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert len(ranges) >= 8
+    assert pdf_to_md.split_page_ranges(3, 8) == [(0, 1), (1, 2), (2, 3)]
+
+
+def test_pypdf2_fallback(tmp_path, monkeypatch):
+    """PyMuPDF不可用时退回PyPDF2纯文本转换"""
+    pdf_path = make_pdf(tmp_path / "manual.pdf", pages=2)
+    monkeypatch.setattr(pdf_to_md, 'fitz', None)
+
+    output_path = tmp_path / "fallback.md"
+    assert pdf_to_md.convert_pdf_to_md(str(pdf_path), str(output_path), str(tmp_path / "images")) == []
+    content = output_path.read_text(encoding="utf-8")
+    assert "Chapter 2" in content
+    assert "[https://example.com/1](https://example.com/1)" in content
+
+
+def test_headings_from_font_histogram(tmp_path):
+    """按全文字体直方图识别标题：正文字号以上的字体样式从大到小依次为各级标题"""
+    pdf_path = make_pdf(tmp_path / "manual.pdf", pages=3)
+    output_path = tmp_path / "manual.md"
+    pdf_to_md.convert_pdf_to_md(str(pdf_path), str(output_path), str(tmp_path / "images"))
+
+    lines = output_path.read_text(encoding="utf-8").splitlines()
+    assert "# Chapter 3" in lines
+    assert "## Section 3.1" in lines
+    assert not any(line.startswith("#") and "Body text" in line for line in lines)
+
+    body_size, tiers = pdf_to_md.derive_heading_tiers({(11.0, False): 900, (10.0, False): 300, (11.0, True): 40,
+                                                       (14.0, True): 60, (18.0, False): 20})
+    assert body_size == 11.0
+    assert tiers == {(18.0, False): 1, (14.0, True): 2}
+
+
+def test_images_placed_by_position(tmp_path):
+    """图片按在页面上的位置插入到文本之间，链接相对于Markdown文件"""
+    pdf_path = tmp_path / "figures.pdf"
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 8, 8), False)
+    pixmap.clear_with(200)
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Text above the figure", fontsize=11)
+    page.insert_image(fitz.Rect(72, 100, 172, 200), pixmap=pixmap)
+    page.insert_text((72, 240), "Text below the figure", fontsize=11)
+    doc.save(str(pdf_path))
+    doc.close()
+
+    output_path = tmp_path / "figures.md"
+    images = pdf_to_md.convert_pdf_to_md(str(pdf_path), str(output_path), str(tmp_path / "images"))
+
+    content = output_path.read_text(encoding="utf-8")
+    assert len(images) == 1
+    link = f"![page_1_img_1](images/{os.path.basename(images[0])})"
+    assert content.index("Text above") < content.index(link) < content.index("Text below")
+
+
+def test_repeated_images_written_once(tmp_path, caplog):
+    """每页重复的图片只写入一个文件，所有引用指向同一文件并报告节省的字节数"""
+    pdf_path = tmp_path / "logo.pdf"
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 16, 16), False)
+    pixmap.clear_with(90)
+    doc = fitz.open()
+    # 两份各自嵌入图片的文档合并后，相同内容的图片有两个不同的xref
+    for part in range(2):
+        part_doc = fitz.open()
+        for i in range(part + 2):
+            page = part_doc.new_page()
+            page.insert_text((72, 72), f"Page {i + 1}", fontsize=11)
+            page.insert_image(fitz.Rect(72, 100, 120, 148), pixmap=pixmap)
+        doc.insert_pdf(part_doc)
+        part_doc.close()
+    assert len({page.get_images()[0][0] for page in doc}) == 2
+    doc.save(str(pdf_path))
+    doc.close()
+
+    output_path = tmp_path / "logo.md"
+    with caplog.at_level("INFO", logger="utils.pdf_to_md"):
+        images = pdf_to_md.convert_pdf_to_md(str(pdf_path), str(output_path), str(tmp_path / "images"))
+
+    assert len(images) == 1
+    assert os.listdir(tmp_path / "images") == [os.path.basename(images[0])]
+    assert output_path.read_text(encoding="utf-8").count(os.path.basename(images[0])) == 5
+    saved = 4 * os.path.getsize(images[0])
+    assert f"5处引用，1个文件，去重节省 {saved} 字节" in caplog.text
+
+
+def test_page_range_streams_pages(tmp_path):
+    """只转换指定页码范围，第一遍提取时报告进度，第二遍每页写完即可在输出文件中读到"""
+    pdf_path = make_pdf(tmp_path / "manual.pdf", pages=6)
+    output_path = tmp_path / "part.md"
+    written = []
+
+    def progress(done, total, stage):
+        content = output_path.read_text(encoding="utf-8") if output_path.exists() else None
+        written.append((done, total, stage, content))
+
+    pdf_to_md.convert_pdf_to_md(str(pdf_path), str(output_path), str(tmp_path / "images"),
+                                page_range="2-4", progress=progress)
+
+    extract, write = pdf_to_md.PROGRESS_EXTRACT, pdf_to_md.PROGRESS_WRITE
+    assert [(done, total, stage) for done, total, stage, _ in written] == \
+        [(1, 3, extract), (2, 3, extract), (3, 3, extract), (1, 3, write), (2, 3, write), (3, 3, write)]
+    # 第一遍不生成Markdown
+    assert all(content is None for _, _, stage, content in written if stage == extract)
+    assert "Chapter 2" in written[3][3] and "Chapter 3" not in written[3][3]
+    content = output_path.read_text(encoding="utf-8")
+    assert content == written[-1][3]
+    assert "Chapter 4" in content and "Chapter 1\n" not in content and "Chapter 5" not in content
+
+
+def test_each_page_is_rendered_once(tmp_path, monkeypatch):
+    """每页只生成一次Markdown"""
+    pdf_path = make_pdf(tmp_path / "manual.pdf", pages=4)
+    rendered = []
+    render = pdf_to_md.lines_to_markdown
+
+    def counting_render(items, *args, **kwargs):
+        rendered.append(items)
+        return render(items, *args, **kwargs)
+
+    monkeypatch.setattr(pdf_to_md, 'lines_to_markdown', counting_render)
+    pdf_to_md.convert_pdf_to_md(str(pdf_path), str(tmp_path / "manual.md"), str(tmp_path / "images"))
+    assert len(rendered) == 4
+    assert pdf_to_md.pdf_page_count(str(pdf_path)) == 4
+
+
+def test_parse_page_range():
+    """页码范围从1开始且包含两端，超出文档的部分截断"""
+    assert pdf_to_md.parse_page_range("5") == (5, 5)
+    assert pdf_to_md.parse_page_range("2-10") == (2, 10)
+    assert pdf_to_md.parse_page_range("3-") == (3, None)
+    assert pdf_to_md.parse_page_range("-4") == (1, 4)
+    for spec in ("", "-", "0-3", "5-2", "a-b"):
+        with pytest.raises(ValueError):
+            pdf_to_md.parse_page_range(spec)
+    assert pdf_to_md.resolve_page_range("3-", 10) == (2, 10)
+    assert pdf_to_md.resolve_page_range("8-20", 10) == (7, 10)
+    with pytest.raises(ValueError):
+        pdf_to_md.resolve_page_range("11-12", 10)
+
+
+def test_command_line(tmp_path, capsys):
+    """命令行转换指定页面"""
+    pdf_path = make_pdf(tmp_path / "manual.pdf", pages=3)
+    output_path = tmp_path / "cli.md"
+    pdf_to_md.main([str(pdf_path), "-o", str(output_path), "--pages", "3"])
+
+    assert "已生成" in capsys.readouterr().out
+    assert output_path.read_text(encoding="utf-8").startswith("# Chapter 3")
+
+
+def test_tables_reconstructed(tmp_path):
+    """有表格线的表格用find_tables识别，没有表格线的表格按列对齐识别，都输出为Markdown表格"""
+    pdf_path = tmp_path / "tables.pdf"
+    doc = fitz.open()
+    page = doc.new_page()
+    for r in range(3):
+        for c in range(2):
+            x, y = 72 + c * 120, 80 + r * 20
+            page.draw_rect(fitz.Rect(x, y, x + 120, y + 20))
+            page.insert_text((x + 4, y + 14), f"R{r}C{c}", fontsize=10)
+    rows = [("Name", "Size", "Type"), ("alpha", "12 KB", "png"), ("beta", "3 MB", "jpeg|gif")]
+    for r, row in enumerate(rows):
+        for c, text in enumerate(row):
+            page.insert_text((72 + c * 100, 200 + r * 16), text, fontsize=10)
+    page.insert_text((72, 300), "A normal paragraph after the tables.", fontsize=11)
+    doc.save(str(pdf_path))
+    doc.close()
+
+    output_path = tmp_path / "tables.md"
+    pdf_to_md.convert_pdf_to_md(str(pdf_path), str(output_path), str(tmp_path / "images"))
+
+    lines = output_path.read_text(encoding="utf-8").splitlines()
+    assert "| R0C0 | R0C1 |" in lines and "| R2C0 | R2C1 |" in lines
+    assert lines[lines.index("| Name | Size | Type |") + 1] == "| --- | --- | --- |"
+    assert "| beta | 3 MB | jpeg\\|gif |" in lines
+    assert lines[-1] == "A normal paragraph after the tables."
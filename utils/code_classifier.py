@@ -0,0 +1,114 @@
+"""
+代码段落分类
+代码语法特征和命令行的正则分别合并为预编译的交替模式，每类特征只需扫描一次文本；
+编程语言按优先级依次尝试预编译的模式。结果与原来逐个 re.search 完全相同
+"""
+
+import re
+
+# 代码语法特征：任意一个模式匹配即认为含有代码语法
+CODE_SYNTAX_PATTERNS = [
+    # 常见编程语句开头
+    r'^(function|def|class|import|from|var|let|const)\s+\w+',  # 函数、类、变量声明
+    r'^(public|private|protected)\s+\w+\s+\w+',  # 访问修饰符
+    r'^\s*(if|for|while|switch|try|catch)\s*\(',  # 控制结构
+    r'^\s*return\s+.+;?\s*$',  # return语句
+    r'^(SELECT|INSERT|UPDATE|DELETE|CREATE|ALTER)\s+',  # SQL
+
+    # 标记和特殊语法
+    r'<\?php|\?>',  # PHP标记
+    r'^```\w*$',  # Markdown代码块标记
+    r'^#!\/bin\/(bash|sh|python|perl)',  # Shebang行
+
+    # 特殊符号和结构
+    r'^\s*[{}]\s*$',  # 单独一行的花括号
+    r'^\s*[\[\]]\s*$',  # 单独一行的方括号
+    r'^(\s*)[\w\-]+:\s*\w+',  # YAML键值对
+
+    # 命令行
+    r'^(\$|>)\s+[\w\-\.]+',  # 命令行提示符
+    r'\bgit\s+(commit|push|pull|clone|checkout|add)\b',  # Git命令
+    r'\bdocker\s+(run|build|exec|ps|images)\b',  # Docker命令
+    r'\bnpm\s+(install|run|build|start)\b',  # npm命令
+    r'curl\s+https?:\/\/',  # curl命令
+    r'wget\s+https?:\/\/',  # wget命令
+    r'ssh\s+\w+@[\w\.]+',   # ssh命令
+    r'cd\s+[\w\/\-\.]+',    # cd命令
+    r'pip\s+install',       # pip命令
+    r'apt\s+(install|update|upgrade)',  # apt命令
+    r'yum\s+(install|update)',  # yum命令
+]
+
+# bash命令行（不区分大小写，都以 ^ 开头，只匹配段落开头）
+BASH_COMMAND_PATTERNS = [
+    r'^\s*cd\s+',
+    r'^\s*mkdir\s+',
+    r'^\s*ls\s+',
+    r'^\s*rm\s+',
+    r'^\s*sudo\s+',
+    r'^\s*apt\s+',
+    r'^\s*yum\s+',
+    r'^\s*docker\s+',
+    r'^\s*git\s+',
+    r'^\s*npm\s+',
+    r'^\s*python\s+',
+    r'^\s*pip\s+',
+    r'^\s*javac\s+',
+    r'^\s*mv\s+',
+    r'^\s*cp\s+',
+    r'^http',
+    r'^https',
+]
+
+# 编程语言特征，按优先级排列：多种语言的特征同时出现时取排在前面的语言
+LANGUAGE_PATTERNS = [
+    ("python", r'\b(def|class|import|from|print)\b'),
+    ("javascript", r'\b(function|var|let|const|require|console\.log)\b'),
+    ("sql", r'(?i:\b(SELECT|INSERT|UPDATE|DELETE|CREATE|ALTER)\b)'),
+    ("bash", r'\b(docker|apt|yum|rpm|git|cd|mkdir|tar|curl)\b'),
+    ("html", r'<\w+>.*?</w+>|<\w+.*?/>'),
+    ("cpp", r'^\s*#include|int\s+main\s*\('),
+    ("java", r'\b(package|import java|public class|public static void main)\b'),
+    ("csharp", r'\b(using System|namespace|public class|private void)\b'),
+    ("go", r'\b(func|package main|import \(|fmt\.)\b'),
+    ("php", r'\b(<?php|echo|namespace|use [\w\\]+;)\b'),
+    ("rust", r'\b(fn|let mut|impl|struct|enum|match)\b'),
+    ("r", r'\b(library|tidyverse|dplyr|ggplot2|data\.frame)\b'),
+    ("yaml", r'(^|\n)[ \t]*(#|//|;)[ \t]*\[?[A-Za-z0-9-_]+\]?[ \t]*:'),
+    ("json", r'\{\s*"[^"]+"\s*:\s*[^{}]+\}'),
+    ("typescript", r'\b(module|export|component|ngOnInit|@Input|@Output)\b'),
+    ("jquery", r'\$\(.*\)|\$\.\w+\('),
+    ("vue", r'<template>|export default {|methods:|computed:'),
+]
+
+def _combine(patterns):
+    """把多个模式合并为一个交替模式，各模式的 ^ 等锚点语义不变"""
+    return "|".join(f"(?:{pattern})" for pattern in patterns)
+
+# 以 ^ 开头的模式只可能在文本开头匹配，单独合并后用match只尝试一次，其余模式合并后在全文搜索
+CODE_SYNTAX_ANCHORED_PATTERN = re.compile(_combine(p for p in CODE_SYNTAX_PATTERNS if p.startswith('^')))
+CODE_SYNTAX_PATTERN = re.compile(_combine(p for p in CODE_SYNTAX_PATTERNS if not p.startswith('^')))
+BASH_COMMAND_PATTERN = re.compile(_combine(BASH_COMMAND_PATTERNS), re.IGNORECASE)
+
+# 语言检测通常在第一、二个模式就能命中，按优先级依次匹配比合并成一个交替模式更快
+COMPILED_LANGUAGE_PATTERNS = [(name, re.compile(pattern)) for name, pattern in LANGUAGE_PATTERNS]
+
+def has_code_syntax(text):
+    """文本是否含有代码语法特征"""
+    return CODE_SYNTAX_ANCHORED_PATTERN.match(text) is not None or CODE_SYNTAX_PATTERN.search(text) is not None
+
+def is_bash_command(text):
+    """文本是否以常见的命令行命令开头"""
+    return BASH_COMMAND_PATTERN.match(text) is not None
+
+def detect_code_language(text):
+    """
+    检测代码的编程语言
+
+    Returns:
+        str: 语言名（用于Markdown代码块标记），无法识别时返回空字符串
+    """
+    for name, pattern in COMPILED_LANGUAGE_PATTERNS:
+        if pattern.search(text):
+            return name
+    return ""
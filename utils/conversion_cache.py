@@ -0,0 +1,168 @@
+"""
+转换结果缓存
+按 输入文件内容SHA-256 + 转换方法 + 转换器版本 缓存转换结果，
+相同文件重复上传后再次转换时直接返回已生成的Markdown和图片；
+缓存的输出目录总大小超过上限时按最近最少使用淘汰
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from utils.image_manifest import file_sha256
+
+logger = logging.getLogger(__name__)
+
+# 参与转换的模块，任一模块的源码变化都会使旧的缓存失效
+CONVERTER_MODULES = [
+    'docx_to_md.py',
+    'code_classifier.py',
+    'pdf_to_md.py',
+    'cyrus_docx_converter.py',
+    'docx_converter_selector.py',
+    'image_storage.py',
+    os.path.join('docx2markdown', 'docx_parser.py'),
+    os.path.join('docx2markdown', 'docx_to_markdown_converter.py'),
+]
+
+@lru_cache(maxsize=1)
+def converter_version():
+    """根据转换模块源码计算转换器版本"""
+    digest = hashlib.sha256()
+    utils_dir = os.path.dirname(os.path.abspath(__file__))
+    for module in CONVERTER_MODULES:
+        path = os.path.join(utils_dir, module)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def directory_size(path):
+    """目录中所有文件的总字节数"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+class ConversionCache:
+    """
+    转换结果缓存（SQLite索引）
+
+    每条缓存记录一个输出目录中的Markdown文件（相对output_root的路径），该目录只属于这一个结果
+    （调用方为不同转换方法和页码范围使用不同的目录）；命中时更新最近使用时间，
+    写入后按总大小淘汰最久未使用的输出目录。
+    不完整的结果（如图片上传失败）也会记录，只计入总大小、参与淘汰，不会被命中。
+    索引文件在第一次使用时才创建
+    """
+
+    def __init__(self, output_root, db_path=None, max_bytes=1024 * 1024 * 1024, variant=""):
+        self.output_root = output_root
+        self.db_path = db_path or os.path.join(output_root, 'conversion_cache.sqlite3')
+        self.max_bytes = max_bytes
+        self.variant = variant  # 影响输出内容的其他配置，如图片存储方式
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        """打开（必要时创建）索引数据库，调用方需持有self._lock"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS results ("
+                    "key TEXT PRIMARY KEY, "
+                    "result TEXT NOT NULL, "
+                    "size INTEGER NOT NULL, "
+                    "created_at REAL, "
+                    "last_used REAL, "
+                    "complete INTEGER NOT NULL DEFAULT 1)"
+                )
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(results)")]
+                if "complete" not in columns:
+                    # 旧版本创建的索引
+                    conn.execute("ALTER TABLE results ADD COLUMN complete INTEGER NOT NULL DEFAULT 1")
+            self._conn = conn
+        return self._conn
+
+    def key_for(self, input_path, method):
+        """计算缓存键：输入文件内容哈希 + 转换方法 + 转换器版本"""
+        parts = [file_sha256(input_path), method, converter_version(), self.variant]
+        return hashlib.sha256("\0".join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """返回缓存的结果路径（相对output_root），未命中、结果不完整或文件已被删除时返回None"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT result FROM results WHERE key = ? AND complete = 1", (key,)).fetchone()
+            if row is None:
+                return None
+            result = row[0]
+            if not os.path.exists(os.path.join(self.output_root, result)):
+                # 输出文件已被用户删除
+                with conn:
+                    conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            with conn:
+                conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        logger.info(f"转换缓存命中: {result}")
+        return result
+
+    def put(self, key, result, complete=True):
+        """
+        记录转换结果并按大小上限淘汰旧结果
+
+        complete为False时结果只计入缓存大小并参与淘汰，不会被get命中，下次转换时重新生成
+        """
+        folder = os.path.dirname(os.path.join(self.output_root, result))
+        size = directory_size(folder)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                # 重新转换覆盖了同一目录（如转换器版本变化），旧记录指向的已是新结果，不再单独计数和淘汰
+                conn.execute("DELETE FROM results WHERE result = ? AND key != ?", (result, key))
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, result, size, created_at, last_used, complete) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, result, size, now, now, int(complete))
+                )
+            self._evict(keep=key)
+
+    def _evict(self, keep):
+        """删除最久未使用的输出目录，直到总大小不超过上限（刚写入的结果不淘汰）"""
+        conn = self._connect()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = conn.execute(
+            "SELECT key, result, size FROM results WHERE key != ? ORDER BY last_used", (keep,)
+        ).fetchall()
+        for key, result, size in rows:
+            if total <= self.max_bytes:
+                break
+            folder = os.path.dirname(os.path.join(self.output_root, result))
+            logger.info(f"淘汰转换缓存: {result} ({size} 字节)")
+            shutil.rmtree(folder, ignore_errors=True)
+            with conn:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+
+    def total_size(self):
+        with self._lock:
+            return self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,152 @@
+"""
+后台转换任务队列
+将耗时的文档转换和图片上传放到有界线程池中执行，Web请求只负责提交任务并立即返回
+"""
+
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCESS = "success"
+JOB_FAILED = "failed"
+
+
+class JobQueueFullError(Exception):
+    """等待中的任务数量达到上限时抛出"""
+
+
+class ConversionJob:
+    """单个转换任务的状态记录"""
+
+    def __init__(self, filename, method):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.method = method
+        self.status = JOB_PENDING
+        self.messages = []  # [(category, message), ...]，与flash消息格式一致
+        self._messages_taken = 0  # 已经交给页面显示的消息数
+        self._messages_lock = threading.Lock()
+        self.result = None  # 转换结果，例如输出文件的相对路径
+        self.progress = None  # 逐页转换的进度，例如 {'done': 3, 'total': 10, 'stage': 'extract', 'output': 'a_outputs/a.md'}
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in (JOB_SUCCESS, JOB_FAILED)
+
+    def take_messages(self):
+        """返回尚未取走的提示消息，每条消息只返回一次（多个页面轮询同一任务时不重复显示）"""
+        with self._messages_lock:
+            messages = self.messages[self._messages_taken:]
+            self._messages_taken += len(messages)
+        return messages
+
+    def to_dict(self):
+        """转换为可JSON序列化的字典"""
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'method': self.method,
+            'status': self.status,
+            'finished': self.finished,
+            'messages': [{'category': c, 'message': m} for c, m in self.messages],
+            'result': self.result,
+            'progress': self.progress,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class ConversionJobManager:
+    """
+    转换任务管理器
+
+    Args:
+        max_workers (int): 同时执行的转换任务数
+        max_pending (int): 允许排队等待的最大任务数，超过后拒绝提交
+        max_history (int): 保留的已完成任务记录数
+    """
+
+    def __init__(self, max_workers=2, max_pending=20, max_history=200):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='convert')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, func, filename, method, *args, **kwargs):
+        """
+        提交一个转换任务
+
+        Args:
+            func (callable): 执行转换的函数，签名为 func(job, *args, **kwargs)，
+                返回值会保存为任务结果；可以通过 job.messages 追加提示消息
+            filename (str): 待转换的文件名
+            method (str): 转换方法
+
+        Returns:
+            ConversionJob: 新建的任务
+        """
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.max_workers + self.max_pending:
+                raise JobQueueFullError(f"转换任务过多，当前有 {pending} 个任务未完成")
+
+            job = ConversionJob(filename, method)
+            self._jobs[job.id] = job
+            self._prune()
+
+        logger.info(f"提交转换任务 {job.id}: {filename} ({method})")
+        self._executor.submit(self._run, job, func, *args, **kwargs)
+        return job
+
+    def _run(self, job, func, *args, **kwargs):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        logger.info(f"开始执行转换任务 {job.id}: {job.filename}")
+        try:
+            job.result = func(job, *args, **kwargs)
+            job.status = JOB_SUCCESS
+        except Exception as e:
+            logger.error(f"转换任务 {job.id} 失败: {str(e)}", exc_info=True)
+            job.error = str(e)
+            job.messages.append(('error', f'转换失败: {str(e)}'))
+            job.status = JOB_FAILED
+        finally:
+            job.finished_at = time.time()
+            logger.info(f"转换任务 {job.id} 结束，状态: {job.status}，"
+                        f"耗时 {job.finished_at - job.started_at:.2f} 秒")
+
+    def _prune(self):
+        """丢弃最早的已完成任务记录，避免内存无限增长（调用方需持有锁）"""
+        finished_ids = [job_id for job_id, job in self._jobs.items() if job.finished]
+        excess = len(finished_ids) - self.max_history
+        for job_id in finished_ids[:max(excess, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """获取任务，不存在时返回None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        """按提交顺序返回所有任务"""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
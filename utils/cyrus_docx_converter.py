@@ -10,12 +10,10 @@ import importlib.util
 import re
 import shutil
 import zipfile
+from utils.image_storage import converter_image_link, rewrite_image_links
 
 logger = logging.getLogger(__name__)
 
-# Gitee基础URL
-GITEE_BASE_URL = "https://gitee.com/comma-dong/image-projects/raw/master/"
-
 def is_local_docx2md_available():
     """检查本地docx2markdown库是否可用"""
     try:
@@ -73,95 +71,23 @@ def convert_docx_to_md_cyrus(docx_path, output_path, image_dir=None):
             from docx2markdown.docx_parser import DocxParser
             from docx2markdown.docx_to_markdown_converter import DocxToMarkdownConverter, docx_to_markdown
             
-            # 创建解析器并提取所有媒体文件
+            # 创建解析器（仅在手动生成Markdown时使用）
             parser = DocxParser(docx_path)
             
-            # 确保DocxParser有extract_image方法
-            if not hasattr(parser, 'extract_image'):
-                logger.warning("DocxParser缺少extract_image方法，尝试动态添加...")
-                
-                def extract_image(self, image_path, output_path):
-                    """
-                    从.docx文件中提取指定的图片并保存到指定路径
-                    """
-                    try:
-                        logger.info(f"尝试提取图片: {image_path} 到 {output_path}")
-                        with zipfile.ZipFile(self.file_path, 'r') as docx_zip:
-                            # 获取所有媒体文件列表
-                            media_files = [name for name in docx_zip.namelist() if name.startswith('word/media/')]
-                            logger.info(f"文档中的媒体文件数量: {len(media_files)}")
-                            
-                            # 检查文件是否存在
-                            if image_path in docx_zip.namelist():
-                                # 获取图片数据
-                                image_data = docx_zip.read(image_path)
-                                
-                                # 确保输出目录存在
-                                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                                
-                                # 保存图片
-                                with open(output_path, 'wb') as img_file:
-                                    img_file.write(image_data)
-                                logger.info(f"成功提取图片: {image_path} 到 {output_path}")
-                                return True
-                            else:
-                                # 尝试通过基本名称匹配
-                                base_name = os.path.basename(image_path)
-                                for name in media_files:
-                                    if name.endswith(base_name) or base_name in name:
-                                        logger.info(f"找到匹配文件: {name}")
-                                        # 获取图片数据
-                                        image_data = docx_zip.read(name)
-                                        
-                                        # 确保输出目录存在
-                                        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                                        
-                                        # 保存图片
-                                        with open(output_path, 'wb') as img_file:
-                                            img_file.write(image_data)
-                                        logger.info(f"通过匹配文件名成功提取图片: {name} 到 {output_path}")
-                                        return True
-                                
-                                # 如果找不到匹配的图片，尝试从media文件夹中提取第一个图片
-                                if media_files:
-                                    logger.info(f"未找到匹配的图片，尝试提取第一个媒体文件: {media_files[0]}")
-                                    image_data = docx_zip.read(media_files[0])
-                                    
-                                    # 确保输出目录存在
-                                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                                    
-                                    # 保存图片
-                                    with open(output_path, 'wb') as img_file:
-                                        img_file.write(image_data)
-                                    logger.info(f"已提取替代图片: {media_files[0]} 到 {output_path}")
-                                    return True
-                                
-                                logger.info(f"无法在文档中找到任何可用图片")
-                                return False
-                    except Exception as e:
-                        logger.error(f"提取图片时出错: {str(e)}")
-                        import traceback
-                        traceback.print_exc()
-                        return False
-                
-                # 动态添加方法
-                DocxParser.extract_image = extract_image
-                logger.info("已动态添加extract_image方法")
-                
-            # 提取所有媒体文件到图片目录
-            parser.extract_media(image_output_dir)
-            
             # 尝试使用DocxToMarkdownConverter进行转换
             try:
                 # 检查DocxToMarkdownConverter是否接受output_path参数
                 if 'output_path' in importlib.import_module('utils.docx2markdown.docx_to_markdown_converter').__dict__['DocxToMarkdownConverter'].__init__.__code__.co_varnames:
                     logger.info("使用DocxToMarkdownConverter进行转换...")
-                    converter = DocxToMarkdownConverter(docx_path, output_path)
-                    markdown_content = converter.convert()
+                    # 转换器按引用提取图片到图片目录，每张图片只写出一次
+                    folder_name = doc_name + "_outputs"
+                    converter = DocxToMarkdownConverter(
+                        docx_path, output_path, image_output_dir,
+                        image_link=lambda image_name: converter_image_link(folder_name, image_name)
+                    )
                     
-                    # 将Markdown内容写入文件
-                    with open(output_path, "w", encoding="utf-8") as f:
-                        f.write(markdown_content)
+                    # 逐个元素流式写入Markdown文件
+                    converter.convert_to(output_path)
                 else:
                     # 使用docx_to_markdown函数
                     logger.info("使用docx_to_markdown函数进行转换...")
@@ -213,9 +139,9 @@ def convert_docx_to_md_cyrus(docx_path, output_path, image_dir=None):
                             output_img_path = os.path.join(image_output_dir, new_image_name)
                             
                             if parser.extract_image(element.image['file'], output_img_path):
-                                # 构建Gitee远程URL
+                                # 构建图片链接
                                 folder_name = doc_name + "_outputs"
-                                remote_url = f"{GITEE_BASE_URL}{folder_name}/{new_image_name}"
+                                remote_url = converter_image_link(folder_name, new_image_name)
                                 markdown_content.append(f"\n![{new_image_name}]({remote_url})\n")
                     
                     elif hasattr(element, 'rows'):  # 如果是表格
@@ -230,6 +156,8 @@ def convert_docx_to_md_cyrus(docx_path, output_path, image_dir=None):
                     f.write(final_content)
                 
                 logger.info(f"手动生成Markdown完成: {output_path}")
+            finally:
+                parser.close()
         
         except ImportError as e:
             logger.error(f"导入模块失败: {str(e)}")
@@ -258,7 +186,7 @@ def convert_docx_to_md_cyrus(docx_path, output_path, image_dir=None):
 
 def _update_image_links(md_file_path, image_folder_name):
     """
-    更新Markdown文件中的图片链接为Gitee远程链接
+    更新Markdown文件中的图片链接为图片存储的链接
     
     Args:
         md_file_path (str): Markdown文件路径
@@ -281,55 +209,29 @@ def _update_image_links(md_file_path, image_folder_name):
         with open(md_file_path, 'r', encoding='utf-8') as file:
             content = file.read()
         
-        # 计数转换的图片链接数量和base64图片数量
+        # 一次扫描同时替换base64图片和本地图片链接，已经是远程链接的保持不变
         replaced_count = 0
-        
-        # 替换所有base64编码的图片链接
-        base64_pattern = r'!\[(.*?)\]\(data:image\/[^;]+;base64,[^\)]+\)'
-        
-        def replace_base64(match):
-            nonlocal replaced_count
-            alt_text = match.group(1)
-            
-            # 生成新的图片文件名
-            new_image_name = f"base64_image_{replaced_count + 1}.png"
-            
-            # 创建远程URL
-            remote_url = f"{GITEE_BASE_URL}{image_folder_name}/{new_image_name}"
-            
-            # 增加计数
-            replaced_count += 1
-            
-            # 返回替换后的链接
-            return f"![{alt_text}]({remote_url})"
-        
-        # 替换所有base64图片
-        content = re.sub(base64_pattern, replace_base64, content)
-        
-        # 然后替换所有本地图片链接为远程链接
-        # 匹配Markdown图片语法 ![alt](path)，但排除已经是远程链接的情况
-        local_pattern = r'!\[(.*?)\]\(((?!data:image|http|https).*?)\)'
-        
         local_replaced_count = 0
-        def replace_local_link(match):
-            nonlocal local_replaced_count
-            alt_text = match.group(1)
-            img_path = match.group(2)
-            
-            # 获取图片文件名
-            img_filename = os.path.basename(img_path)
-            
-            # 创建新的远程链接
-            remote_url = f"{GITEE_BASE_URL}{image_folder_name}/{img_filename}"
+        
+        def resolve(target):
+            nonlocal replaced_count, local_replaced_count
+            if target.startswith('data:image/') and ';base64,' in target:
+                # 生成新的图片文件名
+                replaced_count += 1
+                new_image_name = f"base64_image_{replaced_count}.png"
+                return converter_image_link(image_folder_name, new_image_name)
+            if target.startswith(('data:image', 'http')):
+                return None
             
-            # 增加计数
+            # 本地图片：按文件名生成存储链接；非Gitee存储返回本地文件名，保留原链接等待上传
+            image_name = os.path.basename(target)
+            link = converter_image_link(image_folder_name, image_name)
+            if link == image_name:
+                return None
             local_replaced_count += 1
-            
-            # 返回替换后的链接
-            return f"![{alt_text}]({remote_url})"
+            return link
         
-        # 替换所有本地图片链接
-        content = re.sub(local_pattern, replace_local_link, content)
+        content, _ = rewrite_image_links(content, resolve)
         
         # 写回文件
         with open(md_file_path, 'w', encoding='utf-8') as file:
@@ -1,7 +1,10 @@
+import io
+import shutil
 import zipfile
 import xml.etree.ElementTree as ET
 import os
 import base64
+from collections import namedtuple
 
 
 # 定义样式对象，用于存储段落的样式信息
@@ -68,40 +71,186 @@ class Table:
         return f"Table({len(self.rows)} rows)"
 
 
+# document.xml.rels 中的一条关系：关系类型和目标（图片路径、超链接 URL 等）
+Relationship = namedtuple('Relationship', ['type', 'target'])
+
+
+class NumberingTable:
+    """
+    numbering.xml 预编译后的编号查找表：(numId, ilvl) -> 编号信息
+
+    numbering.xml 只解析一次。w:num 中的 w:lvlOverride 会覆盖抽象编号的层级定义：
+    带 w:lvl 时整体替换该层级，带 w:startOverride 时只替换起始编号。
+    """
+
+    W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+    def __init__(self, numbering_xml):
+        self.levels = {}  # (numId, ilvl) -> {'num_format', 'lvl_text', 'bullet', 'start'}
+        self.num_abstract_ids = {}  # numId -> abstractNumId
+        self.abstract_levels = {}  # abstractNumId -> {ilvl: 编号信息}
+
+        if numbering_xml is not None:
+            self._compile(ET.fromstring(numbering_xml))
+
+    def _parse_start(self, element):
+        """
+        读取起始编号的 w:val，缺失或不是整数时返回 None（使用默认起始编号）。
+        """
+        if element is None:
+            return None
+        try:
+            return int(element.get(f'{self.W}val'))
+        except (TypeError, ValueError):
+            return None
+
+    def _parse_level(self, lvl):
+        """
+        解析一个 <w:lvl> 层级定义。
+        """
+        W = self.W
+        num_fmt = lvl.find(f'.//{W}numFmt')
+        lvl_text = lvl.find(f'.//{W}lvlText')
+        start = lvl.find(f'.//{W}start')
+
+        num_format = num_fmt.get(f'{W}val') if num_fmt is not None else None
+
+        # 获取符号（仅对无序列表有效）
+        bullet = None
+        if num_format == 'bullet':
+            r_fonts = lvl.find(f'.//{W}rPr/{W}rFonts')
+            if r_fonts is not None:
+                bullet = r_fonts.get(f'{W}ascii', None)
+
+        return {
+            'num_format': num_format,  # 编号格式（有序：decimal，无序：bullet）
+            'lvl_text': lvl_text.get(f'{W}val') if lvl_text is not None else None,  # 层级文本格式（如 "%1." 或 ""）
+            'bullet': bullet,  # 无序列表的符号（如果是无序列表）
+            'start': self._parse_start(start),  # 起始编号
+        }
+
+    def _compile(self, root):
+        W = self.W
+
+        # 抽象编号的层级定义（重复的 Id 以第一个为准）
+        for abstract_num in root.iter(f'{W}abstractNum'):
+            abstract_num_id = abstract_num.get(f'{W}abstractNumId')
+            if abstract_num_id in self.abstract_levels:
+                continue
+            levels = {}
+            for lvl in abstract_num.iter(f'{W}lvl'):
+                levels.setdefault(lvl.get(f'{W}ilvl'), self._parse_level(lvl))
+            self.abstract_levels[abstract_num_id] = levels
+
+        # 每个 numId 引用一个抽象编号，并可按层级覆盖
+        for num in root.iter(f'{W}num'):
+            num_id = num.get(f'{W}numId')
+            if num_id in self.num_abstract_ids:
+                continue
+            abstract_num_id_element = num.find(f'.//{W}abstractNumId')
+            abstract_num_id = abstract_num_id_element.get(f'{W}val') if abstract_num_id_element is not None else None
+            self.num_abstract_ids[num_id] = abstract_num_id
+
+            levels = {ilvl: dict(info) for ilvl, info in self.abstract_levels.get(abstract_num_id, {}).items()}
+            for override in num.iter(f'{W}lvlOverride'):
+                ilvl = override.get(f'{W}ilvl')
+                override_lvl = override.find(f'{W}lvl')
+                if override_lvl is not None:
+                    levels[ilvl] = self._parse_level(override_lvl)
+                start_override = self._parse_start(override.find(f'{W}startOverride'))
+                if start_override is not None and ilvl in levels:
+                    levels[ilvl]['start'] = start_override
+
+            for ilvl, info in levels.items():
+                self.levels[(num_id, ilvl)] = info
+
+    def get(self, numId, ilvl):
+        """
+        查找编号信息，找不到时抛出 ValueError。
+
+        :return: 编号信息字典的副本
+        """
+        info = self.levels.get((numId, ilvl))
+        if info is not None:
+            return dict(info)
+
+        if numId not in self.num_abstract_ids:
+            raise ValueError(f"无法找到 numId={numId} 对应的编号配置")
+        abstract_num_id = self.num_abstract_ids[numId]
+        if abstract_num_id not in self.abstract_levels:
+            raise ValueError(f"无法找到 abstractNumId={abstract_num_id} 对应的列表配置")
+        raise ValueError(f"无法找到 ilvl={ilvl} 对应的层级配置")
+
+
 class DocxParser:
     def __init__(self, file_path):
         self.file_path = file_path
         self.document_xml = None
         self.rels_xml = None
         self.numbering_xml = None
+        self.relationships = {}  # rId -> Relationship(type, target)
+        self._numbering_table = None
+        self._package = None  # 常驻的 docx (zip) 句柄，第一次使用时打开
+        self._package_names = set()
+        self.media_index = {}  # word/media/ 下的部件名 -> ZipInfo
+        self.extracted_media = {}  # 已写出的媒体部件名 -> 输出路径
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_package(self):
+        """
+        返回常驻的 zip 句柄，第一次调用时打开文件并建立部件名和媒体索引。
+        """
+        if self._package is None:
+            try:
+                self._package = zipfile.ZipFile(self.file_path, 'r')
+            except zipfile.BadZipFile:
+                raise ValueError(f"{self.file_path} 不是有效的 .docx 文件")
+            infos = self._package.infolist()
+            self._package_names = {info.filename for info in infos}
+            self.media_index = {info.filename: info for info in infos if info.filename.startswith('word/media/')}
+        return self._package
+
+    def close(self):
+        """
+        关闭 docx 文件句柄。
+        """
+        if self._package is not None:
+            self._package.close()
+            self._package = None
 
-    def _extract_document_xml(self):
+    def _extract_document_xml(self, read_document=True):
         """
         解压 docx 文件，获取 document.xml 的内容。
+
+        :param read_document: 为 False 时只读取关系和编号等辅助部件，document.xml 留给流式解析
         """
-        try:
-            with zipfile.ZipFile(self.file_path, 'r') as docx_zip:
-                # 查找 document.xml 文件
-                if 'word/document.xml' in docx_zip.namelist():
-                    with docx_zip.open('word/document.xml') as document_file:
-                        self.document_xml = document_file.read()
-                else:
-                    raise ValueError("document.xml 文件未找到")
-
-                # 查找 document.xml.rels 文件
-                if 'word/_rels/document.xml.rels' in docx_zip.namelist():
-                    with docx_zip.open('word/_rels/document.xml.rels') as rels_file:
-                        self.rels_xml = rels_file.read()
-                else:
-                    raise ValueError("document.xml.rels 文件未找到")
-
-                # 查找 numbering.xml 文件
-                if 'word/numbering.xml' in docx_zip.namelist():
-                    with docx_zip.open('word/numbering.xml') as rels_file:
-                        self.numbering_xml = rels_file.read()
-
-        except zipfile.BadZipFile:
-            raise ValueError(f"{self.file_path} 不是有效的 .docx 文件")
+        docx_zip = self._get_package()
+
+        # 查找 document.xml 文件
+        if 'word/document.xml' in self._package_names:
+            if read_document:
+                with docx_zip.open('word/document.xml') as document_file:
+                    self.document_xml = document_file.read()
+        else:
+            raise ValueError("document.xml 文件未找到")
+
+        # 查找 document.xml.rels 文件
+        if 'word/_rels/document.xml.rels' in self._package_names:
+            with docx_zip.open('word/_rels/document.xml.rels') as rels_file:
+                self.rels_xml = rels_file.read()
+            self.relationships = self._parse_relationships(self.rels_xml)
+        else:
+            raise ValueError("document.xml.rels 文件未找到")
+
+        # 查找 numbering.xml 文件
+        if 'word/numbering.xml' in self._package_names:
+            with docx_zip.open('word/numbering.xml') as rels_file:
+                self.numbering_xml = rels_file.read()
 
     def _parse_hyperlink(self, paragraph_element, ns):
         """
@@ -122,25 +271,32 @@ class DocxParser:
                     hyperlink = Hyperlink(r_id, hyperlink_text, url)
         return hyperlink
 
-    def _get_hyperlink_url(self, r_id):
+    def _parse_relationships(self, rels_xml):
         """
-        从 document.xml.rels 文件中获取 r_id 对应的真实 URL。
+        解析 document.xml.rels，建立 rId 到关系的索引。
+
+        :param rels_xml: document.xml.rels 的内容
+        :return: 字典 {rId: Relationship(type, target)}
         """
-        url = None
-        if self.rels_xml is not None:
-            rels_tree = ET.ElementTree(ET.fromstring(self.rels_xml))
-            rels_root = rels_tree.getroot()
+        namespaces = {
+            'rels': 'http://schemas.openxmlformats.org/package/2006/relationships'
+        }
+        rels_root = ET.fromstring(rels_xml)
 
-            namespaces = {
-                'rels': 'http://schemas.openxmlformats.org/package/2006/relationships'
-            }
+        relationships = {}
+        for rel in rels_root.findall('rels:Relationship', namespaces):
+            r_id = rel.attrib.get('Id')
+            # 与逐条查找时一致：重复的 Id 以第一条为准
+            if r_id is not None and r_id not in relationships:
+                relationships[r_id] = Relationship(rel.attrib.get('Type'), rel.attrib.get('Target'))
+        return relationships
 
-            # 查找与超链接相关的关系
-            for rel in rels_root.findall('rels:Relationship', namespaces):
-                if rel.attrib.get('Id') == r_id:
-                    url = rel.attrib.get('Target')
-                    break
-        return url
+    def _get_hyperlink_url(self, r_id):
+        """
+        从关系索引中获取 r_id 对应的真实 URL。
+        """
+        relationship = self.relationships.get(r_id)
+        return relationship.target if relationship else None
 
     def _parse_style(self, paragraph_element, ns):
         """
@@ -246,54 +402,24 @@ class DocxParser:
 
         return numbering
 
+    @property
+    def numbering_table(self):
+        """
+        预编译的编号查找表，第一次使用时解析 numbering.xml。
+        """
+        if self._numbering_table is None:
+            self._numbering_table = NumberingTable(self.numbering_xml)
+        return self._numbering_table
+
     def _get_numbering_info(self, numId, ilvl):
         """
-        根据 numId 和 ilvl 从 numbering.xml 获取对应的 numbering 信息。
+        根据 numId 和 ilvl 从编号查找表获取对应的 numbering 信息。
 
         :param numId: 段落中的 numId
         :param ilvl: 段落中的层级 ilvl
         :return: 对应的 numbering 信息（字典格式）
         """
-        # 解析 XML
-        ns = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
-        tree = ET.ElementTree(ET.fromstring(self.numbering_xml))
-        root = tree.getroot()
-
-        # 查找 numId 对应的 num
-        num = root.find(f'.//w:num[@w:numId="{numId}"]', ns)
-        if num is None:
-            raise ValueError(f"无法找到 numId={numId} 对应的编号配置")
-
-        # 获取该 numId 对应的 abstractNumId
-        abstract_num_id = num.find('.//w:abstractNumId', ns).get('{http://schemas.openxmlformats.org/wordprocessingml/2006/main}val')
-
-        # 查找对应 abstractNumId 的 abstractNum 配置
-        abstract_num = root.find(f'.//w:abstractNum[@w:abstractNumId="{abstract_num_id}"]', ns)
-        if abstract_num is None:
-            raise ValueError(f"无法找到 abstractNumId={abstract_num_id} 对应的列表配置")
-
-        # 获取该层级的配置
-        lvl = abstract_num.find(f'.//w:lvl[@w:ilvl="{ilvl}"]', ns)
-        if lvl is None:
-            raise ValueError(f"无法找到 ilvl={ilvl} 对应的层级配置")
-
-        # 获取该层级的编号格式（numFmt）和编号文本格式（lvlText）
-        num_format = lvl.find('.//w:numFmt', ns).get('{http://schemas.openxmlformats.org/wordprocessingml/2006/main}val')
-        lvl_text = lvl.find('.//w:lvlText', ns).get('{http://schemas.openxmlformats.org/wordprocessingml/2006/main}val')
-
-        # 获取符号（仅对无序列表有效）
-        bullet = None
-        if num_format == 'bullet':
-            bullet = lvl.find('.//w:rPr/w:rFonts', ns).get('{http://schemas.openxmlformats.org/wordprocessingml/2006/main}ascii', None)
-
-        # 返回该层级的详细信息
-        numbering_info = {
-            'num_format': num_format,  # 编号格式（有序：decimal，无序：bullet）
-            'lvl_text': lvl_text,  # 层级文本格式（如 "%1." 或 ""）
-            'bullet': bullet  # 无序列表的符号（如果是无序列表）
-        }
-
-        return numbering_info
+        return self.numbering_table.get(numId, ilvl)
 
     def _parse_table(self, element, ns):
         """
@@ -325,23 +451,55 @@ class DocxParser:
 
         return table_data
 
-    def parse(self):
+    # 解析 document.xml 使用的命名空间
+    NAMESPACES = {
+        'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
+        'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+        'wp': 'http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing',
+        'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+        'pic': 'http://schemas.openxmlformats.org/drawingml/2006/picture'
+    }
+
+    def _parse_body_element(self, element, ns):
+        """
+        将 <w:body> 下的一个直接子元素转换为 Paragraph 或 Table 对象，其他元素返回 None。
+        """
+        # 处理段落 <w:p>
+        if element.tag == '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}p':
+
+            texts = [node.text for node in element.findall('.//w:t', ns) if node.text]
+            paragraph_text = ''.join(texts)
+            paragraph_style = self._parse_style(element, ns)
+            paragraph_image = self._parse_image(element, ns)
+            paragraph_numbering = self._parse_numbering(element, ns)
+            paragraph_hyperlink = self._parse_hyperlink(element, ns)
+
+            return Paragraph(paragraph_text, paragraph_style, paragraph_image, paragraph_numbering, paragraph_hyperlink)
+
+        # 处理表格 <w:tbl>
+        elif element.tag == '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}tbl':
+            table_data = self._parse_table(element, ns)
+            return Table(table_data)
+
+        return None
+
+    def parse(self, streaming=False):
         """
         解析 document.xml 内容并返回文档对象，包含段落和样式。
+
+        :param streaming: 为 True 时 'elements' 是按文档顺序产出元素的生成器（见 iter_elements），
+                          适用于 document.xml 非常大的文档
         """
+        if streaming:
+            return {'elements': self.iter_elements()}
+
         if self.document_xml is None:
             self._extract_document_xml()
 
         # 解析 XML 内容
         try:
             root = ET.fromstring(self.document_xml)
-            ns = {
-                'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
-                'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
-                'wp': 'http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing',
-                'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
-                'pic': 'http://schemas.openxmlformats.org/drawingml/2006/picture'
-            }
+            ns = self.NAMESPACES
 
             elements = []
 
@@ -350,83 +508,159 @@ class DocxParser:
 
             # 只迭代 <w:body> 下的直接子元素（不递归）
             for element in body.findall('*'):  # '*' 表示所有直接子元素
+                element_obj = self._parse_body_element(element, ns)
+                if element_obj is not None:
+                    elements.append(element_obj)
+
+            return {'elements': elements}
+
+        except ET.ParseError:
+            raise ValueError("无法解析 document.xml 内容")
 
-                # 处理段落 <w:p>
-                if element.tag == '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}p':
+    def iter_elements(self):
+        """
+        流式解析 document.xml，按文档顺序逐个产出段落和表格对象。
 
-                    texts = [node.text for node in element.findall('.//w:t', ns) if node.text]
-                    paragraph_text = ''.join(texts)
-                    paragraph_style = self._parse_style(element, ns)
-                    paragraph_image = self._parse_image(element, ns)
-                    paragraph_numbering = self._parse_numbering(element, ns)
-                    paragraph_hyperlink = self._parse_hyperlink(element, ns)
+        直接对 zip 中的 document.xml 做增量解析，<w:body> 的每个子元素闭合后立即转换并清除，
+        内存占用只取决于单个段落或表格的大小，与文档大小无关。
+        """
+        if self.rels_xml is None:
+            self._extract_document_xml(read_document=False)
 
-                    paragraph_obj = Paragraph(paragraph_text, paragraph_style, paragraph_image, paragraph_numbering, paragraph_hyperlink)
-                    elements.append(paragraph_obj)
+        ns = self.NAMESPACES
+        body_tag = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}body'
 
-                # 处理表格 <w:tbl>
-                elif element.tag == '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}tbl':
-                    table_data = self._parse_table(element, ns)
-                    table_obj = Table(table_data)
-                    elements.append(table_obj)
+        if self.document_xml is not None:
+            source = io.BytesIO(self.document_xml)
+        else:
+            source = self._get_package().open('word/document.xml')
 
-            return {'elements': elements}
+        try:
+            depth = 0
+            body = None
+            for event, element in ET.iterparse(source, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if depth == 2 and element.tag == body_tag:
+                        body = element
+                    continue
+
+                depth -= 1
+                if body is None:
+                    continue
+                if depth == 2:
+                    # <w:body> 的直接子元素已完整读入
+                    element_obj = self._parse_body_element(element, ns)
+                    # 清除已处理的元素，避免整棵树留在内存中
+                    body.clear()
+                    if element_obj is not None:
+                        yield element_obj
+                elif depth == 1:
+                    # </w:body>，后面不会再有正文内容
+                    break
 
         except ET.ParseError:
             raise ValueError("无法解析 document.xml 内容")
+        finally:
+            source.close()
+
+    def _find_media(self, image_path):
+        """
+        在媒体索引中查找图片部件：先精确匹配，再按文件名匹配，最后退回第一个媒体文件。
+
+        :return: 部件名，找不到任何媒体文件时返回 None
+        """
+        self._get_package()
+
+        if image_path in self._package_names:
+            return image_path
+
+        print(f"图片 {image_path} 不存在于 .docx 文件中，尝试匹配文件名...")
+
+        # 尝试通过基本名称匹配
+        base_name = os.path.basename(image_path)
+        for name in self.media_index:
+            if name.endswith(base_name) or base_name in name:
+                print(f"找到匹配文件: {name}")
+                return name
+
+        # 如果找不到匹配的图片，退回第一个媒体文件
+        if self.media_index:
+            name = next(iter(self.media_index))
+            print(f"未找到匹配的图片，使用第一个媒体文件: {name}")
+            return name
+
+        return None
+
+    def _write_part(self, part_name, output_path):
+        """
+        将 zip 中的一个部件流式写入文件。
+        """
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with self._get_package().open(part_name) as part, open(output_path, 'wb') as output_file:
+            shutil.copyfileobj(part, output_file)
+        self.extracted_media[part_name] = output_path
 
     def extract_media(self, output_folder):
         """
         从 .docx 文件中提取 media 文件夹中的所有图片并保存到指定文件夹
+
+        每个媒体部件只写出一次：之前已写到该文件夹的部件会被跳过。
+
+        :return: 字典 {部件名: 输出路径}
         """
 
         if not os.path.exists(output_folder):
             os.makedirs(output_folder)  # 如果输出文件夹不存在，创建它
 
+        extracted = {}
         try:
-            # 打开 docx 文件
-            with zipfile.ZipFile(self.file_path, 'r') as docx_zip:
-                # 获取 .docx 文件内的所有文件
-                media_files = [name for name in docx_zip.namelist() if name.startswith('word/media/')]
-
-                for media_file in media_files:
-                    # 获取图片文件的内容
-                    image_data = docx_zip.read(media_file)
-                    # 获取文件名并设置保存路径
-                    image_name = os.path.basename(media_file)
-                    output_path = os.path.join(output_folder, image_name)
-
-                    # 保存图片
-                    with open(output_path, 'wb') as img_file:
-                        img_file.write(image_data)
-                    print(f"保存图片: {image_name} 到 {output_path}")
-        except zipfile.BadZipFile:
+            self._get_package()
+        except ValueError:
             print(f"无法打开 {self.file_path}，请确保它是一个有效的 .docx 文件")
+            return extracted
+
+        for media_file in self.media_index:
+            # 获取文件名并设置保存路径
+            image_name = os.path.basename(media_file)
+            output_path = os.path.join(output_folder, image_name)
+
+            if self.extracted_media.get(media_file) != output_path:
+                # 保存图片
+                self._write_part(media_file, output_path)
+                print(f"保存图片: {image_name} 到 {output_path}")
+            extracted[media_file] = output_path
+
+        return extracted
 
     def get_image_base64(self, image_path):
         """
         从 .docx 文件中提取指定的图片并将其转换为 Base64 编码。
         """
         try:
-            with zipfile.ZipFile(self.file_path, 'r') as docx_zip:
-
-                # 检查文件是否存在
-                if image_path in docx_zip.namelist():
-                    image_data = docx_zip.read(image_path)
-
-                    # 将图片数据转换为 Base64 编码
-                    base64_image = base64.b64encode(image_data).decode('utf-8')
-                    return base64_image
-                else:
-                    print(f"图片 {image_path} 不存在于 .docx 文件中")
-                    return None
-        except zipfile.BadZipFile:
+            docx_zip = self._get_package()
+        except ValueError:
             print(f"无法打开 {self.file_path}，请确保它是一个有效的 .docx 文件")
             return None
 
+        # 检查文件是否存在
+        if image_path in self._package_names:
+            image_data = docx_zip.read(image_path)
+
+            # 将图片数据转换为 Base64 编码
+            base64_image = base64.b64encode(image_data).decode('utf-8')
+            return base64_image
+        else:
+            print(f"图片 {image_path} 不存在于 .docx 文件中")
+            return None
+
     def extract_image(self, image_path, output_path):
         """
         从.docx文件中提取指定的图片并保存到指定路径
+
+        找不到 image_path 时按文件名匹配，仍找不到则使用文档中的第一个媒体文件。
         
         Args:
             image_path (str): docx中的图片路径，例如: 'word/media/image1.png'
@@ -436,61 +670,16 @@ class DocxParser:
             bool: 是否成功提取图片
         """
         try:
-            print(f"尝试提取图片: {image_path} 到 {output_path}")
-            with zipfile.ZipFile(self.file_path, 'r') as docx_zip:
-                # 获取所有媒体文件列表
-                media_files = [name for name in docx_zip.namelist() if name.startswith('word/media/')]
-                print(f"文档中的媒体文件数量: {len(media_files)}")
-                
-                # 检查文件是否存在
-                if image_path in docx_zip.namelist():
-                    # 获取图片数据
-                    image_data = docx_zip.read(image_path)
-                    
-                    # 确保输出目录存在
-                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                    
-                    # 保存图片
-                    with open(output_path, 'wb') as img_file:
-                        img_file.write(image_data)
-                    print(f"成功提取图片: {image_path} 到 {output_path}")
-                    return True
-                else:
-                    print(f"图片 {image_path} 不存在于 .docx 文件中，尝试匹配文件名...")
-                    
-                    # 尝试通过基本名称匹配
-                    base_name = os.path.basename(image_path)
-                    for name in media_files:
-                        if name.endswith(base_name) or base_name in name:
-                            print(f"找到匹配文件: {name}")
-                            # 获取图片数据
-                            image_data = docx_zip.read(name)
-                            
-                            # 确保输出目录存在
-                            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                            
-                            # 保存图片
-                            with open(output_path, 'wb') as img_file:
-                                img_file.write(image_data)
-                            print(f"通过匹配文件名成功提取图片: {name} 到 {output_path}")
-                            return True
-                    
-                    # 如果找不到匹配的图片，尝试从media文件夹中提取第一个图片
-                    if media_files:
-                        print(f"未找到匹配的图片，尝试提取第一个媒体文件: {media_files[0]}")
-                        image_data = docx_zip.read(media_files[0])
-                        
-                        # 确保输出目录存在
-                        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                        
-                        # 保存图片
-                        with open(output_path, 'wb') as img_file:
-                            img_file.write(image_data)
-                        print(f"已提取替代图片: {media_files[0]} 到 {output_path}")
-                        return True
-                    
-                    print(f"无法在文档中找到任何可用图片")
-                    return False
+            part_name = self._find_media(image_path)
+            if part_name is None:
+                print(f"无法在文档中找到任何可用图片")
+                return False
+
+            # 同一部件已经写到该路径时不再重复写出
+            if self.extracted_media.get(part_name) != output_path:
+                self._write_part(part_name, output_path)
+                print(f"成功提取图片: {part_name} 到 {output_path}")
+            return True
         except Exception as e:
             print(f"提取图片时出错: {str(e)}")
             import traceback
@@ -2,25 +2,31 @@ import os
 
 from docx2markdown.docx_parser import DocxParser, Paragraph, Table
 
-# 添加Gitee基础URL常量
-GITEE_BASE_URL = "https://gitee.com/comma-dong/image-projects/raw/master/"
-
 class DocxToMarkdownConverter:
-    def __init__(self, docx_file, output_path=None):
+    def __init__(self, docx_file, output_path=None, image_dir=None, image_link=None):
         self.docx_file = docx_file
         self.output_path = output_path
+        # 图片文件名 -> Markdown中的图片链接；默认使用相对于Markdown文件的本地路径
+        self.image_link = image_link or self._relative_image_link
         self.in_code_block = False  # 用于追踪是否在代码块中
         self.code_block_content = ""  # 存储代码块的内容
         self.image_count = 0  # 用于计数和生成图片文件名
         self.extracted_images = []  # 保存已提取的图片信息
+        self.image_names = {}  # docx 中的图片路径 -> 已写出的图片文件名
+        self.list_counters = {}  # (numId, ilvl) -> 该层级当前的编号
         
         # 获取文档名，用于创建图片目录
         if output_path:
             self.doc_name = os.path.basename(output_path).split('.')[0]
-            # 创建图片目录 - 与MD文件同级
-            self.img_dir = os.path.join(os.path.dirname(output_path), self.doc_name + "_outputs")
+            # 创建图片目录 - 默认与MD文件同级，也可以由调用方指定
+            self.img_dir = image_dir or os.path.join(os.path.dirname(output_path), self.doc_name + "_outputs")
             os.makedirs(self.img_dir, exist_ok=True)
 
+    def _relative_image_link(self, image_name):
+        """图片相对于Markdown文件所在目录的路径"""
+        image_path = os.path.join(self.img_dir, image_name)
+        return os.path.relpath(image_path, os.path.dirname(os.path.abspath(self.output_path))).replace(os.sep, "/")
+
     def _parse_text_with_hyperlink(self, paragraph):
         """
         如果文本中有超链接，转换为 Markdown 超链接格式
@@ -37,6 +43,21 @@ class DocxToMarkdownConverter:
             text = text.replace('<', '\\<', )
         return text
 
+    def _next_list_number(self, numbering, ilvl):
+        """
+        返回有序列表项的编号：每个 (numId, ilvl) 从起始编号（默认 1）开始递增，
+        出现上级列表项时下级编号重新开始。
+        """
+        num_id = numbering.get('numId')
+        for key in [key for key in self.list_counters if key[0] == num_id and key[1] > ilvl]:
+            del self.list_counters[key]
+        start = numbering.get('start')
+        if start is None:
+            start = 1
+        number = self.list_counters.get((num_id, ilvl), start - 1) + 1
+        self.list_counters[(num_id, ilvl)] = number
+        return number
+
     def _generate_markdown_from_paragraph(self, parser, paragraph):
         """
         根据段落信息生成相应的 Markdown 格式。
@@ -85,17 +106,21 @@ class DocxToMarkdownConverter:
                     # 无序列表
                     markdown_text += f"- {text}\n"
                 elif num_format in ['decimal', 'lowerRoman', 'lowerLetter']:
-                    # 有序列表，使用 numId 和 ilvl 生成编号
+                    # 有序列表，按 numId 和 ilvl 计数，从 numbering.xml 中的起始编号开始
+                    number = self._next_list_number(numbering, ilvl)
                     if num_format == 'decimal':
-                        # 有序列表的格式：1. 2. 3.
-                        markdown_text += f"{lvl_text.replace('%1', str(ilvl + 1))} {text}\n"
+                        # 有序列表的格式：1. 2. 3.，lvl_text 中的 %n 替换为第 n 级的编号
+                        item_text = lvl_text or f"%{ilvl + 1}."
+                        for level in range(ilvl, -1, -1):
+                            level_number = self.list_counters.get((numbering.get('numId'), level), 1)
+                            item_text = item_text.replace(f"%{level + 1}", str(level_number))
+                        markdown_text += f"{item_text} {text}\n"
                     elif num_format == 'lowerRoman':
                         roman_numerals = ['i', 'ii', 'iii', 'iv', 'v', 'vi', 'vii', 'viii', 'ix', 'x']
-                        roman = roman_numerals[ilvl] if ilvl < len(roman_numerals) else str(ilvl + 1)
+                        roman = roman_numerals[number - 1] if 0 < number <= len(roman_numerals) else str(number)
                         markdown_text += f"{roman}) {text}\n"
                     elif num_format == 'lowerLetter':
-                        letters = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j']
-                        letter = letters[ilvl] if ilvl < len(letters) else chr(ord('a') + ilvl)
+                        letter = chr(ord('a') + number - 1) if 0 < number <= 26 else str(number)
                         markdown_text += f"{letter}) {text}\n"
 
             else:
@@ -118,30 +143,32 @@ class DocxToMarkdownConverter:
         # 处理图片
         if image and self.output_path:
             image_filename = image['file']
-            self.image_count += 1
-            
-            # 获取图片扩展名
-            extension = os.path.splitext(image_filename)[1].lower()
-            if not extension:
-                extension = ".png"  # 默认png格式
-            
-            # 新的图片文件名
-            new_image_name = f"image_{self.image_count}{extension}"
-            output_path = os.path.join(self.img_dir, new_image_name)
-            
-            # 从docx中提取图片并保存到文件
-            if parser.extract_image(image_filename, output_path):
-                # 记录已提取的图片
-                self.extracted_images.append(new_image_name)
+
+            # 同一张图片被多次引用时复用已提取的文件
+            new_image_name = self.image_names.get(image_filename)
+            if new_image_name is None:
+                self.image_count += 1
                 
-                # 构建Gitee远程URL
-                folder_name = self.doc_name + "_outputs"
-                remote_url = f"{GITEE_BASE_URL}{folder_name}/{new_image_name}"
+                # 获取图片扩展名
+                extension = os.path.splitext(image_filename)[1].lower()
+                if not extension:
+                    extension = ".png"  # 默认png格式
                 
-                # 使用Gitee链接格式添加图片
-                markdown_text += f"\n![{new_image_name}]({remote_url})\n"
-            else:
-                print(f"无法提取图片: {image_filename}")
+                # 新的图片文件名
+                new_image_name = f"image_{self.image_count}{extension}"
+                output_path = os.path.join(self.img_dir, new_image_name)
+                
+                # 从docx中提取图片并保存到文件
+                if parser.extract_image(image_filename, output_path):
+                    # 记录已提取的图片
+                    self.extracted_images.append(new_image_name)
+                    self.image_names[image_filename] = new_image_name
+                else:
+                    new_image_name = None
+                    print(f"无法提取图片: {image_filename}")
+
+            if new_image_name:
+                markdown_text += f"\n![{new_image_name}]({self.image_link(new_image_name)})\n"
 
         return markdown_text
 
@@ -175,35 +202,66 @@ class DocxToMarkdownConverter:
         # 返回转换后的 Markdown 表格内容
         return "\n".join(markdown_table)
 
-    def convert(self):
+    def iter_markdown(self):
         """
-        转换整个 docx 文件的内容为 markdown 格式。
-        """
-        parser = DocxParser(self.docx_file)
-        document = parser.parse()
-        markdown_content = ""
+        流式转换：按文档顺序逐个元素产出 Markdown 片段。
 
-        for element in document['elements']:
-            if isinstance(element, Paragraph):
-                markdown_content += self._generate_markdown_from_paragraph(parser, element) + "\n"
-            elif isinstance(element, Table):
-                markdown_content += self._generate_markdown_from_table(element) + "\n"
+        使用 DocxParser 的流式解析，任意时刻只在内存中保留一个元素。
+        """
+        with DocxParser(self.docx_file) as parser:
+            for element in parser.iter_elements():
+                if isinstance(element, Paragraph):
+                    yield self._generate_markdown_from_paragraph(parser, element) + "\n"
+                elif isinstance(element, Table):
+                    yield self._generate_markdown_from_table(element) + "\n"
 
         # 如果文件结尾处仍然有未关闭的代码块，关闭它
         if self.in_code_block:
-            markdown_content += "```\n"
+            yield "```\n"
 
-        return markdown_content
+    def convert_to(self, output):
+        """
+        将 Markdown 片段直接写入输出，不在内存中拼接完整内容。
+
+        :param output: 输出文件路径，或任何带 write 方法的文本流
+        :return: 写入的字符数
+        """
+        if hasattr(output, 'write'):
+            return self._write_chunks(output)
+
+        output_dir = os.path.dirname(output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            return self._write_chunks(f)
+
+    def _write_chunks(self, stream):
+        written = 0
+        for chunk in self.iter_markdown():
+            stream.write(chunk)
+            written += len(chunk)
+        return written
+
+    def convert(self):
+        """
+        转换整个 docx 文件的内容为 markdown 格式。
+        """
+        return "".join(self.iter_markdown())
 
 
 def docx_to_markdown(docx_file, output=None):
+    """
+    转换 docx 文件。
+
+    :param output: 输出的 Markdown 文件路径，为空时不写文件
+    :return: 指定 output 时内容逐个元素流式写入文件，返回输出路径（不返回 Markdown 内容）；
+        否则返回 Markdown 内容字符串
+    """
     converter = DocxToMarkdownConverter(docx_file, output)
-    markdown_content = converter.convert()
 
     # 输出生成的 Markdown 内容
     if output:
-        with open(output, "w", encoding="utf-8") as f:
-            f.write(markdown_content)
+        converter.convert_to(output)
 
         print(f"Markdown 文件已生成：{output}")
         
@@ -212,4 +270,6 @@ def docx_to_markdown(docx_file, output=None):
             print(f"图片保存在：{converter.img_dir}")
             print(f"共提取了{len(converter.extracted_images)}张图片")
 
-    return markdown_content
+        return output
+
+    return converter.convert()
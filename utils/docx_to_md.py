@@ -13,8 +13,11 @@ from PIL import Image
 from io import BytesIO
 import markdown
 import logging
+from functools import cached_property, lru_cache
+from difflib import SequenceMatcher
 from docx.oxml.shared import qn
 from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from utils import code_classifier
 
 logger = logging.getLogger(__name__)
 
@@ -42,8 +45,11 @@ def get_image_paragraph_indices(doc):
     img_contexts = {}
     paragraph_text_map = {}
     
+    # doc.paragraphs 每次访问都会重新构建列表，只取一次
+    paragraphs = doc.paragraphs
+    
     # 先建立段落索引到文本内容的映射
-    for i, para in enumerate(doc.paragraphs):
+    for i, para in enumerate(paragraphs):
         paragraph_text_map[i] = para.text
     
     # 收集文档中的所有图片关系ID
@@ -53,48 +59,64 @@ def get_image_paragraph_indices(doc):
             rel_ids[rel_id] = rel.target_ref
     
     # 扫描所有段落，查找图片及其位置
-    for i, para in enumerate(doc.paragraphs):
+    for i, para in enumerate(paragraphs):
         for run in para.runs:
-            # 检查运行对象中的XML元素是否包含图片
-            if run._element.xml:
-                for drawing in run._element.findall(".//"+qn("w:drawing")):
-                    blip = drawing.find(".//"+qn("a:blip"))
-                    if blip is not None:
-                        embed_id = blip.get(qn("r:embed"))
-                        if embed_id and embed_id in rel_ids:
-                            target_ref = rel_ids[embed_id]
-                            if target_ref not in img_locations:
-                                img_locations[target_ref] = []
-                            img_locations[target_ref].append(i)
-                            
-                            # 扩展上下文窗口到前后5个段落
-                            # 收集图片上下文（前后段落的内容）
-                            context_paragraphs_before = []
-                            context_paragraphs_after = []
-                            
-                            # 收集前面5个段落
-                            for j in range(max(0, i-5), i):
-                                context_paragraphs_before.append(paragraph_text_map.get(j, ""))
-                            
-                            # 收集后面5个段落
-                            for j in range(i+1, min(len(doc.paragraphs), i+6)):
-                                context_paragraphs_after.append(paragraph_text_map.get(j, ""))
-                            
-                            img_contexts[target_ref] = {
-                                'paragraph_index': i,
-                                'context_paragraphs_before': context_paragraphs_before,
-                                'current_paragraph': para.text,
-                                'context_paragraphs_after': context_paragraphs_after,
-                                # 添加字符级上下文（截取图片附近的文本）
-                                'text_before_image': para.text[:para.text.find(run.text) + len(run.text)] if run.text in para.text else "",
-                                'text_after_image': para.text[para.text.find(run.text) + len(run.text):] if run.text in para.text else ""
-                            }
+            # 检查运行对象中的XML元素是否包含图片（直接查找元素，无需序列化XML）
+            for drawing in run._element.findall(".//"+qn("w:drawing")):
+                blip = drawing.find(".//"+qn("a:blip"))
+                if blip is not None:
+                    embed_id = blip.get(qn("r:embed"))
+                    if embed_id and embed_id in rel_ids:
+                        target_ref = rel_ids[embed_id]
+                        if target_ref not in img_locations:
+                            img_locations[target_ref] = []
+                        img_locations[target_ref].append(i)
+                        
+                        # 扩展上下文窗口到前后5个段落
+                        # 收集图片上下文（前后段落的内容）
+                        context_paragraphs_before = []
+                        context_paragraphs_after = []
+                        
+                        # 收集前面5个段落
+                        for j in range(max(0, i-5), i):
+                            context_paragraphs_before.append(paragraph_text_map.get(j, ""))
+                        
+                        # 收集后面5个段落
+                        for j in range(i+1, min(len(paragraphs), i+6)):
+                            context_paragraphs_after.append(paragraph_text_map.get(j, ""))
+                        
+                        img_contexts[target_ref] = {
+                            'paragraph_index': i,
+                            'context_paragraphs_before': context_paragraphs_before,
+                            'current_paragraph': para.text,
+                            'context_paragraphs_after': context_paragraphs_after,
+                            # 添加字符级上下文（截取图片附近的文本）
+                            'text_before_image': para.text[:para.text.find(run.text) + len(run.text)] if run.text in para.text else "",
+                            'text_after_image': para.text[para.text.find(run.text) + len(run.text):] if run.text in para.text else ""
+                        }
     
     return img_locations, img_contexts
 
+def load_docx(doc):
+    """
+    返回已解析的文档对象
+    
+    传入路径时解析一次；传入已解析的Document时直接复用，
+    这样图片提取、目录提取和正文格式化可以共享同一个文档对象（和同一次zip读取）
+    """
+    if isinstance(doc, _Document):
+        return doc
+    return docx.Document(doc)
+
 def extract_images_from_docx(doc_path, output_dir):
-    """从docx文件中提取图片并保存到指定目录，同时保留图片的上下文信息"""
-    doc = docx.Document(doc_path)
+    """
+    从docx文件中提取图片并保存到指定目录，同时保留图片的上下文信息
+    
+    Args:
+        doc_path: docx文件路径，或已解析的Document对象（避免重复解析）
+        output_dir (str): 图片保存目录
+    """
+    doc = load_docx(doc_path)
     image_paths = []
     
     # 获取图片位置及上下文
@@ -135,35 +157,103 @@ def extract_images_from_docx(doc_path, output_dir):
     
     return image_paths
 
+class ParagraphFeatures:
+    """
+    段落特征记录
+    
+    一次性读取段落的文本、样式名、run格式（粗体、斜体、字号）和缩进，
+    标题、列表和代码检测都基于同一份记录，检测结果也缓存在记录上，
+    避免对同一段落反复访问python-docx的属性（每次访问都要遍历XML）
+    """
+    
+    def __init__(self, para):
+        self.para = para
+        self.text = para.text
+        self.stripped_text = self.text.strip()
+        
+        style = para.style
+        self.has_style = bool(style) and hasattr(style, 'name')
+        self.style_name = (style.name or '') if self.has_style else ''
+        self.style_name_lower = self.style_name.lower()
+        
+        self.runs = para.runs
+        self.run_texts = [run.text for run in self.runs]
+        self.run_bold = [run.bold for run in self.runs]
+        self.run_italic = [run.italic for run in self.runs]
+        
+        paragraph_format = para.paragraph_format
+        self.left_indent = paragraph_format.left_indent
+        self.first_line_indent = paragraph_format.first_line_indent
+    
+    @cached_property
+    def all_bold(self):
+        """所有非空白run是否都是粗体"""
+        return all(bold for bold, text in zip(self.run_bold, self.run_texts) if text.strip())
+    
+    @cached_property
+    def has_bold(self):
+        return any(self.run_bold)
+    
+    @cached_property
+    def run_size_strs(self):
+        """每个run的字号字符串，未设置字号的run为None"""
+        return [str(run.font.size) if run.font.size else None for run in self.runs]
+    
+    @cached_property
+    def heading_level(self):
+        return _detect_heading_level(self)
+    
+    @cached_property
+    def is_list_item(self):
+        return _detect_list_item(self)
+    
+    @cached_property
+    def list_level(self):
+        return _detect_list_level(self)
+    
+    @cached_property
+    def is_code_block(self):
+        return _detect_code_block(self)
+
+def get_paragraph_features(para):
+    """返回段落的特征记录，已经是特征记录时直接返回"""
+    if isinstance(para, ParagraphFeatures):
+        return para
+    return ParagraphFeatures(para)
+
 def get_heading_level(para):
     """获取标题级别，如果不是标题则返回0"""
+    return get_paragraph_features(para).heading_level
+
+def _detect_heading_level(features):
+    """根据段落特征计算标题级别"""
+    text = features.stripped_text
+    
     # 如果段落没有样式，检查字体和格式特征
-    if not para.style or not hasattr(para.style, 'name'):
+    if not features.has_style:
         # 检查段落是否只包含粗体文本且较短（典型标题特征）
-        if para.text and len(para.text.strip()) < 100:  # 标题一般不会太长
-            is_all_bold = all(run.bold for run in para.runs if hasattr(run, 'bold') and run.text.strip())
+        if features.text and len(text) < 100:  # 标题一般不会太长
+            is_all_bold = features.all_bold
             
-            if is_all_bold and para.runs:
+            if is_all_bold and features.runs:
                 # 根据字体大小判断标题级别
-                first_run = para.runs[0]
-                if hasattr(first_run, 'font') and hasattr(first_run.font, 'size'):
-                    if first_run.font.size:
-                        try:
-                            # 尝试获取字体大小并转换为数值
-                            size_str = str(first_run.font.size)
-                            size = float(size_str.replace('pt', '').strip())
-                            
-                            if size >= 20: return 1
-                            elif size >= 18: return 2
-                            elif size >= 16: return 3
-                            elif size >= 14: return 4
-                            elif size >= 12 and is_all_bold: return 5
-                        except (ValueError, AttributeError):
-                            pass
+                size_str = features.run_size_strs[0]
+                if size_str:
+                    try:
+                        # 尝试获取字体大小并转换为数值
+                        size = float(size_str.replace('pt', '').strip())
+                        
+                        if size >= 20: return 1
+                        elif size >= 18: return 2
+                        elif size >= 16: return 3
+                        elif size >= 14: return 4
+                        elif size >= 12 and is_all_bold: return 5
+                    except (ValueError, AttributeError):
+                        pass
     
     # 1. 优先检查样式名称（最可靠的方法）
-    if para.style and hasattr(para.style, 'name'):
-        style_name = para.style.name.lower()
+    if features.has_style:
+        style_name = features.style_name_lower
         
         # 检查标准标题样式名称模式
         if 'heading' in style_name or '标题' in style_name or 'title' in style_name:
@@ -178,7 +268,6 @@ def get_heading_level(para):
                 return 1
     
     # 2. 检查段落文本特征
-    text = para.text.strip()
     if text:
         # Markdown风格标题检测
         if text.startswith('#'):
@@ -202,19 +291,14 @@ def get_heading_level(para):
         if is_likely_heading and len(text) < 100:
             # 检查字体样式判断级别
             has_large_font = False
-            has_bold = False
+            has_bold = features.has_bold
             
-            for run in para.runs:
-                if hasattr(run, 'bold') and run.bold:
-                    has_bold = True
-                
-                if hasattr(run, 'font') and hasattr(run.font, 'size') and run.font.size:
+            for size_str in features.run_size_strs:
+                if size_str and 'pt' in size_str:
                     try:
-                        size_str = str(run.font.size)
-                        if 'pt' in size_str:
-                            size = float(size_str.replace('pt', '').strip())
-                            if size > 14:
-                                has_large_font = True
+                        size = float(size_str.replace('pt', '').strip())
+                        if size > 14:
+                            has_large_font = True
                     except (ValueError, AttributeError):
                         pass
             
@@ -227,30 +311,35 @@ def get_heading_level(para):
     
     # 3. 文本缩进和格式检查
     para_indent = 0
-    if hasattr(para, 'paragraph_format') and hasattr(para.paragraph_format, 'left_indent'):
-        if para.paragraph_format.left_indent:
-            try:
-                indent_str = str(para.paragraph_format.left_indent)
-                para_indent = float(indent_str.replace('pt', '').strip())
-            except (ValueError, AttributeError):
-                pass
+    if features.left_indent:
+        try:
+            indent_str = str(features.left_indent)
+            para_indent = float(indent_str.replace('pt', '').strip())
+        except (ValueError, AttributeError):
+            pass
     
     # 没有缩进且文本较短的粗体段落更可能是标题
     if para_indent == 0 and len(text) < 100:
-        all_bold = all(hasattr(run, 'bold') and run.bold for run in para.runs if run.text.strip())
-        if all_bold and para.runs:
+        if features.all_bold and features.runs:
             return 4
     
     return 0
 
 def extract_toc(doc):
-    """提取文档的目录结构"""
+    """
+    提取文档的目录结构
+    
+    Args:
+        doc: Document对象，或段落（特征记录）列表
+    """
     toc = []
+    paragraphs = doc.paragraphs if isinstance(doc, _Document) else doc
     
-    for para in doc.paragraphs:
-        level = get_heading_level(para)
+    for para in paragraphs:
+        features = get_paragraph_features(para)
+        level = features.heading_level
         if level > 0:
-            toc.append((level, para.text))
+            toc.append((level, features.text))
     
     return toc
 
@@ -278,20 +367,23 @@ def generate_toc_md(toc):
 
 def is_list_item(para):
     """检查段落是否是列表项"""
+    return get_paragraph_features(para).is_list_item
+
+def _detect_list_item(features):
+    """根据段落特征判断是否是列表项"""
     # 检查段落是否有列表样式
-    if para.style and hasattr(para.style, 'name'):
-        style_name = para.style.name.lower()
+    if features.has_style:
+        style_name = features.style_name_lower
         if any(list_style in style_name for list_style in ['list', '列表', 'bullet', 'number', '编号']):
             return True
     
     # 检查段落格式是否有缩进（列表通常有缩进）
-    if hasattr(para, 'paragraph_format') and hasattr(para.paragraph_format, 'left_indent'):
-        if para.paragraph_format.left_indent and not para.paragraph_format.first_line_indent:
-            # 左缩进但没有首行缩进，典型的列表格式
-            return True
+    if features.left_indent and not features.first_line_indent:
+        # 左缩进但没有首行缩进，典型的列表格式
+        return True
     
     # 检查段落文本开头是否有列表标记
-    text = para.text.strip()
+    text = features.stripped_text
     
     # 如果文本为空，不是列表项
     if not text:
@@ -322,36 +414,39 @@ def is_list_item(para):
         return True
     
     # 寻找列表的视觉特征（如符号后跟空格和文本）
-    for run in para.runs:
-        if run.text.strip() and any(symbol in run.text[:2] for symbol in ['•', '○', '■', '◦']):
+    for run_text in features.run_texts:
+        if run_text.strip() and any(symbol in run_text[:2] for symbol in ['•', '○', '■', '◦']):
             return True
     
     return False
 
 def get_list_level(para):
     """获取列表的缩进级别"""
+    return get_paragraph_features(para).list_level
+
+def _detect_list_level(features):
+    """根据段落特征计算列表缩进级别"""
     level = 0
     
     # 从段落缩进值精确计算级别
-    if hasattr(para, 'paragraph_format') and hasattr(para.paragraph_format, 'left_indent'):
-        left_indent = para.paragraph_format.left_indent
-        if left_indent:
-            try:
-                # 转换缩进值为数字
-                indent_str = str(left_indent)
-                indent_value = float(indent_str.replace('pt', '').replace('cm', '').strip())
-                
-                # 根据缩进值确定级别（通常每级缩进约36pt或0.5-1cm）
-                if 'cm' in indent_str:
-                    level = max(level, int(indent_value / 0.7))  # 约0.7cm一级
-                else:
-                    level = max(level, int(indent_value / 36))  # 约36pt一级
-            except (ValueError, AttributeError):
-                pass
+    left_indent = features.left_indent
+    if left_indent:
+        try:
+            # 转换缩进值为数字
+            indent_str = str(left_indent)
+            indent_value = float(indent_str.replace('pt', '').replace('cm', '').strip())
+            
+            # 根据缩进值确定级别（通常每级缩进约36pt或0.5-1cm）
+            if 'cm' in indent_str:
+                level = max(level, int(indent_value / 0.7))  # 约0.7cm一级
+            else:
+                level = max(level, int(indent_value / 36))  # 约36pt一级
+        except (ValueError, AttributeError):
+            pass
     
     # 从样式名称推断级别
-    if para.style and hasattr(para.style, 'name'):
-        style_name = para.style.name.lower()
+    if features.has_style:
+        style_name = features.style_name_lower
         
         # 检查样式名称中是否包含级别信息
         for i in range(9, 0, -1):  # 检查9级到1级
@@ -360,7 +455,7 @@ def get_list_level(para):
                 break
     
     # 通过文本缩进和格式特征判断级别
-    text = para.text
+    text = features.text
     
     # 匹配不同类型的列表标记，并捕获前导空格
     prefix_match = re.match(r'^(\s*)([-–—•◦○※＊*+>·]|\d+[.、)]|\([a-zA-Z0-9]+\)|\[[xX\s]\])\s', text)
@@ -397,16 +492,22 @@ def get_list_level(para):
 
 def is_code_block(para):
     """检查段落是否是代码块"""
+    return get_paragraph_features(para).is_code_block
+
+def _detect_code_block(features):
+    """根据段落特征判断是否是代码块"""
+    para = features.para
+    
     # 1. 首先检查段落样式名称
-    if para.style and hasattr(para.style, 'name'):
-        style_name = para.style.name.lower()
+    if features.has_style:
+        style_name = features.style_name_lower
         if any(code_style in style_name for code_style in [
             'code', '代码', 'verbatim', 'preformatted', 'source', 'program', 'command', 'terminal'
         ]):
             return True
     
     # 获取段落文本
-    text = para.text.strip()
+    text = features.stripped_text
     if not text:  # 空文本不是代码块
         return False
     
@@ -414,7 +515,7 @@ def is_code_block(para):
     has_monospace_font = False
     monospace_fonts = ['courier', 'consolas', 'monaco', 'monospace', 'menlo', 'lucida console', 'dejavu sans mono', 'fixedsys']
     
-    for run in para.runs:
+    for run in features.runs:
         if hasattr(run, 'font') and hasattr(run.font, 'name'):
             if run.font.name and any(font in run.font.name.lower() for font in monospace_fonts):
                 has_monospace_font = True
@@ -433,8 +534,7 @@ def is_code_block(para):
     total_text_length = len(text)
     text_with_background = 0
     
-    for run in para.runs:
-        run_text = run.text
+    for run, run_text in zip(features.runs, features.run_texts):
         has_bg = False
         
         # 检查高亮色
@@ -473,51 +573,16 @@ def is_code_block(para):
     
     # 4. 检查缩进和格式特征
     has_code_indent = False
-    if hasattr(para, 'paragraph_format') and hasattr(para.paragraph_format, 'left_indent'):
-        if para.paragraph_format.left_indent:
-            try:
-                indent_value = float(str(para.paragraph_format.left_indent).replace('pt', '').replace('cm', '').strip())
-                if indent_value > 10:  # 通常代码块有较大缩进
-                    has_code_indent = True
-            except (ValueError, AttributeError):
-                pass
+    if features.left_indent:
+        try:
+            indent_value = float(str(features.left_indent).replace('pt', '').replace('cm', '').strip())
+            if indent_value > 10:  # 通常代码块有较大缩进
+                has_code_indent = True
+        except (ValueError, AttributeError):
+            pass
     
     # 5. 检查代码特征 - 语法特征
-    code_patterns = [
-        # 常见编程语句开头
-        r'^(function|def|class|import|from|var|let|const)\s+\w+',  # 函数、类、变量声明
-        r'^(public|private|protected)\s+\w+\s+\w+',  # 访问修饰符
-        r'^\s*(if|for|while|switch|try|catch)\s*\(',  # 控制结构
-        r'^\s*return\s+.+;?\s*$',  # return语句
-        r'^(SELECT|INSERT|UPDATE|DELETE|CREATE|ALTER)\s+',  # SQL
-        
-        # 标记和特殊语法
-        r'<\?php|\?>',  # PHP标记
-        r'^```\w*$',  # Markdown代码块标记
-        r'^#!\/bin\/(bash|sh|python|perl)',  # Shebang行
-        
-        # 特殊符号和结构
-        r'^\s*[{}]\s*$',  # 单独一行的花括号
-        r'^\s*[\[\]]\s*$',  # 单独一行的方括号
-        r'^(\s*)[\w\-]+:\s*\w+',  # YAML键值对
-        
-        # 命令行
-        r'^(\$|>)\s+[\w\-\.]+',  # 命令行提示符
-        r'\bgit\s+(commit|push|pull|clone|checkout|add)\b',  # Git命令
-        r'\bdocker\s+(run|build|exec|ps|images)\b',  # Docker命令
-        r'\bnpm\s+(install|run|build|start)\b',  # npm命令
-        
-        # 新增匹配模式
-        r'curl\s+https?:\/\/',  # curl命令
-        r'wget\s+https?:\/\/',  # wget命令
-        r'ssh\s+\w+@[\w\.]+',   # ssh命令
-        r'cd\s+[\w\/\-\.]+',    # cd命令
-        r'pip\s+install',       # pip命令 
-        r'apt\s+(install|update|upgrade)',  # apt命令
-        r'yum\s+(install|update)',  # yum命令
-    ]
-    
-    has_code_syntax = any(re.search(pattern, text) for pattern in code_patterns)
+    has_code_syntax = code_classifier.has_code_syntax(text)
     
     # 其他代码相关特征
     has_code_markers = (
@@ -528,31 +593,7 @@ def is_code_block(para):
     )
     
     # 6. 检查是否是bash命令行代码（经常有灰色背景）
-    is_bash_command = False
-    bash_patterns = [
-        r'^\s*cd\s+',
-        r'^\s*mkdir\s+',
-        r'^\s*ls\s+',
-        r'^\s*rm\s+',
-        r'^\s*sudo\s+',
-        r'^\s*apt\s+',
-        r'^\s*yum\s+',
-        r'^\s*docker\s+',
-        r'^\s*git\s+',
-        r'^\s*npm\s+',
-        r'^\s*python\s+',
-        r'^\s*pip\s+',
-        r'^\s*javac\s+',
-        r'^\s*mv\s+',
-        r'^\s*cp\s+',
-        r'^http',
-        r'^https',
-    ]
-    
-    for pattern in bash_patterns:
-        if re.search(pattern, text, re.IGNORECASE):
-            is_bash_command = True
-            break
+    is_bash_command = code_classifier.is_bash_command(text)
     
     # 7. 综合判断
     # 如果有明显等宽字体或代码背景，基本确定是代码
@@ -588,8 +629,9 @@ def is_code_block(para):
 
 def format_list_item(para):
     """将段落格式化为Markdown列表项"""
-    text = para.text.strip()
-    level = get_list_level(para)
+    features = get_paragraph_features(para)
+    text = features.stripped_text
+    level = features.list_level
     indent = '  ' * level
     
     # 处理有序列表 (数字格式)
@@ -656,8 +698,8 @@ def format_list_item(para):
         return f"{indent}- {list_text}"
     
     # 如果以上模式都不匹配但段落有列表样式，则作为无序列表处理
-    if para.style and hasattr(para.style, 'name'):
-        style_name = para.style.name.lower()
+    if features.has_style:
+        style_name = features.style_name_lower
         if any(list_style in style_name for list_style in ['list', '列表', 'bullet']):
             # 检查样式名来确定是有序还是无序列表
             if any(num_style in style_name for num_style in ['number', '编号', 'order']):
@@ -669,13 +711,20 @@ def format_list_item(para):
     return f"{indent}- {text}"
 
 def format_paragraph(para):
-    """格式化段落为Markdown"""
+    """
+    格式化段落为Markdown
+    
+    Args:
+        para: Paragraph对象，或预先构建的段落特征记录（ParagraphFeatures）
+    """
+    features = get_paragraph_features(para)
+    
     # 如果段落为空，返回空行
-    if not para.text.strip():
+    if not features.stripped_text:
         return ""
     
     # 将段落文本复制一份以便修改
-    text = para.text
+    text = features.text
     
     # 保留特殊符号 - 扩展列表
     special_symbols = [
@@ -719,7 +768,7 @@ def format_paragraph(para):
             text = text.replace(symbol, placeholder)
     
     # 处理标题
-    level = get_heading_level(para)
+    level = features.heading_level
     if level > 0:
         # 恢复特殊符号
         for symbol, placeholder in symbol_placeholders.items():
@@ -727,70 +776,32 @@ def format_paragraph(para):
         return f"{'#' * level} {text.strip()}"
     
     # 处理列表项
-    if is_list_item(para):
+    if features.is_list_item:
         # 恢复特殊符号
         for symbol, placeholder in symbol_placeholders.items():
             text = text.replace(placeholder, symbol)
-        return format_list_item(para)
+        return format_list_item(features)
     
     # 处理代码块
-    if is_code_block(para):
+    if features.is_code_block:
         # 代码块内不需要转义处理，直接恢复特殊符号
         for symbol, placeholder in symbol_placeholders.items():
             text = text.replace(placeholder, symbol)
         
-        # 尝试检测代码语言
-        code_language = ""
-        code_text = text.strip()
-        
         # 根据代码特征判断语言
-        if re.search(r'\b(def|class|import|from|print)\b', code_text):
-            code_language = "python"
-        elif re.search(r'\b(function|var|let|const|require|console\.log)\b', code_text):
-            code_language = "javascript"
-        elif re.search(r'\b(SELECT|INSERT|UPDATE|DELETE|CREATE|ALTER)\b', code_text, re.IGNORECASE):
-            code_language = "sql"
-        elif re.search(r'\b(docker|apt|yum|rpm|git|cd|mkdir|tar|curl)\b', code_text):
-            code_language = "bash"
-        elif re.search(r'<\w+>.*?</w+>|<\w+.*?/>', code_text):
-            code_language = "html"
-        elif re.search(r'^\s*#include|int\s+main\s*\(', code_text):
-            code_language = "cpp"
-        # 新增语言检测
-        elif re.search(r'\b(package|import java|public class|public static void main)\b', code_text):
-            code_language = "java"
-        elif re.search(r'\b(using System|namespace|public class|private void)\b', code_text):
-            code_language = "csharp"
-        elif re.search(r'\b(func|package main|import \(|fmt\.)\b', code_text):
-            code_language = "go"
-        elif re.search(r'\b(<?php|echo|namespace|use [\w\\]+;)\b', code_text):
-            code_language = "php"
-        elif re.search(r'\b(fn|let mut|impl|struct|enum|match)\b', code_text):
-            code_language = "rust"
-        elif re.search(r'\b(library|tidyverse|dplyr|ggplot2|data\.frame)\b', code_text):
-            code_language = "r"
-        elif re.search(r'(^|\n)[ \t]*(#|//|;)[ \t]*\[?[A-Za-z0-9-_]+\]?[ \t]*:', code_text):
-            code_language = "yaml"
-        elif re.search(r'\{\s*"[^"]+"\s*:\s*[^{}]+\}', code_text):
-            code_language = "json"
-        elif re.search(r'\b(module|export|component|ngOnInit|@Input|@Output)\b', code_text):
-            code_language = "typescript"
-        elif re.search(r'\$\(.*\)|\$\.\w+\(', code_text):
-            code_language = "jquery"
-        elif re.search(r'<template>|export default {|methods:|computed:', code_text):
-            code_language = "vue"
+        code_text = text.strip()
+        code_language = code_classifier.detect_code_language(code_text)
         
         return f"```{code_language}\n{code_text}\n```"
     
     # 处理文本格式（粗体、斜体、链接等）
     formatted_runs = []
     
-    for run in para.runs:
-        if not run.text:
+    for run, run_text, run_bold, run_italic in zip(features.runs, features.run_texts,
+                                                   features.run_bold, features.run_italic):
+        if not run_text:
             continue
         
-        run_text = run.text
-        
         # 恢复特殊符号
         for symbol, placeholder in symbol_placeholders.items():
             run_text = run_text.replace(placeholder, symbol)
@@ -802,8 +813,8 @@ def format_paragraph(para):
                 run_text = f"[{run_text}]({url})"
         
         # 处理格式（粗体、斜体）
-        is_bold = hasattr(run, 'bold') and run.bold
-        is_italic = hasattr(run, 'italic') and run.italic
+        is_bold = run_bold
+        is_italic = run_italic
         
         if is_bold and is_italic:
             run_text = f"***{run_text}***"
@@ -884,8 +895,194 @@ def normalize_heading_levels(md_blocks):
     
     return normalized_blocks
 
+# 图片放置相关的匹配参数
+ANCHOR_NGRAM = 10  # 与上下文匹配时要求的最短公共子串长度
+LCS_MAX_LENGTH = 200  # 最长公共子串只比较两段文本的前200个字符
+ANCHOR_HEAD_LENGTH = LCS_MAX_LENGTH
+
+FIGURE_NUMBER_PATTERN = re.compile(r'(图|figure|fig\.)\s*(\d+)')
+IMAGE_HINT_PATTERN = re.compile(r'(图|figure|image|如图|图片|见图|如下图|示意图|截图|图表|示例|下图|界面|流程图|架构图|结构图)')
+
+class BlockAnchorIndex:
+    """
+    Markdown块的锚点索引，用于快速找到与图片上下文文本匹配的块
+    
+    - 精确索引：去除首尾空白后的块文本 → 块下标
+    - n-gram索引：每个块前200个字符中的所有n-gram → 块下标，
+      两段文本的最长公共子串不少于n个字符，当且仅当它们至少共享一个n-gram
+    
+    匹配结果与逐块比较（相等 → 包含 → 最长公共子串）完全一致，但只需检查候选块
+    """
+    
+    def __init__(self, md_blocks, ngram=ANCHOR_NGRAM, head_length=ANCHOR_HEAD_LENGTH):
+        self.ngram = ngram
+        self.head_length = head_length
+        # 非字符串块和空块不参与匹配
+        self.blocks = [block if isinstance(block, str) else "" for block in md_blocks]
+        self.stripped = [block.strip() for block in self.blocks]
+        self.text_indices = [i for i, block in enumerate(self.blocks) if block]
+        # 超过截断长度的块，子串可能出现在n-gram索引覆盖范围之外
+        self.long_indices = [i for i in self.text_indices if len(self.blocks[i]) > head_length]
+        
+        self.exact = {}
+        self.head_grams = {}
+        for i in self.text_indices:
+            self.exact.setdefault(self.stripped[i], []).append(i)
+            head = self.blocks[i][:head_length]
+            for k in range(len(head) - ngram + 1):
+                self.head_grams.setdefault(head[k:k + ngram], set()).add(i)
+        
+        self._containing_cache = {}
+        self._match_cache = {}
+    
+    def containing(self, needle):
+        """返回包含needle的块下标（升序）"""
+        cached = self._containing_cache.get(needle)
+        if cached is not None:
+            return cached
+        
+        if len(needle) >= self.ngram:
+            # 子串出现在块的前200个字符内时，其首个n-gram必然在索引中；否则块一定是长块
+            candidates = set(self.head_grams.get(needle[:self.ngram], ()))
+            candidates.update(self.long_indices)
+        else:
+            # 短文本没有可用的n-gram，退回线性扫描（结果会被缓存）
+            candidates = self.text_indices
+        
+        result = sorted(i for i in candidates if needle in self.blocks[i])
+        self._containing_cache[needle] = result
+        return result
+    
+    def matches(self, text):
+        """
+        返回与text匹配的块：{块下标: (匹配类型, 匹配比例)}
+        
+        匹配类型依次为 'equal'（去空白后相等）、'contains'（块包含该文本）、
+        'common'（最长公共子串不少于n个字符，比例为公共子串长度/文本长度）
+        """
+        cached = self._match_cache.get(text)
+        if cached is not None:
+            return cached
+        
+        stripped = text.strip()
+        result = {}
+        for i in self.exact.get(stripped, ()):
+            result[i] = ('equal', 1.0)
+        for i in self.containing(stripped):
+            if i not in result:
+                result[i] = ('contains', 1.0)
+        
+        if len(text) >= self.ngram:
+            head = text[:self.head_length]
+            candidates = set()
+            for k in range(len(head) - self.ngram + 1):
+                candidates.update(self.head_grams.get(head[k:k + self.ngram], ()))
+            for i in candidates:
+                if i in result:
+                    continue
+                common_text = longest_common_substring(text, self.blocks[i])
+                if len(common_text) >= self.ngram:
+                    result[i] = ('common', len(common_text) / len(text))
+        
+        self._match_cache[text] = result
+        return result
+
+def _score_image_context(index, context_info):
+    """
+    计算图片上下文与各块的匹配分数（不含与图片无关的块自身特征分）
+    
+    Returns:
+        dict: {块下标: 分数}，只包含有匹配的块
+    """
+    scores = {}
+    block_count = len(index.blocks)
+    
+    # 检查当前段落文本和图片所在段落的匹配度
+    current_para = context_info.get('current_paragraph', '')
+    if current_para:
+        for i, (kind, ratio) in index.matches(current_para).items():
+            if kind == 'equal':
+                score = 100  # 块与图片所在段落完全相同
+            elif kind == 'contains':
+                score = 80  # 块包含图片所在段落的文本
+            else:
+                score = int(60 * ratio)  # 部分文本匹配
+            scores[i] = scores.get(i, 0) + score
+    
+    # 字符级匹配 - 如果块包含了图片前的文本，这是一个很好的插入位置
+    text_before_image = context_info.get('text_before_image', '')
+    if text_before_image and text_before_image.strip():
+        before_text = text_before_image.strip()
+        for i in index.containing(before_text):
+            score = 40
+            # 如果图片前的文本在块的末尾，这是一个完美的插入位置
+            if index.stripped[i].endswith(before_text):
+                score += 30
+            scores[i] = scores.get(i, 0) + score
+    
+    # 检查上下文段落：第j个上下文段落与离当前块最近的匹配块计分，离当前段落越近分数越高
+    def context_points(j, kind, ratio):
+        if kind == 'equal':
+            return 25 - j*5
+        elif kind == 'contains':
+            return 15 - j*3
+        return int((10 - j*2) * ratio)
+    
+    # 前文段落匹配当前块之前1-5个块
+    for j, prev_context in enumerate(reversed(context_info.get('context_paragraphs_before', []))):
+        if not prev_context.strip():
+            continue
+        matched = index.matches(prev_context)
+        points = {}
+        # 按块下标升序覆盖，最终保留离当前块最近的匹配
+        for b in sorted(matched):
+            value = context_points(j, *matched[b])
+            for i in range(b + 1, min(b + 6, block_count)):
+                points[i] = value
+        for i, value in points.items():
+            scores[i] = scores.get(i, 0) + value
+    
+    # 后文段落匹配当前块之后1-5个块
+    for j, next_context in enumerate(context_info.get('context_paragraphs_after', [])):
+        if not next_context.strip():
+            continue
+        matched = index.matches(next_context)
+        points = {}
+        for b in sorted(matched, reverse=True):
+            value = context_points(j, *matched[b])
+            for i in range(max(b - 5, 0), b):
+                points[i] = value
+        for i, value in points.items():
+            scores[i] = scores.get(i, 0) + value
+    
+    return scores
+
+def _block_hint_score(block):
+    """与具体图片无关的块特征分：图片指示词、结尾标点"""
+    score = 0
+    
+    # 检查块中是否包含图片指示词
+    if IMAGE_HINT_PATTERN.search(block.lower()):
+        score += 20
+    
+    # 如果段落以冒号结尾，可能后面跟着图片
+    if block.strip().endswith((':', '：')):
+        score += 15
+    
+    # 段落结尾是句号但没有结束词，可能跟着图片
+    if block.strip().endswith(('.', '。', '!', '！', '?', '？')):
+        score += 5
+    
+    return score
+
 def insert_images_inline(md_blocks, image_paths, image_dir):
-    """根据图片在原文档中的上下文位置精确插入图片引用"""
+    """
+    根据图片在原文档中的上下文位置精确插入图片引用
+    
+    先为Markdown块建立锚点索引（精确文本 + n-gram），每张图片只与索引命中的候选块计分，
+    时间复杂度与块数和图片数近似线性。每个位置保留分数最高的图片（同分时按
+    明确编号 → 上下文匹配 → 兜底位置、再按图片顺序取先者）
+    """
     # 如果没有图片，直接返回原内容
     if not image_paths:
         return md_blocks
@@ -896,190 +1093,83 @@ def insert_images_inline(md_blocks, image_paths, image_dir):
         filename = os.path.basename(path)
         image_refs.append((ref, filename, img_num, context_info))
     
-    # 结果列表
-    md_with_images = []
-    used_images = set()  # 跟踪已插入的图片
+    # 每个位置的最佳候选: {位置: ((-分数, 阶段, 图片序号), ref)}
+    best_matches = {}
+    found_refs = set()
     
-    # 创建上下文匹配映射
-    # 为每个图片计算与每个Markdown块的匹配分数
-    matches = []
+    def add_match(pos, ref, score, stage, order):
+        key = (-score, stage, order)
+        current = best_matches.get(pos)
+        if current is None or key < current[0]:
+            best_matches[pos] = (key, ref)
     
     # 第一步：识别明确的图片引用
     # 查找段落中有明确图片编号的情况，如"图1"、"Figure 2"等
+    refs_by_number = {}
+    for order, (ref, filename, img_num, _) in enumerate(image_refs):
+        refs_by_number.setdefault(img_num, []).append((order, ref))
+    
     for i, block in enumerate(md_blocks):
         if not isinstance(block, str):
             continue
-            
-        # 检查是否有明确的图片编号引用
-        fig_match = re.search(r'(图|figure|fig\.)\s*(\d+)', block.lower())
+        
+        fig_match = FIGURE_NUMBER_PATTERN.search(block.lower())
         if fig_match:
-            fig_num = int(fig_match.group(2))
-            # 找对应编号的图片
-            for ref, filename, img_num, _ in image_refs:
-                if img_num == fig_num and ref not in used_images:
-                    matches.append((i, ref, 150))  # 最高优先级
+            for order, ref in refs_by_number.get(int(fig_match.group(2)), ()):
+                add_match(i, ref, 150, 0, order)  # 最高优先级
+                found_refs.add(ref)
     
     # 第二步：使用扩展的上下文信息匹配
-    for i, block in enumerate(md_blocks):
-        if not isinstance(block, str):
-            continue
-            
-        # 对每个图片计算与当前块的匹配分数
-        for ref, filename, img_num, context_info in image_refs:
-            if not context_info:  # 没有上下文信息则跳过
+    hint_scores = [_block_hint_score(block) if isinstance(block, str) else None for block in md_blocks]
+    index = BlockAnchorIndex(md_blocks)
+    context_images = [(order, ref, context_info)
+                      for order, (ref, _, _, context_info) in enumerate(image_refs) if context_info]
+    
+    for order, ref, context_info in context_images:
+        for i, score in _score_image_context(index, context_info).items():
+            if hint_scores[i] is None:
                 continue
-                
-            # 计算匹配分数
-            score = 0
-            
-            # 检查当前段落文本和图片所在段落的匹配度
-            current_para = context_info.get('current_paragraph', '')
-            
-            if current_para and block:
-                # 如果当前块包含图片所在段落的完整文本，给最高分
-                if current_para.strip() == block.strip():
-                    score += 100
-                # 如果当前块包含图片所在段落的文本，给高分
-                elif current_para.strip() in block:
-                    score += 80
-                # 如果有部分文本匹配，根据匹配程度给分
-                elif len(current_para) >= 10:
-                    # 计算最长公共子串
-                    common_text = longest_common_substring(current_para, block)
-                    if len(common_text) >= 10:
-                        match_ratio = len(common_text) / len(current_para)
-                        score += int(60 * match_ratio)
-            
-            # 字符级匹配 - 检查图片前后的文本
-            text_before_image = context_info.get('text_before_image', '')
-            text_after_image = context_info.get('text_after_image', '')
-            
-            # 如果当前块包含了图片前的文本，这是一个很好的插入位置
-            if text_before_image and text_before_image.strip() and text_before_image.strip() in block:
-                score += 40
-                
-                # 如果图片前的文本在块的末尾，这是一个完美的插入位置
-                if block.strip().endswith(text_before_image.strip()):
-                    score += 30
-            
-            # 检查上下文段落
-            context_before = context_info.get('context_paragraphs_before', [])
-            context_after = context_info.get('context_paragraphs_after', [])
-            
-            # 向前查找匹配的上下文段落
-            for j, prev_context in enumerate(reversed(context_before)):
-                if not prev_context.strip():
-                    continue
-                    
-                # 查找前面的段落是否与当前位置前的块匹配
-                for k in range(1, min(6, i+1)):
-                    prev_block_index = i - k
-                    if prev_block_index < 0:
-                        break
-                        
-                    prev_block = md_blocks[prev_block_index] if isinstance(md_blocks[prev_block_index], str) else ""
-                    
-                    if prev_context.strip() == prev_block.strip():
-                        score += 25 - j*5  # 离当前段落越近，分数越高
-                        break
-                    elif prev_context.strip() in prev_block:
-                        score += 15 - j*3
-                        break
-                    elif len(prev_context) >= 10:
-                        common_text = longest_common_substring(prev_context, prev_block)
-                        if len(common_text) >= 10:
-                            match_ratio = len(common_text) / len(prev_context)
-                            score += int((10 - j*2) * match_ratio)
-                            break
-            
-            # 向后查找匹配的上下文段落
-            for j, next_context in enumerate(context_after):
-                if not next_context.strip():
-                    continue
-                    
-                # 查找后面的段落是否与当前位置后的块匹配
-                for k in range(1, min(6, len(md_blocks)-i)):
-                    next_block_index = i + k
-                    if next_block_index >= len(md_blocks):
-                        break
-                        
-                    next_block = md_blocks[next_block_index] if isinstance(md_blocks[next_block_index], str) else ""
-                    
-                    if next_context.strip() == next_block.strip():
-                        score += 25 - j*5  # 离当前段落越近，分数越高
-                        break
-                    elif next_context.strip() in next_block:
-                        score += 15 - j*3
-                        break
-                    elif len(next_context) >= 10:
-                        common_text = longest_common_substring(next_context, next_block)
-                        if len(common_text) >= 10:
-                            match_ratio = len(common_text) / len(next_context)
-                            score += int((10 - j*2) * match_ratio)
-                            break
-            
-            # 检查块中是否包含图片指示词
-            if re.search(r'(图|figure|image|如图|图片|见图|如下图|示意图|截图|图表|示例|下图|界面|流程图|架构图|结构图)', block.lower()):
-                score += 20
-            
-            # 如果段落以冒号结尾，可能后面跟着图片
-            if block.strip().endswith((':', '：')):
-                score += 15
-            
-            # 段落结尾是句号但没有结束词，可能跟着图片
-            if block.strip().endswith(('.', '。', '!', '！', '?', '？')):
-                score += 5
-            
-            # 添加到匹配列表，如果分数足够高
+            score += hint_scores[i]
             if score >= 20:  # 只保留高于一定分数的匹配
-                matches.append((i, ref, score))
-    
-    # 对匹配按位置和分数排序
-    matches.sort(key=lambda x: (x[0], -x[2]))  # 按段落索引升序，分数降序
+                add_match(i, ref, score, 1, order)
+                found_refs.add(ref)
+    
+    # 块自身特征分已达阈值时，所有带上下文的图片都会匹配该块；
+    # 没有上下文得分的图片同分，按图片顺序第一张图片优先
+    if context_images:
+        first_order, first_ref, _ = context_images[0]
+        for i, hint_score in enumerate(hint_scores):
+            if hint_score is not None and hint_score >= 20:
+                add_match(i, first_ref, hint_score, 1, first_order)
+                found_refs.update(ref for _, ref, _ in context_images)
     
     # 第三步：确保所有图片都有位置
-    # 如果有图片没有找到合适的位置，添加合理的位置
-    found_refs = set(match[1] for match in matches)
-    for ref, filename, img_num, context_info in image_refs:
+    # 如果有图片没有找到合适的位置，使用启发式方法找个合适位置
+    for order, (ref, filename, img_num, context_info) in enumerate(image_refs):
         if ref not in found_refs:
-            # 对于没有找到位置的图片，使用启发式方法找个合适位置
             best_pos = find_best_position_for_image(ref, img_num, md_blocks, image_refs)
             if best_pos is not None:
-                matches.append((best_pos, ref, 10))  # 使用较低的分数
-    
-    # 重新排序匹配
-    matches.sort(key=lambda x: (x[0], -x[2]))
-    
-    # 处理可能的重复：同一位置只保留分数最高的图片
-    filtered_matches = []
-    pos_map = {}
-    
-    for pos, ref, score in matches:
-        if pos not in pos_map or score > pos_map[pos][1]:
-            pos_map[pos] = (ref, score)
-    
-    for pos, (ref, score) in sorted(pos_map.items()):
-        filtered_matches.append((pos, ref, score))
+                add_match(best_pos, ref, 10, 2, order)  # 使用较低的分数
     
     # 合并图片和内容块
-    current_match_index = 0
+    md_with_images = []
+    used_images = set()  # 跟踪已插入的图片
     
-    # 处理每个内容块
     for i, block in enumerate(md_blocks):
         md_with_images.append(block)
         
         # 检查当前位置是否需要插入图片
-        while current_match_index < len(filtered_matches) and filtered_matches[current_match_index][0] == i:
-            pos, ref, score = filtered_matches[current_match_index]
-            
-            # 获取图片信息
-            for r, filename, img_num, _ in image_refs:
-                if r == ref and ref not in used_images:
-                    md_with_images.append(f"\n![图片{img_num}]({filename})\n")
-                    used_images.add(ref)
-                    break
-                    
-            current_match_index += 1
+        match = best_matches.get(i)
+        if match is None:
+            continue
+        ref = match[1]
+        
+        # 获取图片信息
+        for r, filename, img_num, _ in image_refs:
+            if r == ref and ref not in used_images:
+                md_with_images.append(f"\n![图片{img_num}]({filename})\n")
+                used_images.add(ref)
+                break
     
     # 确保所有图片都被插入
     # 检查是否有未插入的图片，将它们添加到文档末尾
@@ -1129,37 +1219,111 @@ def find_best_position_for_image(ref, img_num, md_blocks, image_refs):
     # 找不到合适位置，返回文档靠前的位置（不放在最后，避免所有图片都堆积到附录）
     return min(5, len(md_blocks) - 1) if len(md_blocks) > 5 else 0
 
-def longest_common_substring(s1, s2):
-    """查找两个字符串的最长公共子串"""
-    # 简化版本，优化性能
-    if not s1 or not s2:
-        return ""
+@lru_cache(maxsize=512)
+def _build_suffix_automaton(text):
+    """
+    构建text的后缀自动机
     
-    # 对于长字符串，只检查前200个字符
-    s1 = s1[:200] if len(s1) > 200 else s1
-    s2 = s2[:200] if len(s2) > 200 else s2
+    Returns:
+        tuple: (转移表列表, 后缀链接列表, 状态最长长度列表)
+    """
+    transitions = [{}]
+    link = [-1]
+    length = [0]
+    last = 0
+    
+    for ch in text:
+        cur = len(transitions)
+        transitions.append({})
+        length.append(length[last] + 1)
+        link.append(0)
+        
+        p = last
+        while p != -1 and ch not in transitions[p]:
+            transitions[p][ch] = cur
+            p = link[p]
+        
+        if p != -1:
+            q = transitions[p][ch]
+            if length[p] + 1 == length[q]:
+                link[cur] = q
+            else:
+                # 拆分状态q
+                clone = len(transitions)
+                transitions.append(dict(transitions[q]))
+                length.append(length[p] + 1)
+                link.append(link[q])
+                while p != -1 and transitions[p].get(ch) == q:
+                    transitions[p][ch] = clone
+                    p = link[p]
+                link[q] = clone
+                link[cur] = clone
+        
+        last = cur
     
-    # 初始化DP表
-    m, n = len(s1), len(s2)
-    dp = [[0] * (n + 1) for _ in range(m + 1)]
+    return transitions, link, length
+
+def _lcs_suffix_automaton(s1, s2):
+    """用s2的后缀自动机扫描s1，返回s1中最早出现的最长公共子串"""
+    transitions, link, length = _build_suffix_automaton(s2)
     
-    # 填充DP表
+    state = 0
+    cur_length = 0
     max_length = 0
     end_pos = 0
     
-    for i in range(1, m + 1):
-        for j in range(1, n + 1):
-            if s1[i-1] == s2[j-1]:
-                dp[i][j] = dp[i-1][j-1] + 1
-                if dp[i][j] > max_length:
-                    max_length = dp[i][j]
-                    end_pos = i
+    for i, ch in enumerate(s1):
+        # 沿后缀链接回退，直到可以接上当前字符
+        while state and ch not in transitions[state]:
+            state = link[state]
+            cur_length = length[state]
+        
+        if ch in transitions[state]:
+            state = transitions[state][ch]
+            cur_length += 1
+            if cur_length > max_length:
+                max_length = cur_length
+                end_pos = i + 1
     
-    # 提取最长公共子串
-    if max_length == 0:
-        return ""
     return s1[end_pos - max_length:end_pos]
 
+def _lcs_difflib(s1, s2):
+    """使用difflib查找最长公共子串（备用实现）"""
+    # 关闭autojunk，否则长度不少于200的文本中的高频字符会被忽略
+    matcher = SequenceMatcher(None, s1, s2, autojunk=False)
+    match = matcher.find_longest_match(0, len(s1), 0, len(s2))
+    return s1[match.a:match.a + match.size]
+
+# 可用的最长公共子串实现，结果完全一致
+LCS_BACKENDS = {
+    'automaton': _lcs_suffix_automaton,
+    'difflib': _lcs_difflib,
+}
+
+def longest_common_substring(s1, s2, backend='automaton'):
+    """
+    查找两个字符串的最长公共子串
+    
+    对于长字符串只比较前200个字符。有多个等长的公共子串时返回在s1中最早出现的一个
+    
+    Args:
+        s1: 第一个字符串
+        s2: 第二个字符串
+        backend: 使用的实现，'automaton'（后缀自动机，默认）或 'difflib'
+    """
+    if not s1 or not s2:
+        return ""
+    
+    # 对于长字符串，只检查前200个字符
+    s1 = s1[:LCS_MAX_LENGTH]
+    s2 = s2[:LCS_MAX_LENGTH]
+    
+    try:
+        return LCS_BACKENDS[backend](s1, s2)
+    except (KeyError, RecursionError, MemoryError) as e:
+        logger.warning(f"最长公共子串实现 {backend} 不可用，改用difflib: {e}")
+        return _lcs_difflib(s1, s2)
+
 def convert_docx_to_md(docx_path, output_path, image_dir=None):
     """将docx文件转换为markdown格式"""
     try:
@@ -1177,33 +1341,39 @@ def convert_docx_to_md(docx_path, output_path, image_dir=None):
         # 确保图片目录存在
         os.makedirs(image_dir, exist_ok=True)
         
-        # 加载文档
-        doc = docx.Document(docx_path)
+        # 加载文档（只解析一次，后续各步骤共享）
+        doc = load_docx(docx_path)
         md_blocks = []
         
         # 提取图片
         logger.info("提取文档中的图片和位置信息")
-        image_paths = extract_images_from_docx(docx_path, image_dir)
+        image_paths = extract_images_from_docx(doc, image_dir)
         logger.info(f"共提取了 {len(image_paths)} 张图片")
         
+        # 一次遍历文档块，为每个段落构建特征记录，
+        # 标题提取、目录提取和正文格式化都复用这些记录
+        blocks = [ParagraphFeatures(item) if isinstance(item, Paragraph) else item
+                  for item in iter_block_items(doc)]
+        paragraph_features = [block for block in blocks if isinstance(block, ParagraphFeatures)]
+        
         # 提取文档标题，优先使用Title样式
         title = None
-        for para in doc.paragraphs:
-            if para.style and hasattr(para.style, 'name'):
-                style_name = para.style.name
+        for features in paragraph_features:
+            if features.has_style:
+                style_name = features.style_name
                 if 'Title' in style_name or '标题' in style_name or style_name == 'Title':
-                    title = para.text.strip()
+                    title = features.stripped_text
                     break
         
         # 如果没有找到标题样式，尝试查找文档第一个段落是否是标题
-        if not title and doc.paragraphs:
-            first_para = doc.paragraphs[0]
-            if get_heading_level(first_para) == 1:
-                title = first_para.text.strip()
+        if not title and paragraph_features:
+            first_para = paragraph_features[0]
+            if first_para.heading_level == 1:
+                title = first_para.stripped_text
         
         # 提取目录结构
         logger.info("提取文档结构")
-        toc = extract_toc(doc)
+        toc = extract_toc(paragraph_features)
         
         # 如果有标题，添加到开始
         if title:
@@ -1215,8 +1385,8 @@ def convert_docx_to_md(docx_path, output_path, image_dir=None):
         
         # 使用迭代器处理文档的所有块（段落和表格），保持顺序
         logger.info("处理文档内容")
-        for item in iter_block_items(doc):
-            if isinstance(item, Paragraph):
+        for item in blocks:
+            if isinstance(item, ParagraphFeatures):
                 # 处理段落
                 md_text = format_paragraph(item)
                 if md_text:
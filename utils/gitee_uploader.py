@@ -1,12 +1,24 @@
 import os
-import re
 import base64
 import requests
-import json
 import time
+import random
 import logging
-from git import Repo
+import shutil
+import threading
+from requests.adapters import HTTPAdapter
+from git import Repo, Actor
+from git.exc import GitCommandError
+from email.utils import parsedate_to_datetime
 from dotenv import load_dotenv
+from utils.image_manifest import ImageManifest, file_sha256
+from utils.image_storage import (
+    GiteeImageStorage,
+    content_key,
+    publish_markdown_images,
+    rewrite_image_links,
+    update_image_links_in_md,
+)
 
 # 加载环境变量
 load_dotenv()
@@ -21,6 +33,184 @@ GITEE_REPO_NAME = os.getenv("GITEE_REPO_NAME", "image-projects")
 GITEE_ACCESS_TOKEN = os.getenv("GITEE_ACCESS_TOKEN", "")
 GITEE_BRANCH = "master"
 
+# 上传并发与连接池配置
+GITEE_UPLOAD_CONCURRENCY = int(os.getenv("GITEE_UPLOAD_CONCURRENCY", "4"))  # 同时上传的图片数
+GITEE_REPO_CHECK_TTL = int(os.getenv("GITEE_REPO_CHECK_TTL", "3600"))  # 仓库检查结果的缓存时间（秒）
+
+# 内部数据目录：清单和本地克隆含有令牌相关的配置，不能放在可通过/download/下载的outputs目录中
+GITEE_DATA_DIR = os.getenv("GITEE_DATA_DIR", "data")
+
+# 已上传图片清单（内容哈希 -> 远程URL），相同内容的图片只上传一次
+GITEE_MANIFEST_PATH = os.getenv("GITEE_MANIFEST_PATH", os.path.join(GITEE_DATA_DIR, "image_manifest.sqlite3"))
+
+# 上传方式：api 逐张调用contents接口；git 在本地克隆中暂存全部图片，一次提交并推送
+GITEE_UPLOAD_BACKEND = os.getenv("GITEE_UPLOAD_BACKEND", "api")
+GITEE_GIT_REMOTE = os.getenv("GITEE_GIT_REMOTE", "")  # 为空时根据仓库生成HTTPS地址
+GITEE_CLONE_DIR = os.getenv("GITEE_CLONE_DIR", os.path.join(GITEE_DATA_DIR, "image_repo"))
+GITEE_RAW_URL_TEMPLATE = os.getenv("GITEE_RAW_URL_TEMPLATE", "https://gitee.com/{owner}/{repo}/raw/{branch}/{path}")
+GITEE_COMMIT_AUTHOR = Actor("md-converter", "md-converter@users.noreply.gitee.com")
+
+# 失败重试与限流：429/5xx和网络错误按带抖动的指数退避重试，服务器给出Retry-After时按其等待
+GITEE_MAX_RETRIES = int(os.getenv("GITEE_MAX_RETRIES", "4"))  # 首次请求之外的最多重试次数
+GITEE_RETRY_BASE_DELAY = float(os.getenv("GITEE_RETRY_BASE_DELAY", "0.5"))  # 第一次重试的退避上限（秒）
+GITEE_RETRY_MAX_DELAY = float(os.getenv("GITEE_RETRY_MAX_DELAY", "30"))  # 单次等待的上限（秒）
+GITEE_RATE_LIMIT = float(os.getenv("GITEE_RATE_LIMIT", "5"))  # 进程内所有请求共享的平均速率（次/秒），0表示不限流
+GITEE_RATE_BURST = int(os.getenv("GITEE_RATE_BURST", "10"))  # 允许的突发请求数
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+_repo_checked_at = None  # 上次确认仓库存在的时间
+_repo_check_lock = threading.Lock()
+_manifest = None
+_manifest_lock = threading.Lock()
+_clone_lock = threading.Lock()  # 本地克隆同一时间只允许一个转换任务提交
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限流器
+
+    令牌以rate个/秒的速度补充，最多积累capacity个；每次请求消耗一个令牌，没有令牌时等待
+    """
+    
+    def __init__(self, rate, capacity):
+        if rate <= 0:
+            raise ValueError(f"令牌桶的速率必须大于0: {rate}")
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """取得一个令牌，返回等待的秒数"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+def get_session():
+    """返回进程内共享的requests.Session，复用keep-alive连接"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(GITEE_UPLOAD_CONCURRENCY, 1))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+def get_rate_limiter():
+    """返回进程内共享的令牌桶，同一令牌下的并发转换共用请求额度；GITEE_RATE_LIMIT不大于0时不限流，返回None"""
+    global _rate_limiter
+    if GITEE_RATE_LIMIT <= 0:
+        return None
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = TokenBucket(GITEE_RATE_LIMIT, GITEE_RATE_BURST)
+        return _rate_limiter
+
+def _retry_after_seconds(response):
+    """解析Retry-After响应头（秒数或HTTP日期），没有或无法解析时返回None"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _backoff_delay(attempt, response=None):
+    """第attempt次重试前的等待时间：优先Retry-After，否则为带完全抖动的指数退避"""
+    if response is not None:
+        retry_after = _retry_after_seconds(response)
+        if retry_after is not None:
+            return min(retry_after, GITEE_RETRY_MAX_DELAY)
+    return random.uniform(0, min(GITEE_RETRY_MAX_DELAY, GITEE_RETRY_BASE_DELAY * (2 ** attempt)))
+
+def gitee_request(method, url, **kwargs):
+    """
+    发送Gitee API请求：经过令牌桶限流，429/5xx和连接错误按退避策略重试
+
+    重试用尽后返回最后一次响应；最后一次仍是连接错误时抛出异常
+    """
+    session = get_session()
+    limiter = get_rate_limiter()
+    for attempt in range(GITEE_MAX_RETRIES + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= GITEE_MAX_RETRIES:
+                raise
+            delay = _backoff_delay(attempt)
+            logger.warning(f"请求Gitee失败({e.__class__.__name__})，{delay:.2f}秒后重试: {method} {url}")
+            time.sleep(delay)
+            continue
+        
+        if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= GITEE_MAX_RETRIES:
+            return response
+        delay = _backoff_delay(attempt, response)
+        logger.warning(f"Gitee返回{response.status_code}，{delay:.2f}秒后重试: {method} {url}")
+        response.close()
+        time.sleep(delay)
+
+def get_manifest():
+    """返回已上传图片清单，第一次使用时打开GITEE_MANIFEST_PATH"""
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = ImageManifest(GITEE_MANIFEST_PATH)
+        return _manifest
+
+def reset_gitee_client():
+    """关闭共享连接、上传清单并清除仓库检查缓存和限流状态（配置变化或测试时使用）"""
+    global _session, _repo_checked_at, _manifest, _rate_limiter
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+    with _repo_check_lock:
+        _repo_checked_at = None
+    with _manifest_lock:
+        if _manifest is not None:
+            _manifest.close()
+            _manifest = None
+    with _rate_limiter_lock:
+        _rate_limiter = None
+
+def ensure_gitee_repo():
+    """
+    确认图片仓库存在，结果在GITEE_REPO_CHECK_TTL秒内缓存
+
+    并发上传时只有一个线程会真正发起检查
+    """
+    global _repo_checked_at
+    with _repo_check_lock:
+        now = time.monotonic()
+        if _repo_checked_at is not None and now - _repo_checked_at < GITEE_REPO_CHECK_TTL:
+            return True
+        if not create_gitee_repo_if_not_exists():
+            return False
+        _repo_checked_at = now
+        return True
+
 def create_gitee_repo_if_not_exists():
     """如果仓库不存在，则创建仓库"""
     check_url = f"{GITEE_API_URL}/repos/{GITEE_REPO_OWNER}/{GITEE_REPO_NAME}"
@@ -28,7 +218,7 @@ def create_gitee_repo_if_not_exists():
     
     if GITEE_ACCESS_TOKEN:
         params = {"access_token": GITEE_ACCESS_TOKEN}
-        response = requests.get(check_url, params=params, headers=headers)
+        response = gitee_request("GET", check_url, params=params, headers=headers)
         
         if response.status_code == 404:
             # 仓库不存在，创建仓库
@@ -41,7 +231,7 @@ def create_gitee_repo_if_not_exists():
                 "has_issues": False,
                 "has_wiki": False
             }
-            create_response = requests.post(create_url, json=data, headers=headers)
+            create_response = gitee_request("POST", create_url, json=data, headers=headers)
             if create_response.status_code == 201:
                 print(f"成功创建仓库 {GITEE_REPO_NAME}")
             else:
@@ -50,13 +240,42 @@ def create_gitee_repo_if_not_exists():
     
     return True
 
+def get_image_repo_path(image_path, sha256):
+    """根据内容哈希生成图片在仓库中的路径，相同内容总是对应同一路径"""
+    return content_key(image_path, sha256)
+
+def _find_uploaded_image(file_path):
+    """查询仓库中是否已有该路径的文件，返回其下载URL"""
+    url = f"{GITEE_API_URL}/repos/{GITEE_REPO_OWNER}/{GITEE_REPO_NAME}/contents/{file_path}"
+    params = {"access_token": GITEE_ACCESS_TOKEN, "ref": GITEE_BRANCH}
+    response = gitee_request("GET", url, params=params)
+    if response.status_code != 200:
+        return None
+    result = response.json()
+    # 路径不存在时Gitee返回空列表
+    if isinstance(result, dict):
+        return result.get("download_url")
+    return None
+
 def upload_image_to_gitee(image_path):
-    """将图片上传到Gitee仓库并返回图片URL"""
+    """
+    将图片上传到Gitee仓库并返回图片URL
+
+    图片按内容哈希存放，并记录在上传清单中：清单里已有的图片直接返回URL，不再上传
+    """
     if not GITEE_ACCESS_TOKEN:
         raise ValueError("请设置Gitee访问令牌")
     
-    # 确保仓库存在
-    if not create_gitee_repo_if_not_exists():
+    # 相同内容的图片已经上传过
+    sha256 = file_sha256(image_path)
+    manifest = get_manifest()
+    cached_url = manifest.get(sha256)
+    if cached_url:
+        logger.info(f"图片已上传过，复用链接: {os.path.basename(image_path)} -> {cached_url}")
+        return cached_url
+    
+    # 确保仓库存在（检查结果会被缓存，不必每张图片都请求一次）
+    if not ensure_gitee_repo():
         raise ValueError("无法访问或创建Gitee仓库")
     
     # 准备图片数据
@@ -68,8 +287,7 @@ def upload_image_to_gitee(image_path):
     
     # 准备文件路径和提交信息
     filename = os.path.basename(image_path)
-    timestamp = time.strftime("%Y%m%d%H%M%S")
-    file_path = f"images/{timestamp}_{filename}"
+    file_path = get_image_repo_path(image_path, sha256)
     commit_message = f"Upload image {filename}"
     
     # 上传文件到Gitee
@@ -82,110 +300,149 @@ def upload_image_to_gitee(image_path):
     }
     headers = {"Content-Type": "application/json;charset=UTF-8"}
     
-    response = requests.post(url, json=params, headers=headers)
+    response = gitee_request("POST", url, json=params, headers=headers)
     
     if response.status_code == 201:
         result = response.json()
-        return result.get("content").get("download_url")
+        remote_url = result.get("content").get("download_url")
     else:
-        print(f"上传图片 {filename} 失败: {response.text}")
-        return None
-
-def update_image_links_in_md(md_file_path, local_image_dir, remote_image_urls):
-    """更新Markdown文件中的图片链接"""
-    logger.info(f"开始更新Markdown文件中的图片链接: {md_file_path}")
+        # 清单丢失或并发上传了相同内容时，仓库中可能已有该文件
+        remote_url = _find_uploaded_image(file_path)
+        if not remote_url:
+            logger.error(f"上传图片 {filename} 失败: {response.status_code} {response.text}")
+            return None
     
-    try:
-        with open(md_file_path, 'r', encoding='utf-8') as f:
-            md_content = f.read()
-        
-        updated_content = md_content
-        update_count = 0
-        
-        # 遍历所有本地图片路径和对应的远程URL
-        for local_filename, remote_url in remote_image_urls.items():
-            if not remote_url:
-                continue
-                
-            # 查找图片引用模式
-            # 匹配 ![任意文本](文件名.扩展名) 格式的图片引用
-            pattern = re.compile(r'(!\[[^\]]*?\])(\(' + re.escape(local_filename) + r'\))', re.IGNORECASE)
-            
-            if pattern.search(updated_content):
-                # 替换为远程URL
-                updated_content = pattern.sub(r'\1(' + remote_url + ')', updated_content)
-                update_count += 1
-                logger.info(f"替换图片链接: {local_filename} -> {remote_url}")
-            else:
-                logger.warning(f"未找到图片引用: {local_filename}")
-        
-        # 如果内容有更新，写回文件
-        if updated_content != md_content:
-            with open(md_file_path, 'w', encoding='utf-8') as f:
-                f.write(updated_content)
-            logger.info(f"完成 {update_count} 个图片链接更新")
-        else:
-            logger.warning("未更新任何图片链接")
-            
-    except Exception as e:
-        logger.error(f"更新图片链接时出错: {str(e)}", exc_info=True)
-
-def upload_images_to_gitee(md_file_path, local_image_dir):
-    """上传本地图片到Gitee并更新Markdown文件中的链接"""
-    logger.info(f"开始处理图片上传: {md_file_path}, 图片目录: {local_image_dir}")
-    
-    # 确保token存在
-    if not GITEE_ACCESS_TOKEN:
-        logger.warning("Gitee访问令牌未设置，跳过图片上传")
+    manifest.put(sha256, remote_url, len(image_data))
+    return remote_url
+
+def get_raw_url(file_path):
+    """根据仓库中的文件路径计算图片的原始下载URL"""
+    return GITEE_RAW_URL_TEMPLATE.format(
+        owner=GITEE_REPO_OWNER, repo=GITEE_REPO_NAME, branch=GITEE_BRANCH, path=file_path
+    )
+
+def get_git_remote_url():
+    """返回图片仓库的git远程地址（不含令牌，会写入本地克隆的.git/config）"""
+    if GITEE_GIT_REMOTE:
+        return GITEE_GIT_REMOTE
+    return f"https://gitee.com/{GITEE_REPO_OWNER}/{GITEE_REPO_NAME}.git"
+
+def get_git_auth_env():
+    """
+    返回git命令的认证环境变量
+
+    令牌通过GIT_CONFIG_*环境变量设置的http.extraHeader传给git，只在本次命令中有效，
+    不会写入远程地址或.git/config
+    """
+    if not GITEE_ACCESS_TOKEN or not get_git_remote_url().startswith("https://"):
         return {}
+    credentials = base64.b64encode(f"oauth2:{GITEE_ACCESS_TOKEN}".encode("utf-8")).decode("ascii")
+    return {
+        "GIT_CONFIG_COUNT": "1",
+        "GIT_CONFIG_KEY_0": "http.extraHeader",
+        "GIT_CONFIG_VALUE_0": f"Authorization: Basic {credentials}",
+    }
+
+def _open_image_clone():
+    """打开（必要时克隆）图片仓库的本地克隆，并同步到远程分支的最新提交"""
+    auth_env = get_git_auth_env()
+    if os.path.isdir(os.path.join(GITEE_CLONE_DIR, ".git")):
+        repo = Repo(GITEE_CLONE_DIR)
+        repo.git.update_environment(**auth_env)
+        # 同时清除旧版本写入远程地址中的令牌
+        repo.remote("origin").set_url(get_git_remote_url())
+        repo.git.fetch("origin")
+    else:
+        logger.info(f"克隆图片仓库到: {GITEE_CLONE_DIR}")
+        repo = Repo.clone_from(get_git_remote_url(), GITEE_CLONE_DIR, env=auth_env)
+        repo.git.update_environment(**auth_env)
     
+    # 丢弃上次失败留下的本地提交、暂存和未跟踪文件，工作区与远程分支完全一致
+    remote_branch = f"origin/{GITEE_BRANCH}"
+    if remote_branch in [ref.name for ref in repo.remote("origin").refs]:
+        repo.git.checkout("-B", GITEE_BRANCH, remote_branch)
+        repo.git.reset("--hard", remote_branch)
+    else:
+        # 空仓库：在本地创建分支，第一次推送时建立远程分支
+        repo.git.symbolic_ref("HEAD", f"refs/heads/{GITEE_BRANCH}")
+        repo.git.update_ref("-d", f"refs/heads/{GITEE_BRANCH}")
+        repo.git.read_tree("--empty")
+    repo.git.clean("-fdx")
+    return repo
+
+def _push_image_clone(repo):
+    """推送本地提交；远程分支在此期间有新提交时变基后重试一次"""
     try:
-        # 查找Markdown文件中的所有本地图片引用
-        with open(md_file_path, 'r', encoding='utf-8') as f:
-            md_content = f.read()
-        
-        # 使用正则表达式查找图片引用
-        # 匹配 ![任意文本](文件名.扩展名) 格式的图片引用
-        img_pattern = r'!\[(.*?)\]\(([^/\)]+\.(png|jpg|jpeg|gif|svg|webp))\)'
-        local_images = re.findall(img_pattern, md_content, re.IGNORECASE)
-        
-        if not local_images:
-            logger.info("未在Markdown中找到图片引用，跳过上传")
-            return {}
-        
-        logger.info(f"在Markdown中找到 {len(local_images)} 个图片引用")
+        repo.git.push("origin", f"HEAD:{GITEE_BRANCH}")
+    except GitCommandError:
+        logger.warning("推送图片提交被拒绝，同步远程分支后重试")
+        repo.git.fetch("origin")
+        repo.git.rebase(f"origin/{GITEE_BRANCH}")
+        repo.git.push("origin", f"HEAD:{GITEE_BRANCH}")
+
+def upload_images_via_git(image_paths):
+    """
+    通过本地克隆批量上传图片：所有图片暂存后只生成一个提交并推送一次
+
+    图片按内容哈希存放，URL由已知的原始文件路径计算，不需要逐张调用API
+
+    Returns:
+        dict: {图片路径: 远程URL}，推送失败时抛出GitCommandError
+    """
+    manifest = get_manifest()
+    remote_urls = {}
+    pending = {}  # 仓库路径 -> (内容哈希, 图片路径列表)
+    for image_path in image_paths:
+        sha256 = file_sha256(image_path)
+        cached_url = manifest.get(sha256)
+        if cached_url:
+            remote_urls[image_path] = cached_url
+            continue
+        file_path = get_image_repo_path(image_path, sha256)
+        pending.setdefault(file_path, (sha256, []))[1].append(image_path)
+    
+    if not pending:
+        logger.info("所有图片都已上传过，跳过提交")
+        return remote_urls
+    
+    with _clone_lock:
+        repo = _open_image_clone()
         
-        # 上传图片到Gitee并获取远程URL
-        remote_image_urls = {}
-        for alt_text, image_filename, ext in local_images:
-            # 获取图片的绝对路径，图片和markdown在同一目录
-            image_abs_path = os.path.join(local_image_dir, image_filename)
-            
-            # 检查文件是否存在
-            if not os.path.exists(image_abs_path):
-                logger.warning(f"图片文件不存在: {image_abs_path}")
+        # 按远程分支中已跟踪的文件判断哪些图片需要提交，而不是按工作区中文件是否存在
+        tracked = set(repo.git.ls_files("-z").split("\0")) - {""}
+        staged = []
+        for file_path, (sha256, paths) in pending.items():
+            if file_path in tracked:
                 continue
-            
-            logger.info(f"开始上传图片: {image_filename}")
-            try:
-                # 上传图片到Gitee
-                remote_url = upload_image_to_gitee(image_abs_path)
-                if remote_url:
-                    logger.info(f"图片上传成功: {remote_url}")
-                    remote_image_urls[image_filename] = remote_url
-                else:
-                    logger.warning(f"图片上传失败: {image_filename}")
-            except Exception as e:
-                logger.error(f"上传图片 {image_filename} 时出错: {str(e)}", exc_info=True)
+            target = os.path.join(repo.working_tree_dir, *file_path.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(paths[0], target)
+            staged.append(file_path)
         
-        # 更新Markdown文件中的图片链接
-        if remote_image_urls:
-            logger.info(f"更新Markdown文件中的图片链接: {md_file_path}")
-            update_image_links_in_md(md_file_path, local_image_dir, remote_image_urls)
-            logger.info("图片链接更新完成")
-        
-        return remote_image_urls
+        if staged:
+            repo.index.add(staged)
+            commit_message = f"Upload {len(staged)} images"
+            repo.index.commit(commit_message, author=GITEE_COMMIT_AUTHOR, committer=GITEE_COMMIT_AUTHOR)
+            _push_image_clone(repo)
+            logger.info(f"已通过一次推送上传 {len(staged)} 张图片")
+        # 推送成功后，远程分支包含原有文件和本次提交的文件
+        pushed = tracked.union(staged)
     
-    except Exception as e:
-        logger.error(f"处理图片上传时出错: {str(e)}", exc_info=True)
-        return {} 
\ No newline at end of file
+    for file_path, (sha256, paths) in pending.items():
+        if file_path not in pushed:
+            continue
+        remote_url = get_raw_url(file_path)
+        manifest.put(sha256, remote_url, os.path.getsize(paths[0]))
+        for image_path in paths:
+            remote_urls[image_path] = remote_url
+    return remote_urls
+
+def upload_images_to_gitee(md_file_path, local_image_dir, max_workers=None):
+    """
+    上传本地图片到Gitee并更新Markdown文件中的链接
+
+    GITEE_UPLOAD_BACKEND为api时图片通过有界线程池并发上传，max_workers默认取
+    GITEE_UPLOAD_CONCURRENCY；为git时所有图片在本地克隆中合并为一个提交推送。
+    有图片没有上传成功时抛出ImageUploadError
+    """
+    return publish_markdown_images(md_file_path, local_image_dir, GiteeImageStorage(max_workers=max_workers))
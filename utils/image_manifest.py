@@ -0,0 +1,68 @@
+"""
+图片上传清单
+按图片内容的SHA-256记录已上传图片的远程URL，相同内容的图片只需上传一次
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """计算文件内容的SHA-256（十六进制）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ImageManifest:
+    """
+    持久化的 内容哈希 -> 远程URL 清单（SQLite）
+
+    同一个进程内的多个上传线程共享一个连接，写操作由锁串行化
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                "sha256 TEXT PRIMARY KEY, "
+                "url TEXT NOT NULL, "
+                "size INTEGER, "
+                "uploaded_at REAL)"
+            )
+
+    def get(self, sha256):
+        """返回内容哈希对应的远程URL，没有记录时返回None"""
+        with self._lock:
+            row = self._conn.execute("SELECT url FROM images WHERE sha256 = ?", (sha256,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, sha256, url, size=None):
+        """记录内容哈希对应的远程URL"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO images (sha256, url, size, uploaded_at) VALUES (?, ?, ?, ?)",
+                (sha256, url, size, time.time())
+            )
+        logger.debug(f"记录图片上传清单: {sha256[:12]} -> {url}")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
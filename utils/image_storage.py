@@ -0,0 +1,411 @@
+"""
+图片存储后端
+转换生成的图片通过统一接口发布到配置的存储：本地目录（静态服务/CDN）、S3兼容对象存储或Gitee仓库
+"""
+
+import os
+import re
+import hmac
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+from abc import ABC, abstractmethod
+from urllib.parse import quote, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from dotenv import load_dotenv
+from utils.image_manifest import file_sha256
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 图片存储方式：local / s3 / gitee
+IMAGE_STORAGE_BACKEND = os.getenv("IMAGE_STORAGE_BACKEND", "gitee")
+IMAGE_STORAGE_CONCURRENCY = int(os.getenv("IMAGE_STORAGE_CONCURRENCY", "4"))  # 同时上传的图片数
+
+# 本地存储：图片写入该目录，由应用的 /images/ 路由或前置的CDN/静态服务器对外提供
+IMAGE_STORAGE_LOCAL_DIR = os.getenv("IMAGE_STORAGE_LOCAL_DIR", os.path.join("outputs", "image_store"))
+IMAGE_STORAGE_BASE_URL = os.getenv("IMAGE_STORAGE_BASE_URL", "/images/")
+
+# S3兼容存储（AWS S3、MinIO等），使用路径风格地址 {endpoint}/{bucket}/{key}
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "")
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID", "")
+S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY", "")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL", "")  # 为空时使用 {endpoint}/{bucket}/
+
+# Markdown图片引用 ![alt](目标)
+IMAGE_LINK_PATTERN = re.compile(r'(!\[[^\]]*?\])\(([^)]*)\)')
+# 与Markdown文件同目录的本地图片引用
+LOCAL_IMAGE_PATTERN = re.compile(r'!\[(.*?)\]\(([^/\)]+\.(png|jpg|jpeg|gif|svg|webp))\)', re.IGNORECASE)
+
+def content_key(image_path, sha256=None):
+    """根据图片内容哈希生成存储路径，相同内容总是对应同一路径"""
+    if sha256 is None:
+        sha256 = file_sha256(image_path)
+    extension = os.path.splitext(image_path)[1].lower()
+    return f"images/{sha256[:2]}/{sha256}{extension}"
+
+def rewrite_image_links(md_content, resolve):
+    """
+    一次扫描替换Markdown中的全部图片链接
+
+    Args:
+        md_content (str): Markdown内容
+        resolve: 函数，参数为链接目标，返回新的URL；返回None时保留原链接
+
+    Returns:
+        tuple: (替换后的内容, 被替换的链接目标列表)
+    """
+    replaced = []
+
+    def replace(match):
+        target = match.group(2)
+        new_url = resolve(target)
+        if not new_url:
+            return match.group(0)
+        replaced.append(target)
+        return f"{match.group(1)}({new_url})"
+
+    return IMAGE_LINK_PATTERN.sub(replace, md_content), replaced
+
+def update_image_links_in_md(md_file_path, local_image_dir, remote_image_urls):
+    """
+    更新Markdown文件中的图片链接
+
+    所有本地引用在一次扫描中替换（文件名不区分大小写）
+
+    Returns:
+        list: 在Markdown中没有找到引用的图片文件名
+    """
+    logger.info(f"开始更新Markdown文件中的图片链接: {md_file_path}")
+
+    # 没有远程URL的图片不参与替换
+    lookup = {filename.lower(): remote_url for filename, remote_url in remote_image_urls.items() if remote_url}
+    missing = []
+
+    try:
+        with open(md_file_path, 'r', encoding='utf-8') as f:
+            md_content = f.read()
+
+        updated_content, replaced = rewrite_image_links(md_content, lambda target: lookup.get(target.lower()))
+
+        found = {target.lower() for target in replaced}
+        for local_filename, remote_url in remote_image_urls.items():
+            if not remote_url:
+                continue
+            if local_filename.lower() in found:
+                logger.info(f"替换图片链接: {local_filename} -> {remote_url}")
+            else:
+                logger.warning(f"未找到图片引用: {local_filename}")
+                missing.append(local_filename)
+
+        # 如果内容有更新，写回文件
+        if updated_content != md_content:
+            with open(md_file_path, 'w', encoding='utf-8') as f:
+                f.write(updated_content)
+            logger.info(f"完成 {len(found)} 个图片链接更新")
+        else:
+            logger.warning("未更新任何图片链接")
+
+    except Exception as e:
+        logger.error(f"更新图片链接时出错: {str(e)}", exc_info=True)
+        # 文件没有写回，所有图片都仍是本地链接
+        missing = [filename for filename, remote_url in remote_image_urls.items() if remote_url]
+
+    return missing
+
+class ImageUploadError(Exception):
+    """部分图片没有发布到图片存储，Markdown中仍保留这些图片的本地链接"""
+
+    def __init__(self, message, failed, uploaded=None):
+        super().__init__(message)
+        self.failed = failed  # 没有发布的图片文件名
+        self.uploaded = uploaded or {}  # 已发布并替换链接的图片 {文件名: URL}
+
+def find_local_images(md_content, local_image_dir):
+    """返回Markdown引用且在图片目录中存在的本地图片文件名（去重，保持引用顺序）"""
+    image_filenames = []
+    for alt_text, image_filename, ext in LOCAL_IMAGE_PATTERN.findall(md_content):
+        if image_filename in image_filenames:
+            continue
+
+        # 图片和markdown在同一目录
+        image_abs_path = os.path.join(local_image_dir, image_filename)
+        if not os.path.exists(image_abs_path):
+            logger.warning(f"图片文件不存在: {image_abs_path}")
+            continue
+        image_filenames.append(image_filename)
+    return image_filenames
+
+class ImageStorage(ABC):
+    """
+    图片存储后端的公共接口
+
+    子类必须实现upload_image（单张图片 -> URL）；upload_images默认通过有界线程池并发上传
+    """
+
+    name = None
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+
+    def is_configured(self):
+        """存储所需的配置是否齐全"""
+        return True
+
+    @abstractmethod
+    def upload_image(self, image_path):
+        """上传单张图片，返回图片URL，失败时返回None"""
+
+    def upload_images(self, image_paths):
+        """
+        上传一组图片
+
+        Returns:
+            dict: {图片路径: URL}，只包含上传成功的图片
+        """
+        def upload(image_path):
+            logger.info(f"开始上传图片: {os.path.basename(image_path)}")
+            try:
+                remote_url = self.upload_image(image_path)
+                if remote_url:
+                    logger.info(f"图片上传成功: {remote_url}")
+                else:
+                    logger.warning(f"图片上传失败: {image_path}")
+                return remote_url
+            except Exception as e:
+                logger.error(f"上传图片 {image_path} 时出错: {str(e)}", exc_info=True)
+                return None
+
+        remote_urls = {}
+        workers = max(1, min(self.max_workers or IMAGE_STORAGE_CONCURRENCY, len(image_paths) or 1))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{self.name}-upload") as executor:
+            for image_path, remote_url in zip(image_paths, executor.map(upload, image_paths)):
+                if remote_url:
+                    remote_urls[image_path] = remote_url
+        return remote_urls
+
+class LocalImageStorage(ImageStorage):
+    """把图片按内容哈希复制到本地目录，URL为 基础URL + 存储路径"""
+
+    name = "local"
+
+    def __init__(self, root=None, base_url=None, max_workers=None):
+        super().__init__(max_workers)
+        self.root = root or IMAGE_STORAGE_LOCAL_DIR
+        self.base_url = base_url if base_url is not None else IMAGE_STORAGE_BASE_URL
+
+    def url_for(self, key):
+        return self.base_url.rstrip("/") + "/" + key
+
+    def upload_image(self, image_path):
+        key = content_key(image_path)
+        target = os.path.join(self.root, *key.split("/"))
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # 先写临时文件再原子替换，避免静态服务读到写了一半的图片
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+            os.close(fd)
+            try:
+                shutil.copyfile(image_path, temp_path)
+                os.replace(temp_path, target)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        return self.url_for(key)
+
+IMAGE_CONTENT_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".svg": "image/svg+xml",
+    ".webp": "image/webp",
+    ".bmp": "image/bmp",
+}
+
+class S3ImageStorage(ImageStorage):
+    """通过S3 API（AWS Signature V4签名的PUT请求）上传图片到S3兼容的对象存储"""
+
+    name = "s3"
+
+    def __init__(self, endpoint_url=None, bucket=None, access_key=None, secret_key=None,
+                 region=None, public_url=None, max_workers=None):
+        super().__init__(max_workers)
+        self.endpoint_url = (endpoint_url or S3_ENDPOINT_URL).rstrip("/")
+        self.bucket = bucket or S3_BUCKET
+        self.access_key = access_key or S3_ACCESS_KEY_ID
+        self.secret_key = secret_key or S3_SECRET_ACCESS_KEY
+        self.region = region or S3_REGION
+        self.public_url = public_url or S3_PUBLIC_URL or f"{self.endpoint_url}/{self.bucket}/"
+        self.session = requests.Session()
+
+    def is_configured(self):
+        return bool(self.endpoint_url and self.bucket and self.access_key and self.secret_key)
+
+    def url_for(self, key):
+        return self.public_url.rstrip("/") + "/" + key
+
+    def sign_headers(self, method, path, payload_hash, headers, amz_date):
+        """按AWS Signature V4计算签名，返回加上Authorization后的请求头"""
+        datestamp = amz_date[:8]
+        headers = dict(headers)
+        headers["host"] = urlsplit(self.endpoint_url).netloc
+        headers["x-amz-content-sha256"] = payload_hash
+        headers["x-amz-date"] = amz_date
+
+        signed = sorted(name.lower() for name in headers)
+        lowered = {name.lower(): str(value).strip() for name, value in headers.items()}
+        canonical_headers = "".join(f"{name}:{lowered[name]}\n" for name in signed)
+        signed_headers = ";".join(signed)
+        canonical_request = "\n".join([method, path, "", canonical_headers, signed_headers, payload_hash])
+
+        scope = f"{datestamp}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+        ])
+
+        key = ("AWS4" + self.secret_key).encode("utf-8")
+        for part in (datestamp, self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+        signature = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+
+        headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        return headers
+
+    def upload_image(self, image_path):
+        if not self.is_configured():
+            raise ValueError("请配置S3_ENDPOINT_URL、S3_BUCKET和访问密钥")
+
+        with open(image_path, "rb") as f:
+            body = f.read()
+        sha256 = hashlib.sha256(body).hexdigest()
+        key = content_key(image_path, sha256)
+
+        path = quote(f"/{self.bucket}/{key}", safe="/-_.~")
+        content_type = IMAGE_CONTENT_TYPES.get(os.path.splitext(image_path)[1].lower(), "application/octet-stream")
+        amz_date = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        headers = self.sign_headers("PUT", path, sha256, {"content-type": content_type}, amz_date)
+
+        response = self.session.put(self.endpoint_url + path, data=body, headers=headers)
+        if response.status_code not in (200, 201):
+            logger.error(f"上传图片到S3失败: {response.status_code} {response.text}")
+            return None
+        return self.url_for(key)
+
+class GiteeImageStorage(ImageStorage):
+    """上传到Gitee仓库：逐张调用contents接口，或在GITEE_UPLOAD_BACKEND=git时一次提交推送"""
+
+    name = "gitee"
+
+    def is_configured(self):
+        from utils import gitee_uploader
+        return bool(gitee_uploader.GITEE_ACCESS_TOKEN) or (
+            gitee_uploader.GITEE_UPLOAD_BACKEND == "git" and bool(gitee_uploader.GITEE_GIT_REMOTE)
+        )
+
+    def upload_image(self, image_path):
+        from utils import gitee_uploader
+        return gitee_uploader.upload_image_to_gitee(image_path)
+
+    def upload_images(self, image_paths):
+        from utils import gitee_uploader
+        if gitee_uploader.GITEE_UPLOAD_BACKEND == "git":
+            return gitee_uploader.upload_images_via_git(image_paths)
+        if self.max_workers is None:
+            self.max_workers = gitee_uploader.GITEE_UPLOAD_CONCURRENCY
+        return super().upload_images(image_paths)
+
+STORAGE_BACKENDS = {
+    LocalImageStorage.name: LocalImageStorage,
+    S3ImageStorage.name: S3ImageStorage,
+    GiteeImageStorage.name: GiteeImageStorage,
+}
+
+def get_image_storage(name=None, **options):
+    """按名称（默认IMAGE_STORAGE_BACKEND）创建图片存储后端"""
+    name = (name or IMAGE_STORAGE_BACKEND).lower()
+    storage_class = STORAGE_BACKENDS.get(name)
+    if storage_class is None:
+        raise ValueError(f"未知的图片存储方式: {name}，可选: {', '.join(STORAGE_BACKENDS)}")
+    return storage_class(**options)
+
+def image_storage_variant(storage=None):
+    """
+    影响转换结果的图片存储配置，用于转换缓存键
+
+    存储未配置时结果保留本地图片链接，与配置后的结果不同，因此单独区分
+    """
+    if storage is None:
+        storage = get_image_storage()
+    return storage.name if storage.is_configured() else f"{storage.name}:unconfigured"
+
+def converter_image_link(folder_name, image_name):
+    """
+    转换器直接写入Markdown的图片链接
+
+    Gitee存储沿用按输出目录组织的仓库原始链接；其他存储写本地文件名，
+    转换完成后由publish_markdown_images上传并替换为存储URL
+    """
+    if IMAGE_STORAGE_BACKEND.lower() == GiteeImageStorage.name:
+        from utils import gitee_uploader
+        return gitee_uploader.get_raw_url(f"{folder_name}/{image_name}")
+    return image_name
+
+def publish_markdown_images(md_file_path, local_image_dir, storage=None):
+    """
+    上传Markdown引用的本地图片到图片存储，并把链接替换为存储URL
+
+    上传成功的图片链接总会被替换；有图片没有发布（上传失败或链接未替换）时抛出ImageUploadError，
+    调用方据此判断结果中是否仍有本地链接。存储未配置时不上传，保留本地链接并返回空字典
+
+    Returns:
+        dict: {图片文件名: URL}
+    """
+    if storage is None:
+        storage = get_image_storage()
+    logger.info(f"开始处理图片上传({storage.name}): {md_file_path}, 图片目录: {local_image_dir}")
+
+    with open(md_file_path, 'r', encoding='utf-8') as f:
+        md_content = f.read()
+
+    image_filenames = find_local_images(md_content, local_image_dir)
+    if not image_filenames:
+        logger.info("未在Markdown中找到图片引用，跳过上传")
+        return {}
+    logger.info(f"在Markdown中找到 {len(image_filenames)} 张本地图片")
+
+    if not storage.is_configured():
+        # 未配置存储不是上传失败：结果保留本地链接，是否已配置由image_storage_variant计入转换缓存键
+        logger.warning(f"图片存储 {storage.name} 未配置，{len(image_filenames)} 张图片保留本地链接")
+        return {}
+
+    uploaded = storage.upload_images([os.path.join(local_image_dir, name) for name in image_filenames])
+    remote_image_urls = {}
+    for image_filename in image_filenames:
+        remote_url = uploaded.get(os.path.join(local_image_dir, image_filename))
+        if remote_url:
+            remote_image_urls[image_filename] = remote_url
+
+    # 更新Markdown文件中的图片链接
+    missing = []
+    if remote_image_urls:
+        missing = update_image_links_in_md(md_file_path, local_image_dir, remote_image_urls)
+
+    failed = [name for name in image_filenames if name not in remote_image_urls or name in missing]
+    if failed:
+        logger.warning(f"{len(failed)} 张图片没有发布，保留本地链接: {', '.join(failed)}")
+        uploaded_urls = {name: url for name, url in remote_image_urls.items() if name not in failed}
+        raise ImageUploadError(f"{len(failed)} 张图片上传失败: {', '.join(failed)}", failed, uploaded_urls)
+
+    return remote_image_urls
@@ -1,6 +1,13 @@
 import os
 import re
-import PyPDF2
+import sys
+import pickle
+import tempfile
+import hashlib
+import logging
+from bisect import bisect_right
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 # 修改导入方式，确保兼容性
 try:
     import fitz  # PyMuPDF
@@ -8,78 +15,197 @@ except ImportError:
     try:
         import pymupdf as fitz
     except ImportError:
-        raise ImportError("请安装PyMuPDF: pip install PyMuPDF")
-from PIL import Image
-from io import BytesIO
+        fitz = None
+# PyPDF2只在PyMuPDF无法打开文件时作为纯文本后备
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+if fitz is None and PyPDF2 is None:
+    raise ImportError("请安装PyMuPDF: pip install PyMuPDF")
+
+logger = logging.getLogger(__name__)
+
+# 并行转换配置：PDF_CONVERT_WORKERS > 1 时按页码区间分给多个进程处理
+PDF_CONVERT_WORKERS = int(os.getenv("PDF_CONVERT_WORKERS", "1"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))  # 页数少于此值时不启动进程池
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))  # 每个任务处理的最大页数
+
+# 转换进度的阶段：第一遍提取页面内容，第二遍按全文标题级别生成并写出Markdown
+PROGRESS_EXTRACT = "extract"
+PROGRESS_WRITE = "write"
+
+# PyMuPDF文本片段的字体标志位
+FONT_FLAG_ITALIC = 2
+FONT_FLAG_BOLD = 16
+# 提取文本时不保留图片块；同时收集矢量图形块（type 3），用于判断页面上是否有表格线
+TEXT_EXTRACT_FLAGS = (
+    (fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES) | fitz.TEXT_COLLECT_VECTORS
+) if fitz is not None else 0
+VECTOR_BLOCK_TYPE = 3
+
+# 标题识别：字号不小于正文字号该倍数的行可能是标题
+HEADING_SIZE_RATIO = 1.15
+HEADING_MAX_LENGTH = 100
+
+# 一行文本：纯文本、带粗斜体标记的文本、行内最大字号、是否全部为粗体
+PdfLine = namedtuple('PdfLine', ['text', 'markup', 'size', 'bold'])
+# 页面中的一张图片：引用名、图片xref（写出Markdown时才解码保存）
+PdfImage = namedtuple('PdfImage', ['ref', 'xref'])
+# 页面中的一个表格：各行单元格文本
+PdfTable = namedtuple('PdfTable', ['rows'])
+
+# 表格识别：没有表格线时，按列对齐的连续多列文本行识别表格
+TABLE_MIN_ROWS = 3  # 无表格线的表格至少包含的行数
+TABLE_MAX_CELL_CHARS = 40  # 单元格平均字符数上限，避免把双栏排版的正文当作表格
+
+class PdfImageIndex:
+    """
+    按xref和内容哈希去重的图片索引
+
+    同一xref只解码一次；内容相同的图片（包括不同xref）只写入一个以内容哈希命名的文件，
+    文件名与进程无关，多个进程并行提取时同样只保留一份
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self._by_xref = {}
+
+    def save(self, doc, xref):
+        """返回xref对应图片的保存路径，必要时解码并写入文件"""
+        path = self._by_xref.get(xref)
+        if path is not None:
+            return path
+        
+        base_image = doc.extract_image(xref)
+        image_bytes = base_image["image"]
+        
+        # 尝试确定图片格式
+        img_format = base_image.get("ext") or "png"  # 默认使用png
+        
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        path = os.path.join(self.output_dir, f"image_{digest[:16]}.{img_format}")
+        if not os.path.exists(path):
+            # 先写唯一的临时文件再替换，其他进程和线程不会读到写了一半的图片
+            fd, tmp_path = tempfile.mkstemp(dir=self.output_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(image_bytes)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        
+        self._by_xref[xref] = path
+        return path
+
+def extract_page_images(fitz_page):
+    """
+    获取一页中图片的位置（不解码图片数据）
 
-def extract_images_from_pdf(pdf_path, output_dir):
-    """从PDF文件中提取图片并保存到指定目录"""
+    Returns:
+        list: [(图片在页面上的纵坐标, 横坐标, PdfImage)]，按阅读顺序排列；未显示在页面上的图片排在最后
+    """
+    page_images = []
+    page_num = fitz_page.number
+    
+    for img_index, img in enumerate(fitz_page.get_images(full=True)):
+        xref = img[0]
+        ref = f"page_{page_num+1}_img_{img_index+1}"
+        
+        # 图片在页面上的位置，同一图片显示多次时取第一处
+        rects = fitz_page.get_image_rects(xref)
+        if rects:
+            y0, x0 = rects[0].y0, rects[0].x0
+        else:
+            y0, x0 = float("inf"), 0
+        page_images.append((y0, x0, PdfImage(ref, xref)))
+    
+    page_images.sort(key=lambda item: item[:2])
+    return page_images
+
+def image_dedup_stats(image_paths):
+    """
+    统计图片去重效果
+
+    Args:
+        image_paths: 每处图片引用对应的文件路径（可重复）
+
+    Returns:
+        tuple: (引用数, 文件数, 去重节省的字节数)
+    """
+    sizes = {path: os.path.getsize(path) for path in set(image_paths)}
+    total = sum(sizes[path] for path in image_paths)
+    return len(image_paths), len(sizes), total - sum(sizes.values())
+
+def extract_images_from_pdf(pdf_path, output_dir, doc=None):
+    """从PDF文件中提取图片并保存到指定目录，可以传入已打开的文档复用句柄"""
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
     
-    image_paths = []
-    image_count = 0
-    
     # 打开PDF文件
-    doc = fitz.open(pdf_path)
+    if doc is None:
+        doc = fitz.open(pdf_path)
     
+    image_paths = []
+    image_index = PdfImageIndex(output_dir)
     # 遍历每一页
     for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        image_list = page.get_images(full=True)
-        
-        # 提取每一页的图片
-        for img_index, img in enumerate(image_list):
-            image_count += 1
-            xref = img[0]
-            base_image = doc.extract_image(xref)
-            image_bytes = base_image["image"]
-            
-            # 尝试确定图片格式
-            try:
-                img_format = base_image["ext"]
-            except:
-                img_format = "png"  # 默认使用png
-            
-            image_filename = f"image_{image_count}.{img_format}"
-            image_path = os.path.join(output_dir, image_filename)
-            
-            # 保存图片
-            with open(image_path, "wb") as f:
-                f.write(image_bytes)
-            
-            # 保存图片路径，使用页码和图片索引作为引用
-            ref = f"page_{page_num+1}_img_{img_index+1}"
-            image_paths.append((ref, image_path))
+        for _, _, image in extract_page_images(doc.load_page(page_num)):
+            image_paths.append((image.ref, image_index.save(doc, image.xref)))
     
+    count, unique, saved = image_dedup_stats([path for _, path in image_paths])
+    logger.info(f"提取图片: {count}处引用，{unique}个文件，去重节省 {saved} 字节")
     return image_paths
 
-def identify_headings(text, font_sizes):
-    """根据字体大小尝试识别标题"""
-    # 按字体大小排序
-    sorted_sizes = sorted(set(font_sizes), reverse=True)
+def collect_font_histogram(pages):
+    """
+    第一遍：统计全文各字体样式的字符数
+
+    Args:
+        pages: 每页的内容列表（PdfLine / PdfImage）
+
+    Returns:
+        Counter: {(字号, 是否粗体): 字符数}
+    """
+    histogram = Counter()
+    for lines in pages:
+        for line in lines:
+            if isinstance(line, PdfLine):
+                histogram[(line.size, line.bold)] += len(line.text.strip())
+    return histogram
+
+def derive_heading_tiers(histogram):
+    """
+    根据全文字体直方图确定正文字号和标题级别
+
+    字符数最多的字号为正文字号；字号不小于正文HEADING_SIZE_RATIO倍的样式按（字号, 粗体）
+    从大到小依次为1-6级标题
+
+    Returns:
+        tuple: (正文字号, {(字号, 是否粗体): 标题级别})
+    """
+    size_chars = Counter()
+    for (size, bold), count in histogram.items():
+        size_chars[size] += count
+    if not size_chars:
+        return 0, {}
     
-    # 如果只有一种字体大小，则无法区分标题
-    if len(sorted_sizes) <= 1:
+    # 字符数相同时取较小的字号作为正文
+    body_size = max(size_chars, key=lambda size: (size_chars[size], -size))
+    candidates = sorted(
+        (style for style, count in histogram.items() if count and style[0] >= body_size * HEADING_SIZE_RATIO),
+        reverse=True
+    )
+    return body_size, {style: min(i + 1, 6) for i, style in enumerate(candidates)}
+
+def identify_headings(text, style, heading_tiers):
+    """第二遍：按行的字体样式查表得到标题级别（0表示不是标题）"""
+    stripped = text.strip()
+    # 标题一般不会太长
+    if not stripped or len(stripped) >= HEADING_MAX_LENGTH:
         return text, 0
-    
-    # 假设最大的字体是标题，根据字体大小相对于最大字体的比例判断标题级别
-    max_font = sorted_sizes[0]
-    
-    for i, size in enumerate(sorted_sizes):
-        if size == font_sizes:
-            # 根据字体大小确定标题级别
-            if i == 0:  # 最大字体
-                return text, 1
-            elif i == 1:  # 第二大字体
-                return text, 2
-            elif i == 2:  # 第三大字体
-                return text, 3
-            else:
-                return text, min(i+1, 6)  # 最多到h6
-    
-    # 如果没有匹配，则不是标题
-    return text, 0
+    return text, heading_tiers.get(style, 0)
 
 def detect_code_blocks(text):
     """尝试检测可能的代码块"""
@@ -93,80 +219,507 @@ def detect_code_blocks(text):
         return f"```\n{text}\n```"
     return text
 
-def convert_pdf_to_md(pdf_path, output_path, image_dir=None):
-    """将PDF文件转换为markdown格式"""
-    if image_dir is None:
-        image_dir = os.path.join(os.path.dirname(output_path), 'images')
+def find_ruled_tables(fitz_page, blocks):
+    """
+    用PyMuPDF的find_tables识别有表格线的表格
+
+    find_tables依赖页面上的矢量线条；文本提取时已经收集了矢量图形块，
+    没有矢量图形的页面直接跳过，不增加纯文本页面的处理时间
+
+    Returns:
+        list: [(表格区域fitz.Rect, PdfTable)]
+    """
+    if not hasattr(fitz_page, "find_tables"):
+        return []
+    if not any(block["type"] == VECTOR_BLOCK_TYPE for block in blocks):
+        return []
     
-    # 提取图片
-    image_paths = extract_images_from_pdf(pdf_path, image_dir)
-    image_refs = {ref: path for ref, path in image_paths}
+    tables = []
+    try:
+        for table in fitz_page.find_tables(strategy="lines").tables:
+            rows = [[cell or "" for cell in row] for row in table.extract()]
+            if len(rows) >= 2 and max(len(row) for row in rows) >= 2:
+                tables.append((fitz.Rect(table.bbox), PdfTable(rows)))
+    except Exception as e:
+        logger.warning(f"第 {fitz_page.number + 1} 页表格识别失败: {str(e)}")
+    return tables
+
+def detect_text_tables(entries):
+    """
+    按列对齐识别没有表格线的表格
+
+    所有文本行按纵坐标排序后一次扫描分组为视觉行；连续的多列视觉行中，各单元格横向区间的并集作为列，
+    每行的单元格落在不同列且单元格较短时识别为表格
+
+    Args:
+        entries: [(PdfLine, 行区域)]，区域为None的条目（图片、表格）不参与识别
+
+    Returns:
+        list: [(组成表格的条目下标集合, PdfTable)]
+    """
+    geometry = sorted(
+        ((bbox[1] + bbox[3]) / 2, bbox[1], bbox[3], bbox[0], bbox[2], index)
+        for index, (item, bbox) in enumerate(entries)
+        if bbox is not None and item.text.strip()
+    )
     
-    # 打开PDF
-    reader = PyPDF2.PdfReader(pdf_path)
-    md_content = []
+    # 纵坐标中心落在上一视觉行范围内的文本行属于同一视觉行
+    rows = []
+    for center, y0, y1, x0, x1, index in geometry:
+        if rows and center <= rows[-1][1]:
+            rows[-1][1] = max(rows[-1][1], y1)
+            rows[-1][2].append((x0, x1, index))
+        else:
+            rows.append([y0, y1, [(x0, x1, index)]])
     
-    # 使用PyMuPDF获取更多格式信息
-    doc = fitz.open(pdf_path)
+    def is_multi_column(cells):
+        cells.sort()
+        return len(cells) >= 2 and all(a[1] <= b[0] for a, b in zip(cells, cells[1:]))
     
-    # 处理每一页
-    for page_num in range(len(reader.pages)):
-        page = reader.pages[page_num]
-        text = page.extract_text()
+    # 连续的多列视觉行组成候选表格
+    runs, run = [], []
+    for row in rows:
+        if is_multi_column(row[2]) and (not run or row[0] - run[-1][1] <= run[-1][1] - run[-1][0]):
+            run.append(row)
+            continue
+        runs.append(run)
+        run = [row] if is_multi_column(row[2]) else []
+    runs.append(run)
+    
+    tables = []
+    for run in runs:
+        if len(run) < TABLE_MIN_ROWS:
+            continue
+        cells = [cell for row in run for cell in row[2]]
+        if sum(len(entries[index][0].text.strip()) for _, _, index in cells) / len(cells) > TABLE_MAX_CELL_CHARS:
+            continue
         
-        # 使用PyMuPDF获取格式信息
-        fitz_page = doc.load_page(page_num)
-        blocks = fitz_page.get_text("dict")["blocks"]
+        # 单元格横向区间合并为列
+        columns = []
+        for x0, x1, _ in sorted(cells):
+            if columns and x0 < columns[-1][1]:
+                columns[-1][1] = max(columns[-1][1], x1)
+            else:
+                columns.append([x0, x1])
+        if len(columns) < 2:
+            continue
         
-        # 处理当前页的文本块
-        for block in blocks:
-            if "lines" not in block:
+        starts = [column[0] for column in columns]
+        table_rows = []
+        for row in run:
+            texts = [""] * len(columns)
+            for x0, _, index in row[2]:
+                column = bisect_right(starts, x0) - 1
+                if texts[column]:
+                    break
+                texts[column] = entries[index][0].text.strip()
+            else:
+                table_rows.append(texts)
                 continue
+            break
+        else:
+            tables.append(({index for _, _, index in cells}, PdfTable(table_rows)))
+    
+    return tables
+
+def replace_with_tables(entries, tables):
+    """把组成表格的文本行替换为表格，表格放在其第一行所在的位置"""
+    owner = {}
+    for indices, table in tables:
+        for index in indices:
+            owner[index] = (min(indices), table)
+    
+    items = []
+    for index, (item, _) in enumerate(entries):
+        if index not in owner:
+            items.append(item)
+        elif owner[index][0] == index:
+            items.append(owner[index][1])
+    return items
+
+def extract_page_content(fitz_page):
+    """
+    提取一页的文本行及字体信息，并把本页图片按位置插入到文本行之间（图片此时不解码），
+    表格区域的文本行合并为表格
+
+    只依赖当前页，可以在任意进程中独立执行
+
+    Returns:
+        list: 按阅读顺序排列的PdfLine、PdfImage和PdfTable
+    """
+    entries = []  # [(条目, 文本行区域)]
+    page_images = extract_page_images(fitz_page)
+    image_index = 0
+    # 不需要图片块，图片位置由get_image_rects给出，避免为每页复制图片数据
+    blocks = fitz_page.get_text("dict", flags=TEXT_EXTRACT_FLAGS)["blocks"]
+    ruled_tables = find_ruled_tables(fitz_page, blocks)
+    
+    # 处理当前页的文本块
+    for block in blocks:
+        if "lines" not in block:
+            continue
+        
+        # 位于该文本块之上的图片先输出
+        while image_index < len(page_images) and page_images[image_index][0] <= block["bbox"][1]:
+            entries.append((page_images[image_index][2], None))
+            image_index += 1
+            
+        for line in block["lines"]:
+            line_text = ""
+            markup = ""
+            max_size = 0
+            all_bold = None
+            
+            for span in line["spans"]:
+                span_text = span["text"]
+                font_flags = span["flags"]
+                line_text += span_text
                 
-            for line in block["lines"]:
-                line_text = ""
-                font_sizes = []
-                
-                for span in line["spans"]:
-                    span_text = span["text"]
-                    font_size = span["size"]
-                    font_flags = span["flags"]
-                    
-                    # 收集字体大小
-                    font_sizes.append(font_size)
-                    
-                    # 处理粗体和斜体
-                    if font_flags & 2:  # 粗体
-                        span_text = f"**{span_text}**"
-                    if font_flags & 1:  # 斜体
-                        span_text = f"*{span_text}*"
-                        
-                    line_text += span_text
-                
-                # 处理可能的标题
-                text, heading_level = identify_headings(line_text, max(font_sizes) if font_sizes else 0)
+                # 空白片段不影响行的字号和粗体判断
+                if span_text.strip():
+                    max_size = max(max_size, span["size"])
+                    all_bold = (all_bold is not False) and bool(font_flags & FONT_FLAG_BOLD)
                 
-                if heading_level > 0:
-                    md_content.append(f"{'#' * heading_level} {text}")
-                else:
-                    # 检测可能的代码块
-                    text = detect_code_blocks(text)
+                # 处理粗体和斜体
+                if font_flags & FONT_FLAG_BOLD:
+                    span_text = f"**{span_text}**"
+                if font_flags & FONT_FLAG_ITALIC:
+                    span_text = f"*{span_text}*"
                     
-                    # 检测URL链接
-                    url_pattern = r'(https?://\S+)'
-                    text = re.sub(url_pattern, r'[\1](\1)', text)
-                    
-                    md_content.append(text)
+                markup += span_text
+            
+            entries.append((PdfLine(line_text, markup, round(max_size, 1), bool(all_bold)), line["bbox"]))
+    
+    # 页面底部及未显示在页面上的图片
+    entries.extend((image, None) for _, _, image in page_images[image_index:])
+    
+    # 有表格线的表格：区域内的文本行归入表格
+    tables = []
+    for rect, table in ruled_tables:
+        indices = set()
+        for index, (_, bbox) in enumerate(entries):
+            if bbox is not None and fitz.Rect(bbox).intersect(rect).get_area() > fitz.Rect(bbox).get_area() / 2:
+                indices.add(index)
+                entries[index] = (entries[index][0], None)
+        if indices:
+            tables.append((indices, table))
+    
+    # 其余文本行中按列对齐识别没有表格线的表格
+    tables.extend(detect_text_tables(entries))
+    if not tables:
+        return [item for item, _ in entries]
+    return replace_with_tables(entries, tables)
+
+def table_to_markdown(table):
+    """把表格转换为Markdown表格行，第一行作为表头"""
+    width = max(len(row) for row in table.rows)
+    md_rows = []
+    for row in table.rows:
+        # 确保单元格不为空，并替换管道符和换行，防止破坏表格结构
+        cells = [(cell or "").replace("\n", " ").strip().replace("|", "\\|") or " " for cell in row]
+        cells += [" "] * (width - len(cells))
+        md_rows.append("| " + " | ".join(cells) + " |")
+        if len(md_rows) == 1:
+            # 添加分隔行
+            md_rows.append("| " + " | ".join(["---"] * width) + " |")
+    return md_rows
+
+def lines_to_markdown(lines, heading_tiers, image_link):
+    """将一页的文本行和图片转换为Markdown行列表，image_link(PdfImage)返回图片链接"""
+    md_lines = []
+    for line in lines:
+        if isinstance(line, PdfImage):
+            md_lines.append(f"\n![{line.ref}]({image_link(line)})\n")
+            continue
+        if isinstance(line, PdfTable):
+            md_lines.append("\n" + "\n".join(table_to_markdown(line)) + "\n")
+            continue
+        
+        # 处理可能的标题
+        text, heading_level = identify_headings(line.text, (line.size, line.bold), heading_tiers)
+        
+        if heading_level > 0:
+            md_lines.append(f"{'#' * heading_level} {text.strip()}")
+        else:
+            # 检测可能的代码块
+            text = detect_code_blocks(line.markup)
+            
+            # 检测URL链接
+            url_pattern = r'(https?://\S+)'
+            text = re.sub(url_pattern, r'[\1](\1)', text)
+            
+            md_lines.append(text)
+    
+    return md_lines
+
+def convert_page_range(pdf_path, start, stop):
+    """
+    进程池任务：独立打开PDF并提取[start, stop)页的文本行和图片位置
+
+    Returns:
+        list: 每页的内容列表，按页码顺序
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        return [extract_page_content(doc.load_page(page_num)) for page_num in range(start, stop)]
+    finally:
+        doc.close()
+
+def split_page_ranges(page_count, workers, pages_per_task=PDF_PAGES_PER_TASK, first_page=0):
+    """把页码切分为连续区间；区间数约为进程数的4倍，使各进程负载均衡"""
+    chunk = max(1, min(pages_per_task, -(-page_count // (workers * 4))))
+    stop = first_page + page_count
+    return [(start, min(start + chunk, stop)) for start in range(first_page, stop, chunk)]
+
+def convert_pages_parallel(pdf_path, start, stop, workers):
+    """用进程池提取[start, stop)页，按页码顺序逐页返回内容列表"""
+    ranges = split_page_ranges(stop - start, workers, first_page=start)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        starts, stops = zip(*ranges)
+        # map按提交顺序返回结果，合并后的页面顺序与串行处理一致
+        for range_pages in executor.map(convert_page_range, [pdf_path] * len(ranges), starts, stops):
+            yield from range_pages
+
+def parse_page_range(spec):
+    """
+    解析页码范围，页码从1开始且包含两端
+
+    支持 "5"、"2-10"、"3-"（到最后一页）、"-4"（从第一页开始）
+
+    Returns:
+        tuple: (first, last)，last为None表示到最后一页
+
+    Raises:
+        ValueError: 格式不正确
+    """
+    match = re.fullmatch(r'\s*(\d*)\s*(-?)\s*(\d*)\s*', spec or '')
+    if not match or not (match.group(1) or match.group(3)):
+        raise ValueError(f"无效的页码范围: {spec!r}")
+    first_text, dash, last_text = match.groups()
+    first = int(first_text) if first_text else 1
+    if not dash:
+        last = first
+    else:
+        last = int(last_text) if last_text else None
+    if first < 1 or (last is not None and last < first):
+        raise ValueError(f"无效的页码范围: {spec!r}")
+    return first, last
+
+def resolve_page_range(page_range, page_count):
+    """
+    把页码范围（字符串或(first, last)）转换为[start, stop)页索引，超出文档的部分截断
+
+    Raises:
+        ValueError: 范围格式不正确或起始页超出文档页数
+    """
+    if page_range is None:
+        return 0, page_count
+    if isinstance(page_range, str):
+        page_range = parse_page_range(page_range)
+    first, last = page_range
+    if first > page_count:
+        raise ValueError(f"起始页 {first} 超出文档页数 {page_count}")
+    stop = page_count if last is None else min(last, page_count)
+    return first - 1, stop
+
+class PageSpool:
+    """
+    第一遍提取的页面内容暂存到临时文件，内存占用与文档页数无关
+
+    第二遍按页码顺序逐页读回
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._count = 0
+
+    def append(self, items):
+        pickle.dump(items, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._count += 1
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        self._file.seek(0)
+        for _ in range(self._count):
+            yield pickle.load(self._file)
+
+    def close(self):
+        self._file.close()
+
+class MarkdownPageWriter:
+    """
+    逐页写入Markdown文件，每页写完立即刷新到磁盘，转换过程中即可预览已完成的页面
+
+    写出的内容与把所有页面的行用换行符连接后一次写入完全相同
+    """
+
+    def __init__(self, output_path):
+        self._file = open(output_path, 'w', encoding='utf-8')
+        self._started = False
+
+    def write_page(self, md_lines):
+        if not md_lines:
+            return
+        if self._started:
+            self._file.write("\n")
+        self._file.write("\n".join(md_lines))
+        self._file.flush()
+        self._started = True
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def convert_pdf_to_md_pypdf2(pdf_path, output_path, page_range=None):
+    """PyMuPDF不可用或无法打开文件时的后备转换：用PyPDF2提取纯文本，不含格式和图片"""
+    reader = PyPDF2.PdfReader(pdf_path)
+    start, stop = resolve_page_range(page_range, len(reader.pages))
+    md_content = []
     
-    # 将提取的图片引用插入到Markdown中
-    # 这里简单地将所有图片附加到文档末尾
-    for ref, path in image_paths:
-        filename = os.path.basename(path)
-        md_content.append(f"\n![{ref}](images/{filename})\n")
+    for page_num in range(start, stop):
+        page = reader.pages[page_num]
+        for line in (page.extract_text() or "").splitlines():
+            # 检测可能的代码块
+            text = detect_code_blocks(line)
+            
+            # 检测URL链接
+            url_pattern = r'(https?://\S+)'
+            text = re.sub(url_pattern, r'[\1](\1)', text)
+            
+            md_content.append(text)
     
-    # 写入markdown文件
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write("\n".join(md_content))
     
-    # 返回图片路径列表，以便后续处理
-    return [path for _, path in image_paths] 
\ No newline at end of file
+    return []
+
+def convert_pdf_to_md(pdf_path, output_path, image_dir=None, workers=None, page_range=None, progress=None):
+    """
+    将PDF文件转换为markdown格式
+
+    文本、格式和图片都来自同一个PyMuPDF文档；PyMuPDF无法打开文件时退回PyPDF2纯文本转换。
+    转换分两遍：第一遍逐页提取文本行和图片引用（不解码图片、不生成Markdown），统计全文字体直方图
+    以确定正文字号和标题级别，页面内容暂存到临时文件；第二遍逐页解码图片、生成Markdown并立即写入输出文件，
+    每页只生成一次。workers > 1（默认取PDF_CONVERT_WORKERS）且页数不少于PDF_PARALLEL_MIN_PAGES时，
+    第一遍在进程池中并行执行，输出与串行转换完全相同
+
+    Args:
+        page_range: 只转换部分页面，如 "2-10" 或 (2, 10)，页码从1开始且包含两端
+        progress: 每处理完一页调用 progress(已处理页数, 总页数, 阶段)，
+            阶段为PROGRESS_EXTRACT（第一遍提取）或PROGRESS_WRITE（第二遍写入，输出文件中已有这些页面）
+    """
+    if image_dir is None:
+        image_dir = os.path.join(os.path.dirname(output_path), 'images')
+    if workers is None:
+        workers = PDF_CONVERT_WORKERS
+    
+    # 打开PDF
+    try:
+        if fitz is None:
+            raise ImportError("未安装PyMuPDF")
+        doc = fitz.open(pdf_path)
+    except Exception as e:
+        if PyPDF2 is None:
+            raise
+        logger.warning(f"PyMuPDF无法打开 {pdf_path}（{str(e)}），使用PyPDF2提取纯文本")
+        return convert_pdf_to_md_pypdf2(pdf_path, output_path, page_range)
+    
+    spool = PageSpool()
+    try:
+        start, stop = resolve_page_range(page_range, len(doc))
+        total = stop - start
+        os.makedirs(image_dir, exist_ok=True)
+        
+        # 第一遍：提取文本行和图片引用，统计字体直方图
+        if workers > 1 and total >= PDF_PARALLEL_MIN_PAGES:
+            pages = convert_pages_parallel(pdf_path, start, stop, workers)
+        else:
+            # 处理每一页
+            pages = (extract_page_content(doc.load_page(page_num)) for page_num in range(start, stop))
+        histogram = Counter()
+        for done, items in enumerate(pages, 1):
+            histogram.update(collect_font_histogram([items]))
+            spool.append(items)
+            if progress is not None:
+                progress(done, total, PROGRESS_EXTRACT)
+        
+        body_size, heading_tiers = derive_heading_tiers(histogram)
+        logger.info(f"PDF正文字号: {body_size}，标题字体样式: {heading_tiers}")
+        
+        # 图片链接相对于Markdown文件所在目录
+        image_link_dir = os.path.relpath(image_dir, os.path.dirname(os.path.abspath(output_path))).replace(os.sep, '/')
+        image_index = PdfImageIndex(image_dir)
+        image_refs = []
+        
+        def image_link(image):
+            path = image_index.save(doc, image.xref)
+            image_refs.append(path)
+            filename = os.path.basename(path)
+            return filename if image_link_dir == '.' else f"{image_link_dir}/{filename}"
+        
+        # 第二遍：逐页生成Markdown并写入文件
+        with MarkdownPageWriter(output_path) as writer:
+            for done, items in enumerate(spool, 1):
+                writer.write_page(lines_to_markdown(items, heading_tiers, image_link))
+                if progress is not None:
+                    progress(done, total, PROGRESS_WRITE)
+    finally:
+        spool.close()
+        doc.close()
+    
+    if image_refs:
+        count, unique, saved = image_dedup_stats(image_refs)
+        logger.info(f"PDF图片: {count}处引用，{unique}个文件，去重节省 {saved} 字节")
+    
+    # 返回图片路径列表（每个文件一次），以便后续处理
+    return list(dict.fromkeys(image_refs))
+
+def pdf_page_count(pdf_path):
+    """返回PDF的页数，PyMuPDF不可用或无法打开时用PyPDF2读取"""
+    try:
+        if fitz is None:
+            raise ImportError("未安装PyMuPDF")
+        with fitz.open(pdf_path) as doc:
+            return len(doc)
+    except Exception:
+        if PyPDF2 is None:
+            raise
+        return len(PyPDF2.PdfReader(pdf_path).pages)
+
+def main(argv=None):
+    """命令行入口: python -m utils.pdf_to_md input.pdf [-o output.md] [--pages 1-10]"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='将PDF文件转换为Markdown')
+    parser.add_argument('pdf_path', help='PDF文件路径')
+    parser.add_argument('-o', '--output', help='输出的Markdown文件路径，默认与PDF同名')
+    parser.add_argument('--pages', help='页码范围，如 5、2-10、3-，页码从1开始')
+    parser.add_argument('--image-dir', help='图片保存目录，默认为输出文件旁的images目录')
+    parser.add_argument('--workers', type=int, default=None, help='并行转换的进程数')
+    args = parser.parse_args(argv)
+    
+    if args.pages:
+        try:
+            parse_page_range(args.pages)
+        except ValueError as e:
+            parser.error(str(e))
+    output_path = args.output or os.path.splitext(args.pdf_path)[0] + '.md'
+    
+    def report(done, total, stage):
+        label = '已提取' if stage == PROGRESS_EXTRACT else '已转换'
+        print(f"\r{label} {done}/{total} 页", end='', file=sys.stderr, flush=True)
+    
+    images = convert_pdf_to_md(args.pdf_path, output_path, args.image_dir, args.workers, args.pages, report)
+    print(file=sys.stderr)
+    print(f"已生成 {output_path}，提取图片 {len(images)} 张")
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()